@@ -0,0 +1,234 @@
+# backend/changes.py
+
+"""İlan değişiklik günlüğü ve "şu imleçten beri ne değişti" beslemesi
+
+crud'daki her yazma yolu, değişen ilan id'lerini ilan_degisiklikleri
+tablosuna yazar. İstemci /ilan/changes?since=<seq> ile yalnızca farkları alır.
+Bu yüzden tüm listeyi yeniden çekmesi gerekmez.
+
+Sequence değerleri commit sırasıyla verilmez: seq=10'u alan işlem, seq=11'i
+alandan sonra commit olursa 11'i okuyan istemci 10'u hiç görmez. Bunu
+önlemek için günlük satırları işlem boyunca oturumda bekletilir ve commit
+anında, tek bir advisory xact kilidi altında eklenir. Kilit yalnızca bu
+ekleme ile commit arasında tutulur; ilan yazmaları, COPY ve istatistikler
+kilitsiz, ofisler arasında paralel çalışır. Güvence şudur: seq=N görünür
+olduğunda N'den küçük her seq ya commit edilmiş ya da geri alınmıştır.
+Ofis başına kilit bu güvenceyi bozardı; ofise göre süzen okuma imleci
+genel son seq'e ilerlettiği için başka ofislerin sırası da önemlidir.
+
+Güncel istemcilerin veritabanına hiç gitmemesi için her süreçte bir
+ChangeFeed son seq'i bellekte tutar. PostgreSQL'in LISTEN/NOTIFY'ı ile
+yazmalar anında duyulur. Bu mümkün değilse (PgBouncer, başka veritabanı)
+CHANGES_POLL_S'de bir sorgulanır. Uzun yoklama (wait) yapan istekler
+beklerken veritabanı bağlantısı tutmaz.
+
+Bildirim "ofis_id:seq" taşır; ofise göre süzen istemciler yalnızca kendi
+ofislerinde değişiklik olunca uyanır, başka bir ofisin yoğun yazmaları
+onları veritabanına göndermez.
+"""
+
+import asyncio
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.orm import Session
+from backend.models import IlanDegisiklik
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = "ilan_degisiklikleri"
+# Bildirim kaçsa bile son seq bu aralıkla yeniden okunur (saniye)
+CHANGES_POLL_S = float(os.getenv("CHANGES_POLL_S", 2))
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+# Commit'i bekleyen günlük satırlarının Session.info'daki anahtarı
+_PENDING = "ilan_degisiklikleri"
+
+
+def record_changes(db: Session, islem: str, ilanlar: Iterable[Tuple[int, int]]):
+    """(ilan_id, ofis_id) çiftlerinin değişikliğini açık işleme ekle; satırlar commit'te yazılır"""
+    rows = [{"ilan_id": ilan_id, "ofis_id": ofis_id, "islem": islem} for ilan_id, ofis_id in ilanlar]
+    if rows:
+        db.info.setdefault(_PENDING, []).extend(rows)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending(session: Session):
+    if session.in_nested_transaction():
+        return
+    rows = session.info.pop(_PENDING, None)
+    if not rows:
+        return
+    if session.get_bind().dialect.name != "postgresql":
+        session.execute(insert(IlanDegisiklik), rows)
+        return
+    # Kilit commit'e kadar tutulur; seq'ler commit sırasıyla görünür olur
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('emlak_ilan_degisiklik'))"))
+    seqs = session.execute(insert(IlanDegisiklik).returning(IlanDegisiklik.seq, IlanDegisiklik.ofis_id), rows).all()
+    latest = defaultdict(int)
+    for seq, ofis_id in seqs:
+        latest[ofis_id] = max(latest[ofis_id], seq)
+    for ofis_id, seq in latest.items():
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANGES_CHANNEL, "payload": f"{ofis_id}:{seq}"})
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending(session: Session, transaction):
+    # Geri alınan ya da kapatılan işlemin bekleyen satırları sonrakine taşınmaz
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def latest_seq(db: Session) -> int:
+    return db.query(func.coalesce(func.max(IlanDegisiklik.seq), 0)).scalar()
+
+
+class ChangeFeed:
+    """Son seq'i bellekte tutar ve yeni değişiklik bekleyen istekleri uyandırır
+
+    Ofis başına son seq yalnızca bildirimlerden öğrenilir; bilinmeyen ofisler
+    için, bildirim alınmayan son okumadaki genel seq (base) üst sınır sayılır.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.latest = None
+        self.base = 0
+        self.office_latest = {}
+        self.refreshed_at = 0.0
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+
+    def _known(self, ofis_id: Optional[int]) -> int:
+        if ofis_id is None:
+            return self.latest
+        return max(self.base, self.office_latest.get(ofis_id, 0))
+
+    def is_current(self, since: int, ofis_id: Optional[int] = None) -> bool:
+        """Bellekteki son seq (ofis verilirse o ofisinki) tazeyse ve since'ten büyük değilse True"""
+        return (
+            self.latest is not None
+            and time.monotonic() - self.refreshed_at < CHANGES_POLL_S * 3
+            and self._known(ofis_id) <= since
+        )
+
+    async def wait(self, since: int, timeout: float, ofis_id: Optional[int] = None):
+        """since'ten yeni bir değişiklik olana ya da timeout dolana kadar bekle"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future, since, ofis_id)
+        with self._lock:
+            if not self.is_current(since, ofis_id):
+                return
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _update(self, latest: int, offices: Optional[dict] = None):
+        """Genel son seq'i ya da bildirimlerden gelen ofis seq'lerini işle"""
+        with self._lock:
+            if offices:
+                for ofis_id, seq in offices.items():
+                    self.office_latest[ofis_id] = max(self.office_latest.get(ofis_id, 0), seq)
+                latest = max(latest, self.latest or 0)
+            elif self.latest is None or latest > self.latest:
+                # Bildirimsiz gelen değişiklik hangi ofise ait bilinmez; hepsi için üst sınır
+                self.base = latest
+                self.office_latest.clear()
+            self.latest = latest
+            self.refreshed_at = time.monotonic()
+            waiters = [waiter for waiter in self._waiters if self._known(waiter[3]) > waiter[2]]
+            self._waiters = [waiter for waiter in self._waiters if self._known(waiter[3]) <= waiter[2]]
+        for loop, future, _, _ in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def _run(self):
+        from backend.database import DB_PGBOUNCER
+
+        listen = self.engine.dialect.name == "postgresql" and not DB_PGBOUNCER
+        while True:
+            try:
+                if listen:
+                    self._listen()
+                else:
+                    self._poll()
+            except Exception as e:
+                logger.error("Değişiklik beslemesi koptu, yeniden bağlanılıyor: %s", e)
+                self.latest = None
+                time.sleep(CHANGES_POLL_S)
+
+    def _listen(self):
+        # Havuzdan bağlantı almadan ayrı, sürekli açık bir bağlantı
+        dialect = self.engine.dialect
+        cargs, cparams = dialect.create_connect_args(self.engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANGES_CHANNEL}")
+            cursor.execute("SELECT coalesce(max(seq), 0) FROM ilan_degisiklikleri")
+            self._update(cursor.fetchone()[0])
+            while True:
+                if select.select([conn], [], [], CHANGES_POLL_S)[0]:
+                    conn.poll()
+                    offices = {}
+                    for notify in conn.notifies:
+                        ofis_id, _, seq = notify.payload.partition(":")
+                        if seq.isdigit():
+                            offices[int(ofis_id)] = max(offices.get(int(ofis_id), 0), int(seq))
+                    conn.notifies.clear()
+                    if offices:
+                        self._update(max(offices.values()), offices)
+                        continue
+                # Sessizlikte genel seq'i yenile; kaçan bildirim varsa tüm ofisler için geçerli sayılır
+                cursor.execute("SELECT coalesce(max(seq), 0) FROM ilan_degisiklikleri")
+                self._update(cursor.fetchone()[0])
+        finally:
+            conn.close()
+
+    def _poll(self):
+        from backend.database import SessionLocal
+
+        while True:
+            db = SessionLocal()
+            try:
+                self._update(latest_seq(db))
+            finally:
+                db.close()
+            time.sleep(CHANGES_POLL_S)
+
+
+_feed: Optional[ChangeFeed] = None
+
+
+def get_change_feed() -> ChangeFeed:
+    """Süreç başına tek besleme; ilk /changes isteğinde başlatılır"""
+    global _feed
+    if _feed is None:
+        from backend.database import engine
+        _feed = ChangeFeed(engine)
+    _feed.start()
+    return _feed
@@ -1,19 +1,139 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from .models import Ilan, PhotoUploadSession
+import csv
+import io
+import logging
+from typing import Iterator, List
+from sqlalchemy import delete, insert, or_, select, text, update
+from sqlalchemy.orm import Session, selectinload
+from . import changes, dedup, geo, models, normalize, schemas, stats
+from .models import Ilan, IlanPhoto, PhotoUploadSession
 from .schemas.ilan import IlanCreate, PhotoUploadSessionCreate
 
-def get_ilanlar(db: Session, skip: int = 0, limit: int = 100):
-    """Tüm ilanları getir"""
-    return db.query(models.Ilan).offset(skip).limit(limit).all()
+logger = logging.getLogger(__name__)
 
-def get_ilan(db: Session, ilan_id: int):
-    """ID'ye göre ilan getir"""
-    return db.query(models.Ilan).filter(models.Ilan.id == ilan_id).first()
+def _ofis_filter(query, ofis_id: int = None):
+    """ofis_id verilirse sorgu yalnızca o ofisin bölümünü okur"""
+    if ofis_id is None:
+        return query
+    return query.filter(models.Ilan.ofis_id == ofis_id)
 
-def create_emlak_ilan(db: Session, ilan: schemas.IlanCreate):
-    """Yeni ilan oluştur"""
+def get_ilanlar(db: Session, skip: int = 0, limit: int = 100, min_oda: int = None, max_oda: int = None,
+                salon: int = None, min_fiyat: float = None, max_fiyat: float = None,
+                min_metrekare: float = None, max_metrekare: float = None, ofis_id: int = None):
+    """İlanları getir; sayısal filtreler indeksli aralık sorgusu olarak uygulanır
+
+    Sayfadaki ilanların fotoğrafları tek bir ek sorguda yüklenir.
+    """
+    query = _ofis_filter(db.query(models.Ilan), ofis_id)
+    ranges = [
+        (models.Ilan.oda, min_oda, max_oda),
+        (models.Ilan.fiyat, min_fiyat, max_fiyat),
+        (models.Ilan.metrekare, min_metrekare, max_metrekare),
+    ]
+    for column, low, high in ranges:
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+    if salon is not None:
+        query = query.filter(models.Ilan.salon == salon)
+    return (
+        query.options(selectinload(models.Ilan.fotolar))
+        .order_by(models.Ilan.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+def get_ilan(db: Session, ilan_id: int, ofis_id: int = None):
+    """ID'ye göre ilan getir; ofis verilirse başka ofisin ilanı bulunmaz"""
+    return (
+        _ofis_filter(db.query(models.Ilan), ofis_id)
+        .options(selectinload(models.Ilan.fotolar))
+        .filter(models.Ilan.id == ilan_id)
+        .first()
+    )
+
+def get_ilanlar_by_ids(db: Session, ilan_ids: List[int], ofis_id: int = None):
+    """İlanları verilen id sırasıyla getir; artık olmayanlar atlanır"""
+    if not ilan_ids:
+        return []
+    ilanlar = {
+        ilan.id: ilan for ilan in
+        _ofis_filter(db.query(models.Ilan), ofis_id).options(selectinload(models.Ilan.fotolar)).filter(models.Ilan.id.in_(ilan_ids))
+    }
+    return [ilanlar[ilan_id] for ilan_id in ilan_ids if ilan_id in ilanlar]
+
+def get_ilanlar_near(db: Session, lat: float, lon: float, radius_m: float, limit: int = 50, ofis_id: int = None):
+    """Noktaya yarıçap içinde olan ilanları yakından uzağa sırala
+
+    Adaylar geohash önek aramasıyla (indeks aralık taraması) bulunur, kesin
+    mesafe yalnızca bu adaylar için hesaplanır. (ilan, mesafe_m) listesi döner.
+    """
+    cells = geo.covering_cells(lat, lon, radius_m)
+    candidates = _ofis_filter(db.query(models.Ilan.id, models.Ilan.lat, models.Ilan.lon), ofis_id).filter(
+        or_(*(models.Ilan.geohash.startswith(cell, autoescape=True) for cell in cells))
+    )
+    distances = {}
+    for row in candidates:
+        distance = geo.haversine_m(lat, lon, row.lat, row.lon)
+        if distance <= radius_m:
+            distances[row.id] = distance
+    nearest = sorted(distances, key=distances.get)[:limit]
+    if not nearest:
+        return []
+    # Ofis süzgeci yalnızca o ofisin bölümünün taranmasını sağlar
+    ilanlar = (
+        _ofis_filter(db.query(models.Ilan), ofis_id)
+        .options(selectinload(models.Ilan.fotolar))
+        .filter(models.Ilan.id.in_(nearest))
+        .all()
+    )
+    ilanlar.sort(key=lambda ilan: distances[ilan.id])
+    return [(ilan, round(distances[ilan.id], 1)) for ilan in ilanlar]
+
+def get_ilan_changes(db: Session, since: int, limit: int = 500, ofis_id: int = None):
+    """since'ten sonraki değişiklikleri getir; (yeni imleç, değişiklikler, devamı var mı) döndürür
+
+    Aynı ilanın birden fazla değişikliği sonuncusuna indirgenir; eklenen ya da
+    güncellenen ilanlar güncel halleriyle döner. Sonradan silinmiş bir ilan,
+    silme kaydı sonraki sayfada olsa bile burada silindi olarak bildirilir.
+    Ofis verilirse imleç, başka ofislerin değişikliklerini de geçecek şekilde
+    okuma anındaki son seq'e ilerletilir.
+    """
+    query = db.query(models.IlanDegisiklik).filter(models.IlanDegisiklik.seq > since)
+    if ofis_id is not None:
+        # Önce alınan son seq'ten küçükler ya commit edilmiş ya geri alınmıştır (bkz. changes.py)
+        head = changes.latest_seq(db)
+        query = query.filter(models.IlanDegisiklik.ofis_id == ofis_id, models.IlanDegisiklik.seq <= head)
+    rows = query.order_by(models.IlanDegisiklik.seq).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return (since if ofis_id is None else max(since, head)), [], False
+
+    last_change = {row.ilan_id: row for row in rows}
+    live_ids = [ilan_id for ilan_id, row in last_change.items() if row.islem != changes.DELETE]
+    ilanlar = {}
+    if live_ids:
+        ilanlar = {
+            ilan.id: ilan for ilan in
+            _ofis_filter(db.query(models.Ilan), ofis_id).options(selectinload(models.Ilan.fotolar))
+            .filter(models.Ilan.id.in_(live_ids))
+        }
+    result = []
+    for ilan_id, row in sorted(last_change.items(), key=lambda item: item[1].seq):
+        ilan = ilanlar.get(ilan_id)
+        islem = row.islem if ilan is not None else changes.DELETE
+        result.append({"seq": row.seq, "islem": islem, "ilan_id": ilan_id, "ilan": ilan})
+    cursor = rows[-1].seq if ofis_id is None or has_more else max(rows[-1].seq, head)
+    return cursor, result, has_more
+
+def create_emlak_ilan(db: Session, ilan: schemas.IlanCreate, photo_session_id: int = None, gonderen: str = None):
+    """Yeni ilan oluştur; oturum verilirse o oturumun fotoğraflarını ilana bağla"""
+    oda, salon = normalize.parse_oda(ilan.oda_sayisi)
+    ofis_id = ilan.ofis_id
     db_ilan = models.Ilan(
+        ofis_id=ofis_id,
         baslik=ilan.baslik,
         aciklama=ilan.aciklama,
         fiyat=ilan.fiyat,
@@ -21,28 +141,143 @@ def create_emlak_ilan(db: Session, ilan: schemas.IlanCreate):
         sokak=ilan.sokak,
         oda_sayisi=ilan.oda_sayisi,
         metrekare=ilan.metrekare,
-        drive_link=ilan.drive_link
+        oda=oda,
+        salon=salon,
+        **geo.locate(ilan.mahalle),
+        drive_link=ilan.drive_link,
+        drive_folder_id=ilan.drive_folder_id,
+        benzer_ilan_id=ilan.benzer_ilan_id,
+        gonderen=gonderen
     )
     db.add(db_ilan)
+    db.flush()
+    if photo_session_id is not None:
+        attach_session_photos(db, photo_session_id, db_ilan.id)
+    stats.update_stats(db, [db_ilan])
+    dedup.index_ilanlar(db, [(db_ilan.id, dict(ilan.dict(), ofis_id=ofis_id))])
+    changes.record_changes(db, changes.INSERT, [(db_ilan.id, ofis_id)])
     db.commit()
     db.refresh(db_ilan)
+    if db_ilan.lat is None:
+        logger.info("İlan %d konumsuz kaydedildi: mahalle sözlükte yok (%r)", db_ilan.id, ilan.mahalle)
     return db_ilan 
 
-def delete_emlak_ilan(db: Session, folder_name: str):
-    """İlanı veritabanından sil (başlıkta esnek arama)"""
+# Toplu eklemede tek seferde gönderilen satır sayısı
+BULK_BATCH_SIZE = 1000
+COPY_NULL = "\\N"
+
+def _copy_ilanlar(db: Session, rows: List[dict]) -> List[int]:
+    """Satırları PostgreSQL COPY ile yükle; id'ler önceden sequence'ten ayrılır"""
+    ids = list(db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('emlak_ilanlar', 'id')) FROM generate_series(1, :n)"),
+        {"n": len(rows)},
+    ).scalars())
+    columns = ["id"] + list(rows[0].keys())
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for ilan_id, row in zip(ids, rows):
+        # None, COPY'nin NULL işaretine çevrilir; boş metin boş metin olarak kalır
+        writer.writerow([ilan_id] + [COPY_NULL if row[c] is None else row[c] for c in columns[1:]])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
     try:
-        # Klasör adındaki #SADEEVIM ve sonrasını temizle
-        base_name = folder_name.split(' #')[0].strip()
-        # Başlığın baş kısmı ile eşleşen ilk ilanı bul
-        ilan = db.query(models.Ilan).filter(models.Ilan.baslik.like(f"%{base_name}%")).first()
-        if not ilan:
-            return False, "İlan bulunamadı"
-        db.delete(ilan)
+        cursor.copy_expert(
+            f"COPY emlak_ilanlar ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
+    finally:
+        cursor.close()
+    return ids
+
+def bulk_create_emlak_ilanlar(db: Session, ilanlar: List[schemas.IlanCreate]) -> List[int]:
+    """Birden fazla ilanı tek işlemde ekle, eklenen id'leri döndür
+
+    Kopya tespiti imzaları burada yazılmaz; çağıran eklenen id'ler için
+    dedup.index_pending'i işlem dışında çalıştırır.
+    """
+    rows = [ilan.dict() for ilan in ilanlar]
+    if not rows:
+        return []
+    for row in rows:
+        row["oda"], row["salon"] = normalize.parse_oda(row["oda_sayisi"])
+        row.update(geo.locate(row["mahalle"]))
+    try:
+        if db.bind.dialect.name == "postgresql":
+            ids = _copy_ilanlar(db, rows)
+        else:
+            ids = []
+            for i in range(0, len(rows), BULK_BATCH_SIZE):
+                result = db.execute(insert(models.Ilan).returning(models.Ilan.id), rows[i:i + BULK_BATCH_SIZE])
+                ids.extend(result.scalars())
+        stats.update_stats(db, rows)
+        changes.record_changes(db, changes.INSERT, [(ilan_id, row["ofis_id"]) for ilan_id, row in zip(ids, rows)])
         db.commit()
+        konumsuz = sum(1 for row in rows if row["lat"] is None)
+        if konumsuz:
+            logger.warning("Toplu yükleme: %d/%d ilanın mahallesi sözlükte yok, konumsuz kaydedildi",
+                           konumsuz, len(rows))
+        return ids
+    except Exception:
+        db.rollback()
+        raise
+
+def stream_ilanlar(db: Session, batch_size: int = BULK_BATCH_SIZE, ofis_id: int = None) -> Iterator[dict]:
+    """İlanları (ofis verilirse yalnızca onunkileri) sunucu tarafı cursor ile sabit bellekte döndür"""
+    table = models.Ilan.__table__
+    query = select(table).order_by(table.c.id)
+    if ofis_id is not None:
+        query = query.where(table.c.ofis_id == ofis_id)
+    result = db.execute(
+        query,
+        execution_options={"yield_per": batch_size},
+    )
+    for row in result.mappings():
+        yield dict(row)
+
+def delete_emlak_ilan(db: Session, ilan_id: int, ofis_id: int = None):
+    """İlanı ve fotoğraf satırlarını ID ile sil"""
+    try:
+        if not bulk_delete_emlak_ilanlar(db, [ilan_id], ofis_id=ofis_id):
+            return False, "İlan bulunamadı"
         return True, "İlan başarıyla silindi"
     except Exception as e:
+        return False, f"İlan silinirken hata oluştu: {str(e)}"
+
+def bulk_delete_emlak_ilanlar(db: Session, ilan_ids: List[int], ofis_id: int = None) -> List[int]:
+    """İlanları ve bağlı satırlarını tek işlemde sil, silinen id'leri döndür
+
+    Ofis verilirse başka ofislerin ilanlarına dokunulmaz.
+    """
+    if not ilan_ids:
+        return []
+    try:
+        query = delete(Ilan).where(Ilan.id.in_(ilan_ids))
+        if ofis_id is not None:
+            query = query.where(Ilan.ofis_id == ofis_id)
+        deleted = db.execute(
+            query.returning(Ilan.id, Ilan.ofis_id, Ilan.mahalle, Ilan.oda_sayisi, Ilan.fiyat, Ilan.metrekare)
+        ).mappings().all()
+        deleted_ids = [row["id"] for row in deleted]
+        # Bölümlü tabloda yabancı anahtar olmadığından bağlı satırlar burada silinir
+        if deleted_ids:
+            db.execute(delete(IlanPhoto).where(IlanPhoto.ilan_id.in_(deleted_ids)))
+            db.execute(delete(models.IlanLshBant).where(models.IlanLshBant.ilan_id.in_(deleted_ids)))
+            db.execute(delete(models.IlanMinhash).where(models.IlanMinhash.ilan_id.in_(deleted_ids)))
+            unlinked = db.execute(
+                update(Ilan).where(Ilan.benzer_ilan_id.in_(deleted_ids)).values(benzer_ilan_id=None)
+                .returning(Ilan.id, Ilan.ofis_id)
+            ).all()
+            # benzer_ilan_id'si boşalan ilanlar da değişmiş sayılır; istemciler güncel halini alır
+            changes.record_changes(db, changes.UPDATE, unlinked)
+        stats.update_stats(db, deleted, sign=-1)
+        changes.record_changes(db, changes.DELETE, [(row["id"], row["ofis_id"]) for row in deleted])
+        db.commit()
+        return deleted_ids
+    except Exception:
         db.rollback()
-        return False, f"İlan silinirken hata oluştu: {str(e)}" 
+        raise
 
 def create_photo_upload_session(db: Session, session_data: PhotoUploadSessionCreate):
     db_session = PhotoUploadSession(**session_data.dict())
@@ -68,4 +303,52 @@ def delete_photo_upload_session(db: Session, user_id: str):
     if session:
         db.delete(session)
         db.commit()
-    return session 
\ No newline at end of file
+    return session
+
+def session_has_photo(db: Session, session_id: int, sha256: str) -> bool:
+    """Aynı içerikli fotoğraf bu oturumda daha önce yüklendi mi"""
+    return db.query(
+        db.query(IlanPhoto.id)
+        .filter(IlanPhoto.session_id == session_id, IlanPhoto.sha256 == sha256)
+        .exists()
+    ).scalar()
+
+def photo_exists(db: Session, drive_file_id: str) -> bool:
+    """Drive dosyası kayıtlı bir fotoğraf mı"""
+    return db.query(
+        db.query(IlanPhoto.id).filter(IlanPhoto.drive_file_id == drive_file_id).exists()
+    ).scalar()
+
+def add_session_photo(db: Session, session_id: int, drive_file_id: str, boyut: int = None,
+                      sha256: str = None, thumbnail_id: str = None):
+    """Oturuma yeni fotoğraf satırı ekle
+
+    Sayaç veritabanında atomik olarak artırılır ve fotoğrafın sırası olarak
+    kullanılır; böylece oturum satırı okunup geri yazılmaz.
+    """
+    sira = db.execute(
+        update(PhotoUploadSession)
+        .where(PhotoUploadSession.id == session_id)
+        .values(received_photos=PhotoUploadSession.received_photos + 1)
+        .returning(PhotoUploadSession.received_photos)
+    ).scalar_one()
+    photo = IlanPhoto(
+        session_id=session_id,
+        drive_file_id=drive_file_id,
+        sira=sira,
+        boyut=boyut,
+        sha256=sha256,
+        thumbnail_id=thumbnail_id,
+    )
+    db.add(photo)
+    db.commit()
+    return photo
+
+def attach_session_photos(db: Session, session_id: int, ilan_id: int) -> int:
+    """Oturumda biriken fotoğrafları ilana bağla (commit çağırana bırakılır)"""
+    result = db.execute(
+        update(IlanPhoto)
+        .where(IlanPhoto.session_id == session_id, IlanPhoto.ilan_id.is_(None))
+        .values(ilan_id=ilan_id)
+    )
+    return result.rowcount
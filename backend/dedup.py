@@ -0,0 +1,226 @@
+# backend/dedup.py
+
+"""Kayıt anında neredeyse aynı ilanları bulma (MinHash + LSH)
+
+Aynı daire birden fazla emlakçı tarafından ya da yeni fiyatla tekrar
+gönderilebiliyor. Her ilan için açıklama, mahalle ve sokak metninden bir
+MinHash imzası çıkarılır; imza bantlara bölünüp her bandın özeti
+ilan_lsh_bantlari tablosuna yazılır. Yeni bir ilan için yalnızca en az bir
+bandı eşleşen ilanlar aday olur (indeksli eşitlik araması, tabloyu taramaz).
+Bantlar ofis_id ile anahtarlandığından yalnızca aynı ofisin ilanlarına bakılır.
+Adaylar metin benzerliği ve fiyat / metrekare / oda yakınlığıyla puanlanır.
+
+Toplu içe aktarılan ilanlar ekleme işleminde değil, sonradan parça parça
+indekslenir (/ilan/bulk arka plan görevi ya da
+`python -m backend.dedup indeksle`).
+"""
+
+import hashlib
+import logging
+import os
+import random
+import re
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import exists, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend import models
+from backend.offices import DEFAULT_OFIS_ID
+from backend.normalize import fold_tr, parse_number, parse_oda
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# Bu puanın üzerindeki adaylar kopya kabul edilir
+DUPLICATE_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))
+# Puanlamaya alınacak en fazla aday sayısı
+MAX_CANDIDATES = 200
+# Sonradan indekslemede her işlemde yazılan ilan sayısı
+INDEX_BATCH_SIZE = int(os.getenv("DEDUP_INDEX_BATCH_SIZE", 1000))
+TEXT_WEIGHT = 0.6
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1723)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)
+]
+_SIGNATURE_FORMAT = f"<{NUM_PERM}I"
+
+
+def _shingles(text: str) -> set:
+    text = re.sub(r"[^a-z0-9 ]", " ", fold_tr(text))
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _ilan_text(fields: Dict) -> str:
+    return " ".join(str(fields.get(key) or "") for key in ("aciklama", "mahalle", "sokak"))
+
+
+def minhash(fields: Dict) -> Optional[Tuple[int, ...]]:
+    """İlan metninin MinHash imzası; metin boşsa None"""
+    shingles = _shingles(_ilan_text(fields))
+    if not shingles:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles
+    ]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def band_hashes(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    """İmzanın (bant no, bant özeti) çiftleri; özet işaretli 64 bit tamsayıdır"""
+    bands = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS_PER_BAND}I", *chunk), digest_size=8).digest()
+        bands.append((band, int.from_bytes(digest, "little", signed=True)))
+    return bands
+
+
+def _closeness(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if not a or not b:
+        return None
+    return max(0.0, 1.0 - abs(a - b) / max(a, b))
+
+
+def similarity(signature: Tuple[int, ...], other: Tuple[int, ...], fields: Dict, other_fields: Dict) -> float:
+    """Tahmini Jaccard benzerliği ile sayısal alan yakınlığının ağırlıklı ortalaması"""
+    text_score = sum(x == y for x, y in zip(signature, other)) / NUM_PERM
+    field_scores = [
+        _closeness(parse_number(fields.get("fiyat")), other_fields.get("fiyat")),
+        _closeness(parse_number(fields.get("metrekare")), other_fields.get("metrekare")),
+    ]
+    oda = parse_oda(fields.get("oda_sayisi"))[0]
+    if oda is not None and other_fields.get("oda") is not None:
+        field_scores.append(1.0 if oda == other_fields["oda"] else 0.0)
+    field_scores = [score for score in field_scores if score is not None]
+    if not field_scores:
+        return text_score
+    return TEXT_WEIGHT * text_score + (1 - TEXT_WEIGHT) * sum(field_scores) / len(field_scores)
+
+
+def find_duplicates(db: Session, fields: Dict, ofis_id: int, limit: int = 3) -> List[Tuple[int, float]]:
+    """Ofisin kayıtlı ilanlarından verilen detaylara çok benzeyenleri (id, puan) olarak döndür"""
+    signature = minhash(fields)
+    if signature is None:
+        return []
+    band_table = models.IlanLshBant
+    candidate_ids = [
+        row.ilan_id for row in
+        db.query(band_table.ilan_id)
+        .filter(band_table.ofis_id == ofis_id)
+        .filter(tuple_(band_table.bant, band_table.hash).in_(band_hashes(signature)))
+        .distinct()
+        .limit(MAX_CANDIDATES)
+    ]
+    if not candidate_ids:
+        return []
+
+    rows = (
+        db.query(models.IlanMinhash.imza, models.Ilan.id, models.Ilan.fiyat, models.Ilan.metrekare, models.Ilan.oda)
+        .join(models.Ilan, models.Ilan.id == models.IlanMinhash.ilan_id)
+        .filter(models.Ilan.ofis_id == ofis_id, models.IlanMinhash.ilan_id.in_(candidate_ids))
+    )
+    scored = []
+    for row in rows:
+        other = struct.unpack(_SIGNATURE_FORMAT, row.imza)
+        score = similarity(signature, other, fields, {"fiyat": row.fiyat, "metrekare": row.metrekare, "oda": row.oda})
+        if score >= DUPLICATE_THRESHOLD:
+            scored.append((row.id, round(score, 3)))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+
+def index_ilanlar(db: Session, ilanlar: Iterable[Tuple[int, Dict]]) -> int:
+    """İlanların imzalarını ve LSH bantlarını yaz, yazılan imza sayısını döndür (commit çağırana bırakılır)"""
+    signatures, bands = [], []
+    for ilan_id, fields in ilanlar:
+        signature = minhash(fields)
+        if signature is None:
+            continue
+        signatures.append({"ilan_id": ilan_id, "imza": struct.pack(_SIGNATURE_FORMAT, *signature)})
+        ofis_id = fields.get("ofis_id") or DEFAULT_OFIS_ID
+        bands.extend(
+            {"ofis_id": ofis_id, "ilan_id": ilan_id, "bant": band, "hash": value}
+            for band, value in band_hashes(signature)
+        )
+    if signatures:
+        db.execute(insert(models.IlanMinhash), signatures)
+        db.execute(insert(models.IlanLshBant), bands)
+    return len(signatures)
+
+
+def _pending_batch(db: Session, last_id: int, ilan_ids: Optional[List[int]], batch_size: int):
+    """last_id'den sonraki, imzası henüz yazılmamış ilanlar"""
+    ilan = models.Ilan
+    query = (
+        select(ilan.id, ilan.ofis_id, ilan.aciklama, ilan.mahalle, ilan.sokak)
+        .where(ilan.id > last_id)
+        .where(~exists().where(models.IlanMinhash.ilan_id == ilan.id))
+        .order_by(ilan.id)
+        .limit(batch_size)
+    )
+    if ilan_ids is not None:
+        query = query.where(ilan.id.in_(ilan_ids))
+    return db.execute(query).mappings().all()
+
+
+def index_pending(ilan_ids: Optional[Iterable[int]] = None, batch_size: int = INDEX_BATCH_SIZE,
+                  session_factory=None) -> int:
+    """İmzası olmayan ilanları (verilirse yalnızca ilan_ids'dekileri) parça parça indeksle
+
+    Her parça ayrı bir işlemde yazılır; uzun sürse de ilan tablosunu ya da
+    toplu eklemenin işlemini tutmaz. İndekslenen ilan sayısını döndürür;
+    metni boş olduğu için imzası çıkmayan ilanlar sayılmaz.
+    """
+    if session_factory is None:
+        from backend.database import SessionLocal as session_factory
+    ids = sorted(set(ilan_ids)) if ilan_ids is not None else None
+    total, last_id = 0, 0
+    while True:
+        chunk = None
+        if ids is not None:
+            chunk = ids[:batch_size]
+            ids = ids[batch_size:]
+            if not chunk:
+                break
+        db = session_factory()
+        try:
+            rows = _pending_batch(db, last_id, chunk, batch_size)
+            if rows:
+                written = index_ilanlar(db, [(row["id"], row) for row in rows])
+                db.commit()
+                total += written
+        except IntegrityError:
+            # Aynı ilanları eş zamanlı başka bir indeksleme yazmış
+            db.rollback()
+            logger.warning("Parça başka bir indekslemeyle çakıştı, atlandı")
+        finally:
+            db.close()
+        if chunk is None:
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+    return total
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["indeksle"]:
+        print("Kullanım: python -m backend.dedup indeksle")
+        sys.exit(1)
+    print(f"İndekslenen ilan: {index_pending()}")
@@ -0,0 +1,86 @@
+# backend/deletion.py
+
+"""İlanları veritabanından ve Drive'dan birlikte silme
+
+Silme sırası telafi edilebilir şekilde kurgulanmıştır:
+1. Drive klasörleri çöp kutusuna taşınır (geri alınabilir).
+2. İlan ve fotoğraf satırları tek işlemde silinir.
+3. Veritabanı işlemi başarısız olursa klasörler çöp kutusundan geri alınır,
+   başarılı olursa klasörler kalıcı olarak silinir.
+
+Kalıcı silme başarısız olsa bile klasör çöp kutusunda kalır ve Drive onu
+kendisi temizler; veritabanı ile Drive arasında tutarsızlık oluşmaz.
+"""
+
+import logging
+from typing import Dict, List
+from sqlalchemy.orm import Session
+from backend import crud, models
+from drive_service.uploader import get_drive_service, trash_folders, restore_folders, delete_folders_by_id
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_delete_ilanlar(db: Session, ilan_ids: List[int], service=None, ofis_id: int = None,
+                        gonderen: str = None) -> Dict:
+    """İlanları ID ile sil; Drive istekleri toplu gönderilir
+
+    Ofis ya da gönderen verilirse başka ofislerin / gönderenlerin ilanları
+    bulunamadı sayılır.
+    """
+    ilan_ids = list(dict.fromkeys(ilan_ids))
+    query = db.query(models.Ilan.id, models.Ilan.drive_folder_id).filter(models.Ilan.id.in_(ilan_ids))
+    if ofis_id is not None:
+        query = query.filter(models.Ilan.ofis_id == ofis_id)
+    if gonderen is not None:
+        query = query.filter(models.Ilan.gonderen == gonderen)
+    rows = query.all()
+    folder_by_ilan = {row.id: row.drive_folder_id for row in rows}
+    result = {
+        "silinen": [],
+        "bulunamayan": [ilan_id for ilan_id in ilan_ids if ilan_id not in folder_by_ilan],
+        "hatali": {},
+    }
+
+    folder_ids = [folder_id for folder_id in folder_by_ilan.values() if folder_id]
+    trash_failed = {}
+    if folder_ids:
+        service = service or get_drive_service()
+        trash_failed = trash_folders(service, folder_ids)
+
+    # Klasörü çöpe taşınamayan ilanlar veritabanında bırakılır
+    deletable = []
+    for ilan_id, folder_id in folder_by_ilan.items():
+        if folder_id in trash_failed:
+            result["hatali"][ilan_id] = f"Drive klasörü silinemedi: {trash_failed[folder_id]}"
+        else:
+            deletable.append(ilan_id)
+    trashed = [folder_by_ilan[ilan_id] for ilan_id in deletable if folder_by_ilan[ilan_id]]
+
+    try:
+        result["silinen"] = crud.bulk_delete_emlak_ilanlar(db, deletable, ofis_id=ofis_id)
+    except Exception as e:
+        logger.error("İlanlar silinemedi, Drive klasörleri geri alınıyor: %s", e)
+        if trashed:
+            restore_failed = restore_folders(service, trashed)
+            if restore_failed:
+                logger.error("Geri alınamayan Drive klasörleri: %s", list(restore_failed))
+        for ilan_id in deletable:
+            result["hatali"][ilan_id] = f"İlan silinirken hata oluştu: {str(e)}"
+        return result
+
+    if trashed:
+        delete_failed = delete_folders_by_id(service, trashed)
+        if delete_failed:
+            logger.warning("Çöp kutusunda bırakılan Drive klasörleri: %s", list(delete_failed))
+    return result
+
+
+def delete_ilan(db: Session, ilan_id: int, service=None, ofis_id: int = None, gonderen: str = None):
+    """Tek bir ilanı ID ile sil"""
+    result = bulk_delete_ilanlar(db, [ilan_id], service=service, ofis_id=ofis_id, gonderen=gonderen)
+    if result["silinen"]:
+        return True, "İlan başarıyla silindi"
+    if ilan_id in result["hatali"]:
+        return False, result["hatali"][ilan_id]
+    return False, "İlan bulunamadı"
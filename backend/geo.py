@@ -0,0 +1,179 @@
+# backend/geo.py
+
+"""Çevrimdışı mahalle sözlüğü ve geohash tabanlı yakınlık araması
+
+Mahalle adları uygulamayla birlikte gelen CSV dosyasındaki merkez
+koordinatlarına eşlenir; dış bir coğrafi kodlama servisi kullanılmaz.
+GPT'nin ürettiği yazım farkları ("Moda Mah.", "caferaga", "Fenerbahce")
+önce sadeleştirilip, tutmazsa bulanık eşleştirmeyle çözülür.
+
+Sözlük (ilçe, mahalle) ile anahtarlanır; aynı adlı mahalle birçok ilçede
+bulunabilir. İlçe verilmemişse (ya da metinde geçmiyorsa) yalnızca tek bir
+ilçede bulunan mahalle adları eşlenir; belirsiz adlara konum yazılmaz.
+
+Kapsam: gelen backend/data/mahalleler.csv yalnızca İstanbul'un 9 ilçesinden
+43 mahalleyi içerir (Kadıköy, Beşiktaş, Şişli, Üsküdar, Sarıyer, Bakırköy ...).
+Sözlükte olmayan mahallelerin ilanları konumsuz kaydedilir, /ilan/near
+sonuçlarında çıkmaz; sayıları eklemede loglanır. Başka bölgeler için aynı
+biçimde satır eklenir ya da GAZETTEER_PATH ile tam bir dosya verilir.
+
+Koordinatlar ilana geohash olarak da yazılır. Yarıçap sorgusu, merkez hücre
+ve 8 komşusunun önek aramasına (B-tree aralık taraması) dönüştürülür; kesin
+mesafe yalnızca bu hücrelerdeki adaylar için hesaplanır.
+"""
+
+import csv
+import difflib
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from backend.normalize import fold_tr
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mahalleler.csv"),
+)
+# Bulanık eşleşmede kabul edilen en düşük benzerlik oranı
+FUZZY_CUTOFF = 0.8
+GEOHASH_PRECISION = 9
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_EARTH_RADIUS_M = 6371000.0
+_SUFFIX_RE = re.compile(r"\b(mahallesi|mahalle|mah|mh)\b\.?")
+
+
+def _mahalle_key(name: str) -> str:
+    text = fold_tr(name)
+    text = _SUFFIX_RE.sub(" ", text)
+    text = re.sub(r"[^a-z0-9 ]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class Gazetteer(NamedTuple):
+    # sadeleştirilmiş ilçe adı -> sadeleştirilmiş mahalle adı -> (enlem, boylam)
+    by_ilce: Dict[str, Dict[str, Tuple[float, float]]]
+    # yalnızca tek bir ilçede geçen mahalle adları -> (enlem, boylam)
+    unique: Dict[str, Tuple[float, float]]
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer() -> Gazetteer:
+    by_ilce: Dict[str, Dict[str, Tuple[float, float]]] = {}
+    with open(GAZETTEER_PATH, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            ilce = _mahalle_key(row["ilce"])
+            by_ilce.setdefault(ilce, {})[_mahalle_key(row["mahalle"])] = (float(row["lat"]), float(row["lon"]))
+    seen: Dict[str, List[Tuple[float, float]]] = {}
+    for mahalleler in by_ilce.values():
+        for name, coords in mahalleler.items():
+            seen.setdefault(name, []).append(coords)
+    unique = {name: coords[0] for name, coords in seen.items() if len(coords) == 1}
+    return Gazetteer(by_ilce, unique)
+
+
+def _lookup(names: Dict[str, Tuple[float, float]], key: str) -> Optional[Tuple[float, float]]:
+    """Tam ad, sözcük sözcük ve bulanık eşleştirme"""
+    if key in names:
+        return names[key]
+    for token in key.split():
+        if token in names:
+            return names[token]
+    match = difflib.get_close_matches(key, names.keys(), n=1, cutoff=FUZZY_CUTOFF)
+    return names[match[0]] if match else None
+
+
+@lru_cache(maxsize=4096)
+def geocode_mahalle(mahalle: str, ilce: Optional[str] = None) -> Optional[Tuple[float, float]]:
+    """Mahalle adını merkez koordinatına çevir; bulunamazsa ya da belirsizse None"""
+    if not mahalle:
+        return None
+    gazetteer = load_gazetteer()
+    key = _mahalle_key(mahalle)
+    if not key:
+        return None
+    if ilce:
+        names = gazetteer.by_ilce.get(_mahalle_key(ilce))
+        return _lookup(names, key) if names else None
+    # "Kadıköy Moda", "Moda, Kadıköy" gibi ilçeyle birlikte yazılmış adlar
+    padded = f" {key} "
+    for ilce_key, names in gazetteer.by_ilce.items():
+        if f" {ilce_key} " in padded:
+            rest = padded.replace(f" {ilce_key} ", " ").strip()
+            coords = _lookup(names, rest) if rest else None
+            if coords is not None:
+                return coords
+    return _lookup(gazetteer.unique, key)
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, rng = (lon, lon_range) if even else (lat, lat_range)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def _cell_size_deg(precision: int) -> Tuple[float, float]:
+    """Verilen hassasiyette bir hücrenin (enlem, boylam) derece cinsinden boyu"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def covering_cells(lat: float, lon: float, radius_m: float) -> List[str]:
+    """Yarıçaplı daireyi kapsayan geohash önekleri (merkez hücre + komşular)
+
+    Hücre kenarı yarıçaptan büyük olan en ince hassasiyet seçilir; böylece
+    daire en fazla 3x3 hücreye taşar.
+    """
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = _cell_size_deg(candidate)
+        height_m = lat_deg * 111320.0
+        width_m = lon_deg * 111320.0 * math.cos(math.radians(lat))
+        if min(height_m, width_m) >= radius_m:
+            precision = candidate
+            break
+
+    lat_deg, lon_deg = _cell_size_deg(precision)
+    cells = []
+    for dlat in (-lat_deg, 0.0, lat_deg):
+        for dlon in (-lon_deg, 0.0, lon_deg):
+            cell_lat = max(min(lat + dlat, 90.0), -90.0)
+            cell_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            cell = geohash_encode(cell_lat, cell_lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def locate(mahalle: str, ilce: Optional[str] = None) -> Dict[str, Optional[object]]:
+    """İlan kaydına yazılacak konum alanları"""
+    coords = geocode_mahalle(mahalle, ilce)
+    if coords is None:
+        return {"lat": None, "lon": None, "geohash": None}
+    lat, lon = coords
+    return {"lat": lat, "lon": lon, "geohash": geohash_encode(lat, lon)}
@@ -1,15 +1,19 @@
 # backend/main.py
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routers import ilan
-from backend.database import engine
-from backend import models
+from fastapi.responses import JSONResponse
+from backend.routers import ilan, photo
+from backend.database import get_pool_stats
+from backend.rate_limit import Overloaded
+from backend.profiling import install_profiler
+import logging
 import os
 
-# Veritabanı tablolarını oluştur
-models.Base.metadata.create_all(bind=engine)
+# Loglama ayarları (DEBUG düzeyi istek başına çok fazla çıktı üretiyordu)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 
+# Tablolar açılışta oluşturulmaz; şema `python migrate.py` ile yönetilir
 app = FastAPI(title="Emlak API")
 
 # CORS ayarları
@@ -21,8 +25,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# İsteğe bağlı istek profilleme (PROFILE_ENABLED)
+install_profiler(app, "api")
+
 # Router'ları ekle
 app.include_router(ilan.router, prefix="/ilan", tags=["ilanlar"])
+app.include_router(photo.router, prefix="/photo", tags=["fotograflar"])
+
+@app.exception_handler(Overloaded)
+def overloaded_handler(request: Request, exc: Overloaded):
+    """Dış servis kuyruğu doluysa isteği 503 ile geri çevir"""
+    retry_after = max(1, round(exc.retry_after or 5))
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(retry_after)})
+
+@app.get("/health/db", tags=["health"])
+def db_health():
+    """Veritabanı bağlantı havuzu doluluk metrikleri"""
+    return get_pool_stats()
 
 # Port yapılandırması
 port = int(os.environ.get("PORT", 10000))
@@ -1,19 +1,73 @@
-from sqlalchemy import Column, Integer, String, Float, Text, JSON, DateTime
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Float, Text, JSON, LargeBinary, DateTime, ForeignKey, Index, UniqueConstraint, DDL, event
+from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
 
+class Ofis(Base):
+    """Emlak ofisi; ilanlar ofis_id'ye göre bölümlenir, bkz. backend/offices.py"""
+    __tablename__ = "emlak_ofisleri"
+
+    id = Column(Integer, primary_key=True)
+    ad = Column(String(255), nullable=False)
+    # Ofisin Drive ana klasörü; boşsa GOOGLE_DRIVE_MAIN_FOLDER_ID kullanılır
+    drive_folder_id = Column(String(128), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OfisNumara(Base):
+    """İlan gönderen WhatsApp numarasının bağlı olduğu ofis"""
+    __tablename__ = "ofis_numaralari"
+
+    # "whatsapp:" öneki olmadan, ör. "+905551112233"
+    numara = Column(String(32), primary_key=True)
+    ofis_id = Column(Integer, ForeignKey("emlak_ofisleri.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Ilan(Base):
+    """İlan; PostgreSQL'de ofis_id'ye göre LIST bölümlüdür, bkz. backend/offices.py"""
     __tablename__ = "emlak_ilanlar"
+    __table_args__ = {"postgresql_partition_by": "LIST (ofis_id)"}
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Bölüm anahtarı birincil anahtarda olmalı, bu yüzden id tek başına benzersiz
+    # kısıt değildir: emlak_ilanlar'a yabancı anahtar verilmez, bağlı satırlar
+    # crud'da birlikte silinir. Tüm bölümler aynı sequence'i kullanır.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    ofis_id = Column(Integer, ForeignKey("emlak_ofisleri.id"), primary_key=True, autoincrement=False)
     baslik = Column(String(255), index=True)
     aciklama = Column(Text)
-    fiyat = Column(Float, nullable=True)
+    fiyat = Column(Float, nullable=True, index=True)
     mahalle = Column(String(255))
     sokak = Column(String(255))
     oda_sayisi = Column(String(50))
-    metrekare = Column(Float, nullable=True)
+    metrekare = Column(Float, nullable=True, index=True)
+    # oda_sayisi'ndan türetilir ("3+1" -> oda=3, salon=1), bkz. backend/normalize.py
+    oda = Column(Integer, nullable=True, index=True)
+    salon = Column(Integer, nullable=True)
+    # Mahalle merkezinin koordinatı, bkz. backend/geo.py
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    # Önek aramasının indeksi kullanabilmesi için PostgreSQL'de "C" sıralaması
+    geohash = Column(String(12).with_variant(String(12, collation="C"), "postgresql"), nullable=True, index=True)
     drive_link = Column(String(255), nullable=True)
+    drive_folder_id = Column(String(128), nullable=True, index=True)
+    # Kayıt sırasında neredeyse aynı bulunan önceki ilan, bkz. backend/dedup.py
+    benzer_ilan_id = Column(Integer, nullable=True, index=True)
+    # İlanı WhatsApp'tan gönderen numara (normalize_numara); ofise eşli olmayan
+    # numaralar yalnızca kendi ilanlarını silebilir
+    gonderen = Column(String(32), nullable=True)
+
+    fotolar = relationship(
+        "IlanPhoto",
+        primaryjoin="Ilan.id == foreign(IlanPhoto.ilan_id)",
+        order_by="IlanPhoto.sira",
+        cascade="all, delete-orphan",
+    )
+
+# Kendi bölümü olmayan ofislerin ilanları varsayılan bölüme düşer
+event.listen(
+    Ilan.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS emlak_ilanlar_varsayilan PARTITION OF emlak_ilanlar DEFAULT").execute_if(dialect="postgresql"),
+)
 
 class PhotoUploadSession(Base):
     __tablename__ = "photo_upload_sessions"
@@ -22,7 +76,122 @@ class PhotoUploadSession(Base):
     expected_photos = Column(Integer)
     received_photos = Column(Integer, default=0)
     drive_folder_id = Column(String)
-    photo_links = Column(JSON, default=list)
     state = Column(String, default="waiting_for_photos")
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IlanPhoto(Base):
+    """İlana ait tek bir fotoğraf
+
+    Satır yükleme sırasında oturuma bağlı olarak bir kez yazılır; /tamamla
+    ile ilan_id doldurulur (attach_session_photos). İlan silinince ya da
+    yarım kalan oturum temizlenince satırlar silinir.
+    """
+    __tablename__ = "ilan_photos"
+    __table_args__ = (
+        Index("ix_ilan_photos_ilan_id_sira", "ilan_id", "sira"),
+        Index("ix_ilan_photos_session_id_sira", "session_id", "sira"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # İlan kaydedilene kadar boş kalır, /tamamla ile doldurulur
+    ilan_id = Column(Integer, nullable=True)
+    # Oturum tamamlanınca silindiği için yabancı anahtar değil
+    session_id = Column(Integer, nullable=True)
+    # /photo proxy'si yalnızca kayıtlı fotoğrafları sunar, ID ile aranır
+    drive_file_id = Column(String(128), nullable=False, index=True)
+    sira = Column(Integer, nullable=False)
+    boyut = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    thumbnail_id = Column(String(128), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IlanIstatistik(Base):
+    """(ofis, mahalle, oda_sayisi) başına ön hesaplanmış m² fiyatı toplamları, bkz. backend/stats.py"""
+    __tablename__ = "ilan_istatistikleri"
+    __table_args__ = (
+        UniqueConstraint("ofis_id", "mahalle", "oda_sayisi", name="uq_ilan_istatistikleri_ofis_mahalle_oda"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    ofis_id = Column(Integer, nullable=False)
+    mahalle = Column(String(255), nullable=False)
+    oda_sayisi = Column(String(50), nullable=False)
+    adet = Column(Integer, nullable=False, default=0)
+    toplam = Column(Float, nullable=False, default=0.0)
+    kare_toplam = Column(Float, nullable=False, default=0.0)
+    # Logaritmik kova indeksi -> ilan sayısı
+    sketch = Column(JSON, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IlanMinhash(Base):
+    """İlan metninin MinHash imzası (64 adet 32 bit değer)"""
+    __tablename__ = "ilan_minhash"
+
+    ilan_id = Column(Integer, primary_key=True)
+    imza = Column(LargeBinary, nullable=False)
+
+class IlanLshBant(Base):
+    """LSH bant özetleri; birincil anahtar (ofis, bant, hash) aramasının indeksidir"""
+    __tablename__ = "ilan_lsh_bantlari"
+    __table_args__ = (
+        Index("ix_ilan_lsh_bantlari_ilan_id", "ilan_id"),
+    )
+
+    # Tekrar kontrolü yalnızca aynı ofisin ilanlarına bakar
+    ofis_id = Column(Integer, primary_key=True, autoincrement=False)
+    bant = Column(SmallInteger, primary_key=True)
+    hash = Column(BigInteger, primary_key=True)
+    ilan_id = Column(Integer, primary_key=True)
+
+class RateLimitBucket(Base):
+    """Dış servis başına süreçler arası ortak token kovası, bkz. backend/rate_limit.py"""
+    __tablename__ = "rate_limit_buckets"
+
+    service = Column(String(32), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # 429 sonrası düşürülüp başarılı çağrılarla yeniden artırılan güncel hız (token/sn)
+    rate = Column(Float, nullable=False)
+    # Zamanlar veritabanı saatine göre epoch saniyesidir; süreçlerin saat farkı önemsizleşir
+    updated_at = Column(Float, nullable=False)
+    paused_until = Column(Float, nullable=False, default=0)
+
+class RateLimitLease(Base):
+    """Servis başına eş zamanlı çağrı yuvası; süresi dolan kiralama boşa çıkmış sayılır"""
+    __tablename__ = "rate_limit_leases"
+
+    service = Column(String(32), primary_key=True)
+    slot = Column(SmallInteger, primary_key=True)
+    holder = Column(String(64), nullable=True)
+    expires_at = Column(Float, nullable=False, default=0)
+
+class ProcessedMessage(Base):
+    """İşlenen Twilio MessageSid'leri; yeniden denenen webhook'lar bir kez işlenir, bkz. bot/message_dedup.py"""
+    __tablename__ = "processed_messages"
+
+    message_sid = Column(String(64), primary_key=True)
+    from_number = Column(String, nullable=True)
+    # "processing" ya da "done"
+    status = Column(String(16), nullable=False)
+    # İlk işlemin TwiML yanıtı; tekrar teslimlere aynen döndürülür
+    response = Column(Text, nullable=True)
+    # İlk işlem sürerken gelen tekrar teslim sayısı
+    tekrar = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class IlanDegisiklik(Base):
+    """emlak_ilanlar üzerindeki ekleme/güncelleme/silmelerin sıralı günlüğü, bkz. backend/changes.py"""
+    __tablename__ = "ilan_degisiklikleri"
+    __table_args__ = (
+        Index("ix_ilan_degisiklikleri_ofis_id_seq", "ofis_id", "seq"),
+    )
+
+    # İstemcinin imleci; yazanlar kilitle sıralandığı için commit sırasıyla artar
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    # Silinen ilanların kaydı da kalmalı; yabancı anahtar değil
+    ilan_id = Column(Integer, nullable=False)
+    ofis_id = Column(Integer, nullable=False)
+    # "insert", "update" ya da "delete"
+    islem = Column(String(8), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,113 @@
+# backend/normalize.py
+
+"""İlan alanlarını kayıt öncesinde standart biçime getirme
+
+GPT ve kullanıcılar aynı bilgiyi farklı yazabiliyor ("3+1", "3 + 1",
+"2.500.000 TL", "2,5 milyon"). Bu modül metin alanlarından sayısal değerleri
+çıkarır; böylece oda sayısı, fiyat ve metrekare üzerinde indeksli aralık
+sorguları yapılabilir.
+"""
+
+import re
+from typing import Optional, Tuple
+
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+_TR_ASCII = str.maketrans("ıİşŞğĞüÜöÖçÇâÂîÎûÛ", "iissgguuooccaaiiuu")
+
+_ODA_RE = re.compile(r"(\d+(?:[.,]5)?)\s*\+\s*(\d+)")
+_ODA_SALON_RE = re.compile(r"(\d+)\s*oda\D*?(\d+)\s*salon")
+_SINGLE_ODA_RE = re.compile(r"^\s*(\d+)\s*(?:oda)?\s*$")
+_MULTIPLIERS = {"milyar": 1_000_000_000, "milyon": 1_000_000, "bin": 1_000}
+_NUMBER_RE = re.compile(r"\d[\d.,]*")
+
+
+def tr_lower(text: str) -> str:
+    """Türkçe kurallarıyla küçük harfe çevir (I -> ı, İ -> i)"""
+    return text.translate(_TR_LOWER).lower()
+
+
+def fold_tr(text: str) -> str:
+    """Karşılaştırma için metni küçük harfe indirip Türkçe karakterlerini sadeleştir"""
+    if not text:
+        return ""
+    text = tr_lower(text).translate(_TR_ASCII)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def parse_oda(value) -> Tuple[Optional[int], Optional[int]]:
+    """Oda sayısı metninden (oda, salon) çıkar: "3 + 1" -> (3, 1), "stüdyo" -> (1, 0)"""
+    if value is None:
+        return None, None
+    text = fold_tr(str(value))
+    match = _ODA_RE.search(text)
+    if match:
+        # "2.5+1" gibi yarım odalar aşağı yuvarlanır
+        return int(float(match.group(1).replace(",", "."))), int(match.group(2))
+    match = _ODA_SALON_RE.search(text)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    if "studyo" in text or "studio" in text:
+        return 1, 0
+    match = _SINGLE_ODA_RE.match(text)
+    if match:
+        return int(match.group(1)), None
+    return None, None
+
+
+def canonical_oda_sayisi(value) -> str:
+    """Oda sayısını "3+1" biçimine getir; çözümlenemezse metni olduğu gibi bırak"""
+    oda, salon = parse_oda(value)
+    if oda is None:
+        return (value or "").strip() if isinstance(value, str) else ""
+    if salon is None:
+        return str(oda)
+    return f"{oda}+{salon}"
+
+
+def _parse_digits(token: str) -> float:
+    """Türkçe ve İngilizce ayraçlı sayıları çöz: "2.500.000", "1.250,50", "120,5", "1,250,000" """
+    if "." in token and "," in token:
+        # Sonda gelen ayraç ondalık ayraçtır
+        if token.rfind(",") > token.rfind("."):
+            token = token.replace(".", "").replace(",", ".")
+        else:
+            token = token.replace(",", "")
+        return float(token)
+    for sep in (".", ","):
+        if sep in token:
+            head, *groups = token.split(sep)
+            # "2.500.000" ya da "1,250" gibi yalnızca 3 haneli gruplar binlik ayraçtır
+            if head not in ("", "0") and all(len(group) == 3 for group in groups):
+                return float(head + "".join(groups))
+            if len(groups) == 1:
+                return float(f"{head}.{groups[0]}")
+            raise ValueError(token)
+    return float(token)
+
+
+def parse_number(value) -> Optional[float]:
+    """Fiyat/metrekare gibi serbest metinli sayıları float'a çevir
+
+    "2.500.000 TL" -> 2500000.0, "2,5 milyon" -> 2500000.0, "120 m2" -> 120.0
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value == value else None
+    text = fold_tr(str(value))
+    # Birim yazımlarındaki "2" (m2) sayıya karışmasın
+    text = re.sub(r"m\s*[2²]|metrekare|metre kare", " ", text)
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None
+    token = match.group(0).rstrip(".,")
+    try:
+        number = _parse_digits(token)
+    except ValueError:
+        return None
+    rest = text[match.end():]
+    for word, multiplier in _MULTIPLIERS.items():
+        if re.match(rf"\s*{word}", rest):
+            number *= multiplier
+            break
+    return number
@@ -0,0 +1,168 @@
+# backend/offices.py
+
+"""Emlak ofisleri, gönderen numaraların ofislere eşlenmesi ve ilan bölümleri
+
+Her ilan bir ofise aittir (emlak_ilanlar.ofis_id). WhatsApp'tan gelen ilanın
+ofisi gönderen numaradan bulunur (ofis_numaralari); eşlenmemiş numaralar
+DEFAULT_OFIS_ID'ye yazılır.
+
+PostgreSQL'de emlak_ilanlar ofis_id'ye göre LIST bölümlüdür. Kendi bölümü
+olan ofisin sorguları (ofis_id filtresiyle) yalnızca o bölümün tablosunu ve
+indekslerini okur; büyük bir ofisin verisi diğerlerinin indekslerini
+şişirmez. Bölümü olmayan ofislerin ilanları varsayılan bölümde durur ve
+sonradan `bolum` komutuyla kendi bölümlerine taşınabilir.
+
+    python -m backend.offices ekle "Ofis adı" [drive_klasor_id]
+    python -m backend.offices numara <ofis_id> <telefon>
+    python -m backend.offices bolum <ofis_id>
+    python -m backend.offices liste
+"""
+
+import logging
+import os
+from typing import Iterable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from backend.models import Ofis, OfisNumara
+
+logger = logging.getLogger(__name__)
+
+# Numarası hiçbir ofise eşlenmemiş gönderenlerin ilanlarının yazıldığı ofis
+DEFAULT_OFIS_ID = int(os.getenv("DEFAULT_OFIS_ID", 1))
+DEFAULT_OFIS_AD = "Merkez"
+
+
+def normalize_numara(numara: str) -> str:
+    """"whatsapp:+90 555 ..." -> "+90555..." """
+    numara = (numara or "").strip()
+    if numara.lower().startswith("whatsapp:"):
+        numara = numara[len("whatsapp:"):]
+    return "".join(c for c in numara if c.isdigit() or c == "+")
+
+
+def partition_name(ofis_id: int) -> str:
+    return f"emlak_ilanlar_ofis_{int(ofis_id)}"
+
+
+def has_partition(db, ofis_id: int) -> bool:
+    return db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition_name(ofis_id)}).scalar()
+
+
+def create_partition(db, ofis_id: int) -> bool:
+    """Ofise kendi bölümünü aç; ilanları varsayılan bölümdeyse oraya taşınır
+
+    Commit çağırana bırakılır; bölüm zaten varsa False döner.
+    """
+    if db.bind.dialect.name != "postgresql" or has_partition(db, ofis_id):
+        return False
+    name, ofis_id = partition_name(ofis_id), int(ofis_id)
+    # Varsayılan bölümde bu ofisin satırı varken doğrudan PARTITION OF denenirse
+    # PostgreSQL reddeder; önce ayrı tabloya taşınıp sonra bağlanır
+    db.execute(text(f"CREATE TABLE {name} (LIKE emlak_ilanlar INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(text(f"INSERT INTO {name} SELECT * FROM emlak_ilanlar_varsayilan WHERE ofis_id = {ofis_id}"))
+    db.execute(text(f"DELETE FROM emlak_ilanlar_varsayilan WHERE ofis_id = {ofis_id}"))
+    # İndeksler ve birincil anahtar bağlanırken üst tablodakilerden oluşturulur
+    db.execute(text(f"ALTER TABLE emlak_ilanlar ATTACH PARTITION {name} FOR VALUES IN ({ofis_id})"))
+    db.execute(text(f"ANALYZE {name}"))
+    logger.info("Ofis %d için ilan bölümü oluşturuldu: %s", ofis_id, name)
+    return True
+
+
+def ensure_default_ofis(conn):
+    """Varsayılan ofis yoksa ekle (migrate her çalıştığında çağrılır)"""
+    conn.execute(
+        text("INSERT INTO emlak_ofisleri (id, ad, created_at) VALUES (:id, :ad, CURRENT_TIMESTAMP) ON CONFLICT (id) DO NOTHING"),
+        {"id": DEFAULT_OFIS_ID, "ad": DEFAULT_OFIS_AD},
+    )
+    # id'si elle verildiği için sequence geride kalmasın
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('emlak_ofisleri', 'id'), (SELECT max(id) FROM emlak_ofisleri))"
+    ))
+
+
+def create_ofis(db: Session, ad: str, drive_folder_id: Optional[str] = None,
+                numaralar: Iterable[str] = (), bolum: bool = True) -> Ofis:
+    """Yeni ofis ekle; bolum=True ise ilanları baştan kendi bölümünde tutulur"""
+    ofis = Ofis(ad=ad, drive_folder_id=drive_folder_id)
+    db.add(ofis)
+    db.flush()
+    for numara in numaralar:
+        db.add(OfisNumara(numara=normalize_numara(numara), ofis_id=ofis.id))
+    if bolum:
+        create_partition(db, ofis.id)
+    db.commit()
+    db.refresh(ofis)
+    return ofis
+
+
+def set_numara(db: Session, ofis_id: int, numara: str) -> OfisNumara:
+    """Numarayı ofise bağla; başka ofise bağlıysa taşınır"""
+    numara = normalize_numara(numara)
+    kayit = db.get(OfisNumara, numara)
+    if kayit is None:
+        kayit = OfisNumara(numara=numara, ofis_id=ofis_id)
+        db.add(kayit)
+    else:
+        kayit.ofis_id = ofis_id
+    db.commit()
+    return kayit
+
+
+def find_numara(db: Session, numara: str) -> Optional[OfisNumara]:
+    """Numaranın ofis kaydı; hiçbir ofise eşli değilse None"""
+    return db.get(OfisNumara, normalize_numara(numara))
+
+
+def get_ofis_for_numara(db: Session, numara: str) -> Ofis:
+    """Gönderenin ofisi; eşlenmemiş numaralar için varsayılan ofis"""
+    kayit = find_numara(db, numara)
+    ofis = db.get(Ofis, kayit.ofis_id if kayit is not None else DEFAULT_OFIS_ID)
+    if ofis is None:
+        raise ValueError(f"Ofis bulunamadı: {kayit.ofis_id if kayit is not None else DEFAULT_OFIS_ID}")
+    return ofis
+
+
+def missing_ofisler(db: Session, ofis_ids: Iterable[int]) -> List[int]:
+    """Verilenlerden kayıtlı olmayan ofis id'leri"""
+    ofis_ids = set(ofis_ids)
+    known = {row.id for row in db.query(Ofis.id).filter(Ofis.id.in_(ofis_ids))} if ofis_ids else set()
+    return sorted(ofis_ids - known)
+
+
+def drive_root(db: Session, ofis_id: int) -> str:
+    """Ofisin ilan klasörlerinin açılacağı Drive ana klasörü"""
+    ofis = db.get(Ofis, ofis_id)
+    root = (ofis.drive_folder_id if ofis is not None else None) or os.getenv("GOOGLE_DRIVE_MAIN_FOLDER_ID")
+    if not root:
+        raise ValueError("GOOGLE_DRIVE_MAIN_FOLDER_ID bulunamadı")
+    return root
+
+
+if __name__ == "__main__":
+    import sys
+    from backend.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    db = SessionLocal()
+    try:
+        if args[:1] == ["ekle"] and len(args) in (2, 3):
+            ofis = create_ofis(db, args[1], drive_folder_id=args[2] if len(args) == 3 else None)
+            print(f"Ofis eklendi: {ofis.id} - {ofis.ad}")
+        elif args[:1] == ["numara"] and len(args) == 3:
+            kayit = set_numara(db, int(args[1]), args[2])
+            print(f"{kayit.numara} -> ofis {kayit.ofis_id}")
+        elif args[:1] == ["bolum"] and len(args) == 2:
+            created = create_partition(db, int(args[1]))
+            db.commit()
+            print(f"Bölüm oluşturuldu: {partition_name(args[1])}" if created else "Bölüm zaten var")
+        elif args == ["liste"]:
+            for ofis in db.query(Ofis).order_by(Ofis.id):
+                numaralar = [row.numara for row in db.query(OfisNumara).filter(OfisNumara.ofis_id == ofis.id)]
+                bolum = partition_name(ofis.id) if has_partition(db, ofis.id) else "varsayılan bölüm"
+                print(f"{ofis.id} - {ofis.ad} ({bolum}) Drive: {ofis.drive_folder_id or '-'} Numaralar: {', '.join(numaralar) or '-'}")
+        else:
+            print(__doc__.split("\n\n")[-1])
+            sys.exit(1)
+    finally:
+        db.close()
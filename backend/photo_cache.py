@@ -0,0 +1,269 @@
+# backend/photo_cache.py
+
+"""Drive fotoğrafları için diskte boyutu sınırlı LRU önbellek
+
+Fotoğraflar Drive'dan yalnızca önbellekte yoksa indirilir ve
+PHOTO_CACHE_DIR altına dosya ID'siyle yazılır. Küçük resimler (?size=thumb)
+orijinalden bir kez üretilip aynı önbellekte tutulur. Toplam boyut
+PHOTO_CACHE_MAX_BYTES'ı aşınca en uzun süredir okunmayan dosyalar silinir;
+okuma sırası dosyaların mtime değerinde tutulduğu için yeniden başlatmada
+korunur. Aynı dosya için eş zamanlı istekler tek bir indirmede birleştirilir.
+Sunulmakta olan dosyalar sabitlenir (pin) ve gönderim bitene kadar silinmez.
+"""
+
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Optional, Tuple
+from backend import rate_limit
+
+logger = logging.getLogger(__name__)
+
+PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "emlak_photo_cache"))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Küçük resmin en uzun kenarı (piksel)
+THUMB_SIZE = int(os.getenv("PHOTO_THUMB_SIZE", 400))
+THUMB_QUALITY = 80
+
+# Drive dosya ID'leri harf, rakam, "-" ve "_" içerir; yol parçası olarak güvenle kullanılabilir
+FILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{10,128}$")
+THUMB_SUFFIX = ".thumb"
+# ISO-BMFF (ftyp) ana markası -> içerik türü
+FTYP_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"heim": "image/heic", b"heis": "image/heic",
+    b"mif1": "image/heif", b"msf1": "image/heif",
+    b"avif": "image/avif", b"avis": "image/avif",
+    b"isom": "video/mp4", b"iso2": "video/mp4", b"mp41": "video/mp4", b"mp42": "video/mp4",
+    b"qt  ": "video/quicktime",
+}
+
+
+class PhotoNotFound(Exception):
+    """Dosya Drive'da yok ya da proxy üzerinden sunulmuyor"""
+
+
+def is_valid_file_id(file_id: str) -> bool:
+    return bool(FILE_ID_RE.match(file_id or ""))
+
+
+def sniff_media_type(path: str) -> str:
+    """Dosyanın ilk baytlarından görsel türünü belirle"""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"GIF8"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12], "application/octet-stream")
+    return "application/octet-stream"
+
+
+class PhotoCache:
+    def __init__(self, directory: str = PHOTO_CACHE_DIR, max_bytes: int = PHOTO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # anahtar -> boyut; en eski okunan başta
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._inflight = {}
+        # anahtar -> o an dosyayı sunan istek sayısı; sabitlenen dosyalar silinmez
+        self._pins = Counter()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def contains(self, file_id: str, thumb: bool = False) -> bool:
+        with self._lock:
+            return (file_id + THUMB_SUFFIX if thumb else file_id) in self._entries
+
+    def _touch(self, key: str) -> Optional[str]:
+        """Önbellekteki dosyayı en son kullanılan olarak işaretle ve yolunu döndür"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def _store(self, key: str, write: Callable[[io.BufferedWriter], None]) -> str:
+        """Geçici dosyaya yazıp önbelleğe taşı, gerekirse eski dosyaları sil"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(self._path(key))
+        evicted = []
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            for old_key in list(self._entries):
+                if self._total <= self.max_bytes:
+                    break
+                if old_key == key or self._pins[old_key]:
+                    continue
+                self._total -= self._entries.pop(old_key)
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            logger.info("Fotoğraf önbelleğinden %d dosya silindi", len(evicted))
+        return self._path(key)
+
+    def _single_flight(self, key: str, produce: Callable[[], str]) -> str:
+        """Aynı anahtar için yalnızca bir iş parçacığı produce çalıştırır, diğerleri sonucu bekler"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+        try:
+            path = self._touch(key) or produce()
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, file_id: str, fetch: Callable[[str, io.BufferedWriter], None], thumb: bool = False,
+            pin: bool = False) -> str:
+        """Fotoğrafın (ya da küçük resminin) önbellekteki yolunu döndür
+
+        fetch(file_id, dosya) yalnızca orijinal önbellekte yoksa çağrılır.
+        pin=True ise dosya release çağrılana kadar silinmez.
+        """
+        key = file_id + THUMB_SUFFIX if thumb else file_id
+        while True:
+            path = self._get(file_id, fetch, thumb)
+            if not pin:
+                return path
+            with self._lock:
+                if key in self._entries:
+                    self._pins[key] += 1
+                    return path
+            # Yol döndükten sonra başka bir yazım onu silmiş; yeniden al
+
+    def release(self, file_id: str, thumb: bool = False):
+        """get(pin=True) ile sabitlenen dosyayı bırak"""
+        key = file_id + THUMB_SUFFIX if thumb else file_id
+        with self._lock:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+
+    def _get(self, file_id: str, fetch, thumb: bool) -> str:
+        if thumb:
+            key = file_id + THUMB_SUFFIX
+            path = self._touch(key)
+            if path:
+                return path
+            return self._single_flight(key, lambda: self._make_thumb(file_id, fetch))
+        path = self._touch(file_id)
+        if path:
+            return path
+        return self._single_flight(file_id, lambda: self._download(file_id, fetch))
+
+    def _download(self, file_id: str, fetch) -> str:
+        started = time.perf_counter()
+        path = self._store(file_id, lambda f: fetch(file_id, f))
+        logger.info("Fotoğraf Drive'dan indirildi: %s (%.2f sn)", file_id, time.perf_counter() - started)
+        return path
+
+    def _make_thumb(self, file_id: str, fetch) -> str:
+        from PIL import Image, ImageOps
+
+        source = self.get(file_id, fetch, pin=True)
+        try:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                return self._store(
+                    file_id + THUMB_SUFFIX,
+                    lambda f: image.save(f, "JPEG", quality=THUMB_QUALITY, optimize=True),
+                )
+        finally:
+            self.release(file_id)
+
+    def stats(self) -> Tuple[int, int]:
+        """(dosya sayısı, toplam bayt)"""
+        with self._lock:
+            return len(self._entries), self._total
+
+
+def fetch_from_drive(file_id: str, out):
+    """Dosya içeriğini Drive'dan parça parça indir"""
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseDownload
+    from drive_service.uploader import get_drive_service
+
+    request = get_drive_service().files().get_media(fileId=file_id)
+    downloader = MediaIoBaseDownload(out, request, chunksize=4 * 1024 * 1024)
+    try:
+        # Eş zamanlı indirmeler Drive'ın ortak sınırı içinde kalsın
+        with rate_limit.slot("drive"):
+            done = False
+            while not done:
+                _, done = downloader.next_chunk(num_retries=3)
+    except HttpError as e:
+        if e.resp.status == 404:
+            raise PhotoNotFound(file_id) from e
+        raise
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_photo_cache() -> PhotoCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PhotoCache()
+        return _cache
@@ -0,0 +1,201 @@
+# backend/profiling.py
+
+"""İstek başına örnekleyen profilleyici (API ve bot için, isteğe bağlı)
+
+Yavaş bir isteğin süresinin GPT'ye mi, medya indirmeye mi, Drive'a mı yoksa
+veritabanına mı gittiğini görmek içindir. PROFILE_ENABLED kapalıyken
+middleware hiç eklenmez, yani hiçbir ek yük getirmez. Açıkken bir istek üç
+yoldan biriyle profillenir:
+- X-Profile başlığı PROFILE_TOKEN ile eşleşirse (dosya adı yanıtın
+  X-Profile-File başlığında döner),
+- PROFILE_SAMPLE_RATE oranında rastgele,
+- PROFILE_SLOW_MS verilmişse her istek örneklenir, yalnızca bu süreyi
+  aşanlar kaydedilir.
+
+Örnekleyici ayrı bir iş parçacığında PROFILE_INTERVAL_MS'de bir tüm
+iş parçacıklarının yığınını okur; böylece threadpool'da çalışan senkron
+endpoint'ler de görünür. Boşta bekleyen iş parçacıkları (select, wait)
+atlanır. Aynı anda yalnızca bir istek profillenir; eş zamanlı başka
+istekler de çalışıyorsa onların yığınları da profile karışabilir.
+
+Çıktı speedscope biçimindedir (https://www.speedscope.app), PROFILE_DIR
+altına yazılır ve en yeni PROFILE_MAX_FILES dosya tutulur.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes")
+# Boşsa başlıkla tetikleme kapalıdır
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "emlak_profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+PROFILE_HEADER = b"x-profile"
+# Yaprak çerçevesi bunlardan biri olan iş parçacığı boşta bekliyordur
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+}
+
+
+class Sampler(threading.Thread):
+    """Tüm iş parçacıklarının yığınlarını belirli aralıkla toplar"""
+
+    def __init__(self, interval_s: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval_s = interval_s
+        self.started_at = None
+        self.stopped_at = None
+        # iş parçacığı adı -> [(ağırlık sn, çerçeve indisleri)]
+        self.samples = {}
+        self.frames = []
+        self._frame_ids = {}
+        self._done = threading.Event()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self._frame_ids[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return frame_id
+
+    def run(self):
+        me = threading.get_ident()
+        self.started_at = last = time.perf_counter()
+        while not self._done.wait(self.interval_s):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                code = frame.f_code
+                if thread_id == me or (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(names.get(thread_id, str(thread_id)), []).append((weight, stack))
+        self.stopped_at = time.perf_counter()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def speedscope(self, name: str) -> dict:
+        duration = self.stopped_at - self.started_at
+        profiles = []
+        for thread_name, samples in sorted(self.samples.items(), key=lambda item: -len(item[1])):
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": [stack for _, stack in samples],
+                "weights": [weight for weight, _ in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "emlak-profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+def _prune(directory: str, max_files: int):
+    """Dizinde yalnızca en yeni max_files profili bırak"""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".speedscope.json")]
+    paths.sort(key=lambda path: os.path.getmtime(path))
+    for path in paths[:max(0, len(paths) - max_files)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+class ProfilerMiddleware:
+    """Seçilen istekleri profilleyen saf ASGI middleware"""
+
+    def __init__(self, app, name: str = "api"):
+        self.app = app
+        self.name = name
+        self._busy = threading.Lock()
+
+    def _file_name(self, scope) -> str:
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+        return f"{datetime.now():%Y%m%d-%H%M%S-%f}-{self.name}-{scope.get('method', '')}-{path[:60]}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = bool(PROFILE_TOKEN) and _header(scope, PROFILE_HEADER) == PROFILE_TOKEN
+        sampled = forced or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+        if not (sampled or PROFILE_SLOW_MS > 0) or not self._busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        file_name = self._file_name(scope)
+        if forced:
+            async def send_with_header(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-file", file_name.encode())]
+                await send(message)
+        else:
+            send_with_header = send
+
+        sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            sampler.stop()
+            self._busy.release()
+            if sampled or elapsed_ms >= PROFILE_SLOW_MS:
+                self._write(sampler, file_name, scope, elapsed_ms)
+
+    def _write(self, sampler: Sampler, file_name: str, scope, elapsed_ms: float):
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, file_name + ".speedscope.json")
+            title = f"{self.name} {scope.get('method', '')} {scope.get('path', '')} ({elapsed_ms:.0f} ms)"
+            with open(path, "w") as f:
+                json.dump(sampler.speedscope(title), f)
+            _prune(PROFILE_DIR, PROFILE_MAX_FILES)
+            logger.info("Profil yazıldı: %s (%.0f ms)", path, elapsed_ms)
+        except OSError as e:
+            logger.error("Profil yazılamadı: %s", e)
+
+
+def install_profiler(app, name: str):
+    """PROFILE_ENABLED açıksa uygulamaya profilleme middleware'ini ekle"""
+    if PROFILE_ENABLED:
+        app.add_middleware(ProfilerMiddleware, name=name)
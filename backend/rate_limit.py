@@ -0,0 +1,409 @@
+# backend/rate_limit.py
+
+"""OpenAI, Drive ve Twilio çağrıları için ortak hız sınırlama
+
+Her servis için bir token kovası (saniyedeki istek ve ani yük payı) ve bir
+eş zamanlılık sınırı vardır. PostgreSQL kullanılıyorsa ikisi de veritabanında
+tutulur; böylece tüm worker süreçleri aynı sınırı paylaşır. Kova tek bir
+UPDATE ile atomik olarak doldurulup harcanır, eş zamanlılık ise süresi dolan
+kiralamalarla (lease) yönetilir; çöken bir süreç yuvayı sonsuza kadar tutamaz.
+Veritabanı deposu uygulama havuzundan ayrı, küçük bir havuz kullanır. Ona
+ulaşılamazsa RATE_LIMIT_FALLBACK_S boyunca süreç içi sınıra geçilir ve
+ardından ortak depo yeniden denenir.
+
+429 (ya da Drive'ın rateLimitExceeded 403'ü) alındığında kova Retry-After
+süresi boyunca tüm süreçler için durdurulur ve hız yarıya indirilir; başarılı
+çağrılarla yeniden yapılandırılan değere doğru artar. Kuyrukta beklerken
+servisin QUEUE_TIMEOUT_S süresi aşılırsa Overloaded fırlatılır; bot bunu
+kullanıcıya nazik bir "yoğunluk var" mesajıyla bildirir.
+
+Bekleme time.sleep ile yapılır; async kod slot/call'ı olay döngüsünde değil
+run_in_threadpool içinde çağırmalıdır.
+
+Ayarlar servis adıyla ön eklenir, ör. OPENAI_RATE_PER_S, DRIVE_CONCURRENCY.
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+# "db" (süreçler arası, PostgreSQL) ya da "local" (yalnızca bu süreç)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "db")
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 4))
+# Retry-After yoksa üstel bekleme için taban ve tavan (saniye)
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 30.0
+# Kiralama bu süre içinde bırakılmazsa (süreç çöktüyse) yuva yeniden kullanılır
+LEASE_S = 120.0
+# 429 sonrası hız en fazla yapılandırılan değerin bu oranına kadar düşer
+MIN_RATE_RATIO = 0.1
+# Her başarılı token alımında hız yapılandırılan değerin bu oranı kadar artar
+RATE_INCREASE_RATIO = 0.05
+POLL_S = 0.05
+# Ortak depoya ulaşılamazsa bu süre süreç içi sınırla devam edilir, sonra yeniden denenir
+RATE_LIMIT_FALLBACK_S = float(os.getenv("RATE_LIMIT_FALLBACK_S", 30))
+# Hız sınırı deposunun kendi bağlantı havuzu (uygulama havuzundan ayrı)
+RATE_LIMIT_DB_POOL_SIZE = int(os.getenv("RATE_LIMIT_DB_POOL_SIZE", 2))
+
+_DEFAULTS = {
+    # rate_per_s, burst, concurrency, queue_timeout_s
+    "openai": (2.0, 5, 4, 8.0),
+    "drive": (8.0, 20, 8, 8.0),
+    "twilio": (1.0, 5, 4, 5.0),
+}
+
+
+class Overloaded(Exception):
+    """Servis kuyruğu dolu; istek bekleme süresi içinde başlatılamadı"""
+
+    def __init__(self, service: str, retry_after: float = None):
+        super().__init__(f"{service} yoğun, istek ertelendi")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class ServiceLimit:
+    def __init__(self, name: str, rate_per_s: float, burst: int, concurrency: int, queue_timeout_s: float):
+        prefix = name.upper()
+        self.name = name
+        self.rate = float(os.getenv(f"{prefix}_RATE_PER_S", rate_per_s))
+        self.burst = float(os.getenv(f"{prefix}_BURST", burst))
+        self.concurrency = int(os.getenv(f"{prefix}_CONCURRENCY", concurrency))
+        self.queue_timeout_s = float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_S", queue_timeout_s))
+        # Bu süreçte aynı anda bekleyebilecek en fazla istek; fazlası beklemeden reddedilir
+        self.max_waiters = int(os.getenv(f"{prefix}_MAX_WAITERS", self.concurrency * 4))
+
+
+LIMITS = {name: ServiceLimit(name, *values) for name, values in _DEFAULTS.items()}
+
+
+def rate_limit_info(exc: Exception):
+    """Hata bir hız sınırı / aşırı yük hatası mı; öyleyse (True, Retry-After saniyesi) döndür"""
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    resp = getattr(exc, "resp", None)  # googleapiclient HttpError (httplib2 yanıtı)
+    if status is None and resp is not None:
+        status = getattr(resp, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False, None
+    limited = status in (429, 503) or (status == 403 and "ratelimitexceeded" in str(exc).lower())
+    if not limited:
+        return False, None
+
+    headers = getattr(getattr(exc, "response", None), "headers", None) or resp
+    value = None
+    if headers is not None:
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+        except Exception:
+            value = None
+    return True, _parse_retry_after(value)
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _LocalStore:
+    """Kovaları yalnızca bu süreçte tutar (geliştirme ve PostgreSQL dışı veritabanları için)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, limit: ServiceLimit, now: float):
+        bucket = self._buckets.get(limit.name)
+        if bucket is None:
+            bucket = self._buckets[limit.name] = {
+                "tokens": limit.burst, "rate": limit.rate, "updated_at": now, "paused_until": 0.0,
+            }
+        return bucket
+
+    def take(self, limit: ServiceLimit, cost: float) -> float:
+        """Token al; alınamadıysa beklenmesi gereken süreyi döndür (0 = alındı)"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(limit, now)
+            tokens = min(limit.burst, bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"])
+            bucket["tokens"], bucket["updated_at"] = tokens, now
+            if bucket["paused_until"] > now:
+                return bucket["paused_until"] - now
+            if tokens < cost:
+                return (cost - tokens) / bucket["rate"]
+            bucket["tokens"] = tokens - cost
+            bucket["rate"] = min(limit.rate, bucket["rate"] + limit.rate * RATE_INCREASE_RATIO)
+            return 0.0
+
+    def penalize(self, limit: ServiceLimit, pause_s: float):
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(limit, now)
+            bucket["tokens"], bucket["updated_at"] = 0.0, now
+            bucket["rate"] = max(limit.rate * MIN_RATE_RATIO, bucket["rate"] / 2)
+            bucket["paused_until"] = max(bucket["paused_until"], now + pause_s)
+
+    def lease(self, limit: ServiceLimit, holder: str) -> Optional[int]:
+        # Bu süreçteki eş zamanlılık Limiter'ın semaforuyla zaten sınırlı
+        return 0
+
+    def release(self, limit: ServiceLimit, slot: int, holder: str):
+        pass
+
+
+_NOW = "extract(epoch from clock_timestamp())"
+
+
+class _DbStore:
+    """Kovaları ve kiralamaları PostgreSQL'de tutar; tüm worker süreçleri aynı sınırı paylaşır"""
+
+    def __init__(self, engine):
+        from sqlalchemy import text
+
+        self.engine = engine
+        self._text = text
+        self._ready = set()
+
+    def _ensure(self, conn, limit: ServiceLimit):
+        if limit.name in self._ready:
+            return
+        text = self._text
+        conn.execute(text(
+            f"INSERT INTO rate_limit_buckets (service, tokens, rate, updated_at, paused_until) "
+            f"VALUES (:service, :burst, :rate, {_NOW}, 0) ON CONFLICT (service) DO NOTHING"
+        ), {"service": limit.name, "burst": limit.burst, "rate": limit.rate})
+        conn.execute(text(
+            "INSERT INTO rate_limit_leases (service, slot, expires_at) "
+            "SELECT :service, slot, 0 FROM generate_series(0, :n - 1) AS slot "
+            "ON CONFLICT (service, slot) DO NOTHING"
+        ), {"service": limit.name, "n": limit.concurrency})
+        self._ready.add(limit.name)
+
+    def take(self, limit: ServiceLimit, cost: float) -> float:
+        params = {
+            "service": limit.name, "burst": limit.burst, "cost": cost,
+            "max_rate": limit.rate, "step": limit.rate * RATE_INCREASE_RATIO,
+        }
+        with self.engine.begin() as conn:
+            self._ensure(conn, limit)
+            taken = conn.execute(self._text(f"""
+                WITH n AS (SELECT {_NOW} AS t)
+                UPDATE rate_limit_buckets b SET
+                    tokens = LEAST(:burst, b.tokens + (n.t - b.updated_at) * b.rate) - :cost,
+                    rate = LEAST(:max_rate, b.rate + :step),
+                    updated_at = n.t
+                FROM n
+                WHERE b.service = :service AND b.paused_until <= n.t
+                  AND LEAST(:burst, b.tokens + (n.t - b.updated_at) * b.rate) >= :cost
+                RETURNING b.tokens
+            """), params).first()
+            if taken is not None:
+                return 0.0
+            wait = conn.execute(self._text(f"""
+                SELECT GREATEST(b.paused_until - n.t,
+                                (:cost - LEAST(:burst, b.tokens + (n.t - b.updated_at) * b.rate)) / b.rate)
+                FROM rate_limit_buckets b, (SELECT {_NOW} AS t) n
+                WHERE b.service = :service
+            """), params).scalar()
+            return max(float(wait or 0), POLL_S)
+
+    def penalize(self, limit: ServiceLimit, pause_s: float):
+        with self.engine.begin() as conn:
+            self._ensure(conn, limit)
+            conn.execute(self._text(f"""
+                UPDATE rate_limit_buckets SET
+                    tokens = 0,
+                    updated_at = {_NOW},
+                    rate = GREATEST(:min_rate, rate / 2),
+                    paused_until = GREATEST(paused_until, {_NOW} + :pause)
+                WHERE service = :service
+            """), {"service": limit.name, "min_rate": limit.rate * MIN_RATE_RATIO, "pause": pause_s})
+
+    def lease(self, limit: ServiceLimit, holder: str) -> Optional[int]:
+        with self.engine.begin() as conn:
+            self._ensure(conn, limit)
+            return conn.execute(self._text(f"""
+                UPDATE rate_limit_leases l SET holder = :holder, expires_at = {_NOW} + :lease
+                FROM (
+                    SELECT slot FROM rate_limit_leases
+                    WHERE service = :service AND slot < :n AND expires_at < {_NOW}
+                    ORDER BY slot LIMIT 1 FOR UPDATE SKIP LOCKED
+                ) free
+                WHERE l.service = :service AND l.slot = free.slot
+                RETURNING l.slot
+            """), {"service": limit.name, "holder": holder, "lease": LEASE_S, "n": limit.concurrency}).scalar()
+
+    def release(self, limit: ServiceLimit, slot: int, holder: str):
+        with self.engine.begin() as conn:
+            conn.execute(self._text(
+                "UPDATE rate_limit_leases SET holder = NULL, expires_at = 0 "
+                "WHERE service = :service AND slot = :slot AND holder = :holder"
+            ), {"service": limit.name, "slot": slot, "holder": holder})
+
+
+def _db_engine():
+    """Hız sınırı deposu için ayrı küçük havuz
+
+    Webhook bir uygulama oturumu tutarken slot() çağırır; depo uygulama
+    havuzunu kullansaydı havuz dolduğunda kendi bağlantısını beklerdi.
+    """
+    from backend import database
+
+    if database.DB_PGBOUNCER:
+        return database.create_db_engine(database.SQLALCHEMY_DATABASE_URL)
+    return database.create_db_engine(
+        database.SQLALCHEMY_DATABASE_URL, pool_size=RATE_LIMIT_DB_POOL_SIZE, max_overflow=RATE_LIMIT_DB_POOL_SIZE,
+    )
+
+
+class Limiter:
+    def __init__(self, store=None, limits=None, fallback_s: float = None):
+        self.limits = limits or LIMITS
+        self._store = store
+        self._store_lock = threading.Lock()
+        # Ortak depoya ulaşılamazken kullanılan süreç içi depo
+        self._local = _LocalStore()
+        self._fallback_s = RATE_LIMIT_FALLBACK_S if fallback_s is None else fallback_s
+        # Ortak depo bu ana kadar denenmez (None = ortak depo kullanılıyor)
+        self._fallback_until = None
+        self._semaphores = {name: threading.BoundedSemaphore(limit.concurrency) for name, limit in self.limits.items()}
+        self._waiters = {name: 0 for name in self.limits}
+        self._waiters_lock = threading.Lock()
+
+    @property
+    def store(self):
+        """Şu an kullanılan depo; geri çekilme süresince süreç içi depo"""
+        with self._store_lock:
+            if self._store is None:
+                self._store = self._local
+                if RATE_LIMIT_BACKEND == "db":
+                    engine = _db_engine()
+                    if engine.dialect.name == "postgresql":
+                        self._store = _DbStore(engine)
+            if self._fallback_until is not None and time.monotonic() < self._fallback_until:
+                return self._local
+            return self._store
+
+    def _fallback(self, e: Exception):
+        """Ortak depo kullanılamıyorsa sınırlamayı bir süre bu süreçle sürdür"""
+        with self._store_lock:
+            if self._fallback_until is None:
+                print(f"Hız sınırı veritabanına ulaşılamadı, {self._fallback_s:g} sn süreç içi sınıra "
+                      f"geçiliyor: {str(e)}")
+            self._fallback_until = time.monotonic() + self._fallback_s
+
+    def _recovered(self):
+        with self._store_lock:
+            if self._fallback_until is not None and time.monotonic() >= self._fallback_until:
+                print("Hız sınırı veritabanına yeniden ulaşıldı, ortak sınıra dönülüyor")
+                self._fallback_until = None
+
+    def _use_store(self, method: str, limit: ServiceLimit, *args):
+        """Depo yöntemini çağır; (kullanılan depo, sonuç) döndür"""
+        store = self.store
+        try:
+            result = getattr(store, method)(limit, *args)
+        except Exception as e:
+            if store is self._local:
+                raise
+            self._fallback(e)
+            return self._local, getattr(self._local, method)(limit, *args)
+        if store is not self._local and self._fallback_until is not None:
+            self._recovered()
+        return store, result
+
+    def _take(self, limit: ServiceLimit, cost: float) -> float:
+        return self._use_store("take", limit, cost)[1]
+
+    def _lease(self, limit: ServiceLimit, holder: str):
+        return self._use_store("lease", limit, holder)
+
+    def penalize(self, service: str, pause_s: float):
+        """Servisi tüm süreçler için pause_s saniye durdur ve hızını düşür"""
+        self._use_store("penalize", self.limits[service], pause_s)
+
+    @contextmanager
+    def slot(self, service: str, cost: float = 1):
+        """Token ve eş zamanlılık yuvası alınana kadar bekle; süre aşılırsa Overloaded"""
+        limit = self.limits[service]
+        cost = min(float(cost), limit.burst)
+        deadline = time.monotonic() + limit.queue_timeout_s
+        with self._waiters_lock:
+            if self._waiters[service] >= limit.max_waiters:
+                raise Overloaded(service)
+            self._waiters[service] += 1
+        semaphore = self._semaphores[service]
+        acquired = False
+        try:
+            while True:
+                wait = self._take(limit, cost)
+                if not wait:
+                    break
+                if time.monotonic() + wait > deadline:
+                    raise Overloaded(service, retry_after=wait)
+                time.sleep(wait + random.uniform(0, POLL_S))
+            if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise Overloaded(service)
+            acquired = True
+            holder = uuid.uuid4().hex
+            # Kiralama, onu veren depoya bırakılır (arada depo değişmiş olabilir)
+            store, lease = self._lease(limit, holder)
+            while lease is None:
+                if time.monotonic() + POLL_S > deadline:
+                    raise Overloaded(service)
+                time.sleep(POLL_S + random.uniform(0, POLL_S))
+                store, lease = self._lease(limit, holder)
+        except BaseException:
+            if acquired:
+                semaphore.release()
+            raise
+        finally:
+            with self._waiters_lock:
+                self._waiters[service] -= 1
+
+        try:
+            yield
+        finally:
+            try:
+                store.release(limit, lease, holder)
+            except Exception as e:
+                # Kiralama LEASE_S sonunda kendiliğinden düşer
+                print(f"Hız sınırı yuvası bırakılamadı: {str(e)}")
+            semaphore.release()
+
+    def call(self, service: str, fn: Callable, cost: float = 1):
+        """fn'i sınır içinde çalıştır; 429/503'te Retry-After'a uyarak yeniden dene"""
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            with self.slot(service, cost):
+                try:
+                    return fn()
+                except Exception as e:
+                    limited, retry_after = rate_limit_info(e)
+                    if not limited or attempt == RATE_LIMIT_MAX_RETRIES:
+                        raise
+            pause = retry_after if retry_after is not None else min(
+                BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt * random.uniform(0.5, 1.0)
+            )
+            print(f"{service} hız sınırına takıldı, {pause:.1f} sn bekleniyor ({attempt + 1}. deneme)")
+            # Bekleme kovaya yazılır; diğer süreçler de aynı süre boyunca istek göndermez
+            self.penalize(service, pause)
+
+
+limiter = Limiter()
+slot = limiter.slot
+call = limiter.call
+penalize = limiter.penalize
@@ -1,33 +1,245 @@
 # backend/routers/ilan.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
-from backend.database import get_db
-from backend import crud, schemas
+from typing import List, Optional
+from backend.database import get_db, get_read_db, ReadSessionLocal
+from backend import changes, crud, dedup, offices, schemas, deletion, stats
+import csv
+import io
+import json
 import logging
+import os
 
-# Loglama ayarları
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Tek bir toplu yüklemede kabul edilen en fazla ilan sayısı
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", 50000))
+# Tek bir toplu silmede kabul edilen en fazla ilan sayısı
+BULK_DELETE_MAX = 1000
+# Yakınlık aramasında izin verilen en büyük yarıçap (metre)
+NEAR_MAX_RADIUS_M = 50000
+# /changes uzun yoklamasında en fazla bekleme süresi (saniye)
+CHANGES_MAX_WAIT_S = 30
+CHANGES_MAX_LIMIT = 1000
+# Benzerlik dizini kurulurken istemciye önerilen bekleme (saniye)
+SIMILARITY_RETRY_AFTER_S = 30
+# Dışa aktarımda istemciye tek parça halinde gönderilen yaklaşık bayt sayısı
+EXPORT_CHUNK_SIZE = 64 * 1024
+
 @router.get("/", response_model=List[schemas.Ilan])
-def get_ilanlar(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Tüm ilanları getir"""
-    ilanlar = crud.get_ilanlar(db, skip=skip, limit=limit)
+def get_ilanlar(skip: int = 0, limit: int = 100,
+                min_oda: Optional[int] = None, max_oda: Optional[int] = None, salon: Optional[int] = None,
+                min_fiyat: Optional[float] = None, max_fiyat: Optional[float] = None,
+                min_metrekare: Optional[float] = None, max_metrekare: Optional[float] = None,
+                ofis_id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """İlanları getir; ofise, oda, fiyat ve metrekare aralığına göre filtrelenebilir"""
+    ilanlar = crud.get_ilanlar(
+        db, skip=skip, limit=limit,
+        min_oda=min_oda, max_oda=max_oda, salon=salon,
+        min_fiyat=min_fiyat, max_fiyat=max_fiyat,
+        min_metrekare=min_metrekare, max_metrekare=max_metrekare,
+        ofis_id=ofis_id,
+    )
     return ilanlar
 
+def _check_ofisler(db: Session, ofis_ids):
+    """Kayıtlı olmayan ofis 400 ile reddedilir (yazılırsa yabancı anahtar hatası 500 olurdu)"""
+    missing = offices.missing_ofisler(db, ofis_ids)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Bilinmeyen ofis: {', '.join(map(str, missing))}")
+
 @router.post("/", response_model=schemas.Ilan)
 def create_ilan(ilan: schemas.IlanCreate, db: Session = Depends(get_db)):
     """Yeni ilan oluştur"""
+    _check_ofisler(db, [ilan.ofis_id])
     return crud.create_emlak_ilan(db=db, ilan=ilan)
 
+def _parse_bulk_body(body: bytes, content_type: str) -> List[schemas.IlanCreate]:
+    """NDJSON ya da JSON dizisi gövdesini IlanCreate listesine çevir"""
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = [(no, line) for no, line in enumerate(text.splitlines(), start=1) if line.strip()]
+        parse = json.loads
+    else:
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError("Gövde bir JSON dizisi olmalı")
+        items = list(enumerate(data, start=1))
+        parse = lambda item: item
+
+    if len(items) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"En fazla {BULK_MAX_ROWS} ilan gönderilebilir")
+
+    ilanlar = []
+    for no, item in items:
+        try:
+            ilanlar.append(schemas.IlanCreate(**parse(item)))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"{no}. kayıt geçersiz: {e}")
+    return ilanlar
+
+@router.post("/bulk", response_model=schemas.IlanBulkResult)
+async def bulk_create_ilan(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """NDJSON ya da JSON dizisi olarak gelen ilanları tek işlemde ekle
+
+    Gövde (50 bine kadar satırın doğrulanması) iş parçacığında çözülür; olay
+    döngüsü bu sırada diğer istekleri yanıtlamaya devam eder. Kopya tespiti
+    için indeksleme yanıttan sonra arka planda, parça parça yapılır.
+    """
+    body = await request.body()
+    try:
+        ilanlar = await run_in_threadpool(_parse_bulk_body, body, request.headers.get("content-type", ""))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Gövde okunamadı: {e}")
+
+    await run_in_threadpool(_check_ofisler, db, {ilan.ofis_id for ilan in ilanlar})
+    ids = await run_in_threadpool(crud.bulk_create_emlak_ilanlar, db, ilanlar)
+    logger.info("Toplu yükleme: %d ilan eklendi", len(ids))
+    background_tasks.add_task(dedup.index_pending, ids)
+    return {"eklenen": len(ids)}
+
+def _export_chunks(format: str, ofis_id: Optional[int] = None):
+    """İlanları sabit bellekle NDJSON ya da CSV parçaları olarak üret"""
+    db = ReadSessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = None
+        for row in crud.stream_ilanlar(db, ofis_id=ofis_id):
+            if format == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False, default=str))
+                buffer.write("\n")
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+@router.get("/export")
+def export_ilanlar(format: str = "ndjson", ofis_id: Optional[int] = None):
+    """Tüm ilanları (ya da bir ofisinkileri) NDJSON ya da CSV olarak akış halinde dışa aktar"""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format 'ndjson' ya da 'csv' olmalı")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(format, ofis_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="ilanlar.{format}"'},
+    )
+
+@router.get("/stats", response_model=List[schemas.IlanStat], response_model_exclude_none=True)
+def get_ilan_stats(mahalle: Optional[str] = None, oda_sayisi: Optional[str] = None,
+                   group_by: str = "mahalle,oda_sayisi", ofis_id: Optional[int] = None,
+                   db: Session = Depends(get_read_db)):
+    """Mahalle / oda sayısı bazında m² fiyatı ortalaması, standart sapması ve medyanı
+
+    group_by: "mahalle", "oda_sayisi", ikisi (virgülle) ya da boş (tüm ilanlar)
+    """
+    fields = tuple(field.strip() for field in group_by.split(",") if field.strip())
+    if any(field not in stats.GROUP_FIELDS for field in fields):
+        raise HTTPException(status_code=400, detail=f"group_by yalnızca {', '.join(stats.GROUP_FIELDS)} içerebilir")
+    return stats.get_stats(db, mahalle=mahalle, oda_sayisi=oda_sayisi, group_by=fields, ofis_id=ofis_id)
+
+@router.get("/near", response_model=List[schemas.IlanNear])
+def get_ilanlar_near(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                     radius: float = Query(1000, gt=0, le=NEAR_MAX_RADIUS_M), limit: int = Query(50, gt=0, le=500),
+                     ofis_id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Verilen noktaya radius metre içindeki ilanları yakından uzağa getir"""
+    results = crud.get_ilanlar_near(db, lat, lon, radius, limit=limit, ofis_id=ofis_id)
+    return [
+        schemas.IlanNear(**schemas.Ilan.model_validate(ilan).model_dump(), mesafe_m=mesafe_m)
+        for ilan, mesafe_m in results
+    ]
+
+def _read_changes(since: Optional[int], limit: int, ofis_id: Optional[int]):
+    db = ReadSessionLocal()
+    try:
+        if since is None:
+            return {"cursor": changes.latest_seq(db), "changes": [], "has_more": False}
+        cursor, items, has_more = crud.get_ilan_changes(db, since, limit=limit, ofis_id=ofis_id)
+        # Oturum kapanmadan önce şemaya çevir (fotoğraflar yüklü)
+        return schemas.IlanChanges(cursor=cursor, changes=items, has_more=has_more)
+    finally:
+        db.close()
+
+@router.get("/changes", response_model=schemas.IlanChanges)
+async def get_ilan_changes(since: Optional[int] = Query(None, ge=0),
+                           wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT_S),
+                           limit: int = Query(500, gt=0, le=CHANGES_MAX_LIMIT),
+                           ofis_id: Optional[int] = None):
+    """since imlecinden sonraki ilan değişiklikleri ve yeni imleç
+
+    since verilmezse yalnızca güncel imleç döner; istemci önce imleci alıp
+    sonra listeyi çekerse aradaki değişiklikleri kaçırmaz. wait > 0 ise yeni
+    değişiklik gelene ya da süre dolana kadar beklenir (uzun yoklama).
+    Güncel bir istemcinin isteği veritabanına gitmeden yanıtlanır. ofis_id
+    verilirse yalnızca o ofisin değişiklikleri döner ve beklenir.
+    """
+    feed = changes.get_change_feed()
+    if since is not None:
+        if wait:
+            await feed.wait(since, wait, ofis_id)
+        if feed.is_current(since, ofis_id):
+            return {"cursor": since, "changes": [], "has_more": False}
+    return await run_in_threadpool(_read_changes, since, limit, ofis_id)
+
 @router.get("/{ilan_id}", response_model=schemas.Ilan)
-def get_ilan(ilan_id: int, db: Session = Depends(get_db)):
+def get_ilan(ilan_id: int, ofis_id: Optional[int] = None, db: Session = Depends(get_read_db)):
     """ID'ye göre ilan getir"""
-    db_ilan = crud.get_ilan(db, ilan_id=ilan_id)
+    db_ilan = crud.get_ilan(db, ilan_id=ilan_id, ofis_id=ofis_id)
     if db_ilan is None:
         raise HTTPException(status_code=404, detail="İlan bulunamadı")
     return db_ilan
+
+@router.get("/{ilan_id}/similar", response_model=List[schemas.IlanSimilar])
+def get_similar_ilanlar(ilan_id: int, k: int = Query(10, gt=0, le=100), ofis_id: Optional[int] = None,
+                        db: Session = Depends(get_read_db)):
+    """Aynı ofisin ilanlarından metin, fiyat, metrekare ve oda sayısı bakımından en benzer k ilan"""
+    # scipy yüklemesi açılışı yavaşlatmasın
+    from backend import similarity
+
+    db_ilan = crud.get_ilan(db, ilan_id=ilan_id, ofis_id=ofis_id)
+    if db_ilan is None:
+        raise HTTPException(status_code=404, detail="İlan bulunamadı")
+    try:
+        scores = dict(similarity.similar_ilanlar(db, db_ilan, k=k))
+    except similarity.IndexNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(SIMILARITY_RETRY_AFTER_S)})
+    ilanlar = crud.get_ilanlar_by_ids(db, list(scores), ofis_id=db_ilan.ofis_id)
+    return [
+        schemas.IlanSimilar(**schemas.Ilan.model_validate(ilan).model_dump(), benzerlik=scores[ilan.id])
+        for ilan in ilanlar
+    ]
+
+@router.delete("/{ilan_id}")
+def delete_ilan(ilan_id: int, ofis_id: int, db: Session = Depends(get_db)):
+    """Ofisin ilanını, fotoğraflarını ve Drive klasörünü sil"""
+    _check_ofisler(db, [ofis_id])
+    success, message = deletion.delete_ilan(db, ilan_id, ofis_id=ofis_id)
+    if not success:
+        status_code = 404 if message == "İlan bulunamadı" else 502
+        raise HTTPException(status_code=status_code, detail=message)
+    return {"detail": message}
+
+@router.post("/bulk-delete", response_model=schemas.IlanBulkDeleteResult)
+def bulk_delete_ilan(istek: schemas.IlanBulkDelete, ofis_id: int, db: Session = Depends(get_db)):
+    """Ofisin birden fazla ilanını sil; Drive silmeleri toplu isteklerle yapılır"""
+    _check_ofisler(db, [ofis_id])
+    if len(istek.idler) > BULK_DELETE_MAX:
+        raise HTTPException(status_code=413, detail=f"En fazla {BULK_DELETE_MAX} ilan silinebilir")
+    result = deletion.bulk_delete_ilanlar(db, istek.idler, ofis_id=ofis_id)
+    logger.info("Toplu silme: %d silindi, %d hatalı", len(result["silinen"]), len(result["hatali"]))
+    return result
@@ -0,0 +1,63 @@
+# backend/routers/photo.py
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from backend.database import get_read_db
+from backend import crud, photo_cache, rate_limit
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Dosya ID'si değişmediği sürece içerik de değişmez
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class PinnedFileResponse(FileResponse):
+    """Gönderim bitince (bağlantı koparsa da) önbellekteki dosyanın sabitlemesini bırakır"""
+
+    def __init__(self, path, release, **kwargs):
+        super().__init__(path, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+@router.get("/{file_id}")
+def get_photo(file_id: str, size: Optional[Literal["thumb"]] = None, db: Session = Depends(get_read_db)):
+    """Drive fotoğrafını önbellekten sun; Range istekleri ve ?size=thumb desteklenir"""
+    if not photo_cache.is_valid_file_id(file_id):
+        raise HTTPException(status_code=400, detail="Geçersiz dosya ID'si")
+
+    cache = photo_cache.get_photo_cache()
+    thumb = size == "thumb"
+    # Drive'a gitmeden önce dosyanın bir ilana ait olduğunu doğrula
+    if not cache.contains(file_id, thumb) and not crud.photo_exists(db, file_id):
+        raise HTTPException(status_code=404, detail="Fotoğraf bulunamadı")
+    try:
+        # Gönderim sürerken önbellek dolup dosyayı silmesin
+        path = cache.get(file_id, photo_cache.fetch_from_drive, thumb=thumb, pin=True)
+    except photo_cache.PhotoNotFound:
+        raise HTTPException(status_code=404, detail="Fotoğraf Drive'da bulunamadı")
+    except rate_limit.Overloaded:
+        raise
+    except Exception as e:
+        logger.error("Fotoğraf alınamadı: %s: %s", file_id, e)
+        raise HTTPException(status_code=502, detail="Fotoğraf Drive'dan alınamadı")
+
+    try:
+        return PinnedFileResponse(
+            path,
+            lambda: cache.release(file_id, thumb),
+            media_type=photo_cache.sniff_media_type(path),
+            # mtime LRU için güncellendiğinden varsayılan ETag yerine dosya ID'si kullanılır
+            headers={"Cache-Control": CACHE_CONTROL, "ETag": f'"{file_id}{"-thumb" if thumb else ""}"'},
+        )
+    except BaseException:
+        cache.release(file_id, thumb)
+        raise
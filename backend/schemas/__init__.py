@@ -1 +1 @@
-from .ilan import Ilan, IlanCreate, IlanBase 
\ No newline at end of file
+from .ilan import Ilan, IlanCreate, IlanBase, IlanBulkResult, IlanBulkDelete, IlanBulkDeleteResult, IlanStat, IlanNear, IlanSimilar, IlanDegisiklik, IlanChanges
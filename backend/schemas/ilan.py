@@ -1,10 +1,30 @@
 # backend/schemas/ilan.py
 
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, computed_field, field_validator
+from typing import Optional, List, Dict
+from backend.normalize import canonical_oda_sayisi, parse_number
 
 class FotoSchema(BaseModel):
-    url: str
+    drive_file_id: str
+    sira: int
+    boyut: Optional[int] = None
+    thumbnail_id: Optional[str] = None
+
+    @computed_field
+    @property
+    def url(self) -> str:
+        return f"https://drive.google.com/file/d/{self.drive_file_id}/view?usp=sharing"
+
+    @computed_field
+    @property
+    def proxy_url(self) -> str:
+        """Önbellekli /photo uç noktası üzerinden göreli adres"""
+        return f"/photo/{self.drive_file_id}"
+
+    @computed_field
+    @property
+    def thumb_url(self) -> str:
+        return f"/photo/{self.drive_file_id}?size=thumb"
 
     class Config:
         from_attributes = True
@@ -18,16 +38,76 @@ class IlanBase(BaseModel):
     oda_sayisi: str
     metrekare: Optional[float] = None
     drive_link: Optional[str] = None
+    drive_folder_id: Optional[str] = None
+    benzer_ilan_id: Optional[int] = None
+    # İlanın ofisi (emlak_ofisleri.id)
+    ofis_id: int
 
 class IlanCreate(IlanBase):
-    pass
+    @field_validator("fiyat", "metrekare", mode="before")
+    @classmethod
+    def parse_sayi(cls, value):
+        # "2.500.000 TL", "120 m2" gibi metinleri sayıya çevir
+        if isinstance(value, str):
+            return parse_number(value)
+        return value
+
+    @field_validator("oda_sayisi", mode="before")
+    @classmethod
+    def normalize_oda_sayisi(cls, value):
+        return canonical_oda_sayisi(value) if isinstance(value, str) else value
 
 class Ilan(IlanBase):
     id: int
+    oda: Optional[int] = None
+    salon: Optional[int] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    fotolar: List[FotoSchema] = []
 
     class Config:
         from_attributes = True
 
+class IlanNear(Ilan):
+    mesafe_m: float
+
+class IlanSimilar(Ilan):
+    # 0-1 arası; metin benzerliği ile fiyat / metrekare / oda yakınlığının ağırlıklı toplamı
+    benzerlik: float
+
+class IlanDegisiklik(BaseModel):
+    seq: int
+    # "insert", "update" ya da "delete"; silinen ilan için ilan boştur
+    islem: str
+    ilan_id: int
+    ilan: Optional[Ilan] = None
+
+class IlanChanges(BaseModel):
+    # Bir sonraki istekte since olarak gönderilir
+    cursor: int
+    changes: List[IlanDegisiklik] = []
+    # True ise istemci beklemeden hemen tekrar sormalı
+    has_more: bool = False
+
+class IlanBulkResult(BaseModel):
+    eklenen: int
+
+class IlanBulkDelete(BaseModel):
+    idler: List[int]
+
+class IlanBulkDeleteResult(BaseModel):
+    silinen: List[int] = []
+    bulunamayan: List[int] = []
+    hatali: Dict[int, str] = {}
+
+class IlanStat(BaseModel):
+    mahalle: Optional[str] = None
+    oda_sayisi: Optional[str] = None
+    adet: int
+    ortalama_m2_fiyat: float
+    std_m2_fiyat: float
+    medyan_m2_fiyat: float
+
 class IlanResponse(BaseModel):
     id: int
     baslik: str
@@ -47,7 +127,6 @@ class PhotoUploadSessionBase(BaseModel):
     expected_photos: int
     received_photos: int = 0
     drive_folder_id: Optional[str] = None
-    photo_links: List[str] = []
     state: str = "waiting_for_photos"
 
 class PhotoUploadSessionCreate(PhotoUploadSessionBase):
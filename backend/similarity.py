@@ -0,0 +1,528 @@
+# backend/similarity.py
+
+"""Benzer ilanlar: TF-IDF metin benzerliği + fiyat / metrekare / oda yakınlığı
+
+Başlık, açıklama ve mahalle metni Türkçe karakterleri sadeleştirilerek
+sözcüklere ayrılır. Sözcükler özetleme hilesiyle (hashing trick) sabit
+N_FEATURES boyutlu bir uzaya eşlenir, bu yüzden sözlük tutulmaz. Her ilan
+L2 normlu bir TF-IDF satırıdır. Matris sütun sıralı (CSC, yani sözcük
+başına ilan listesi) olarak diske .npy dosyalarına yazılır ve mmap ile
+açılır; worker açılışta dosyaları okumaz, sorgulanan sözcüklerin sayfaları
+gerektikçe belleğe gelir.
+
+Bir sorgu, ilanın en ağırlıklı QUERY_TERMS sözcüğünün ilan listelerini
+toplar (np.bincount ile vektörel nokta çarpımı); okunan liste uzunluğu
+QUERY_MAX_POSTINGS ile sınırlıdır, böylece süre ilan sayısıyla büyümez. Metin puanı sıfırdan büyük
+adaylar sayısal yakınlıkla birleştirilir ve en iyi k tanesi argpartition ile
+seçilir. İlanların yarısından fazlasında geçen sözcükler (MAX_DF) dizine
+alınmaz; hem ayırt edici değillerdir hem de listeleri çok uzundur.
+
+Her ofisin dizini ayrıdır (SIMILARITY_DIR/ofis_<id>): benzerler yalnızca
+aynı ofisin ilanlarından seçilir, büyük bir ofisin ilan listeleri diğer
+ofislerin sorgularını uzatmaz.
+
+Dizin `python -m backend.similarity build [ofis_id]` ile kurulur. Aynı ofisin
+kurulumları (PostgreSQL'de advisory lock ile süreçler arasında) sıraya girer;
+meta.json en son yazılır ve yalnızca ondan eski kuşakların dosyaları silinir.
+Dizini olmayan bir ofis sorgulandığında kurulum arka planda başlatılır ve
+kurulum bitene kadar IndexNotReady fırlatılır; istek kurulumu beklemez.
+Sonradan eklenen ve
+silinen ilanlar değişiklik günlüğünden (bkz. backend/changes.py) okunup
+bellekteki küçük bir ek parçaya işlenir. IDF değerleri kurulumda sabitlenir;
+ek parça büyüdükçe dizini yeniden kurmak (ör. günlük cron) yeterlidir.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from backend import changes, models
+from backend.normalize import fold_tr, parse_oda
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_DIR = os.getenv("SIMILARITY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "similarity"))
+# Değişiklik günlüğünün en sık okunma aralığı (saniye)
+SIMILARITY_SYNC_S = float(os.getenv("SIMILARITY_SYNC_S", 2))
+N_FEATURES = 1 << 18
+# Bu orandan fazla ilanda geçen sözcükler dizine alınmaz (küçük veri setlerinde uygulanmaz)
+MAX_DF = 0.5
+MAX_DF_MIN_DOCS = 100
+# Sorguda kullanılan en ağırlıklı sözcük sayısı ve okunacak en fazla ilan listesi girdisi
+QUERY_TERMS = 32
+QUERY_MAX_POSTINGS = int(os.getenv("SIMILARITY_MAX_POSTINGS", 200000))
+TEXT_WEIGHT = 0.7
+# log(fiyat), log(metrekare), oda
+NUMERIC_FIELDS = 3
+BUILD_BATCH_SIZE = 5000
+CATCH_UP_BATCH_SIZE = 1000
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _terms(fields: Dict) -> Counter:
+    """İlan metnindeki sözcüklerin özet indisleri ve sayıları"""
+    text = fold_tr(" ".join(str(fields.get(key) or "") for key in ("baslik", "aciklama", "mahalle")))
+    return Counter(
+        zlib.crc32(token.encode()) % N_FEATURES for token in _TOKEN.findall(text) if len(token) > 1
+    )
+
+
+def _numeric(fields: Dict) -> List[float]:
+    fiyat, metrekare = fields.get("fiyat"), fields.get("metrekare")
+    oda = fields.get("oda")
+    if oda is None and fields.get("oda_sayisi"):
+        oda = parse_oda(fields["oda_sayisi"])[0]
+    return [
+        math.log1p(fiyat) if fiyat and fiyat > 0 else math.nan,
+        math.log1p(metrekare) if metrekare and metrekare > 0 else math.nan,
+        float(oda) if oda is not None else math.nan,
+    ]
+
+
+class IndexNotReady(Exception):
+    """Ofisin benzerlik dizini henüz yok; arka planda kuruluyor"""
+
+    def __init__(self, ofis_id: int):
+        super().__init__(f"Ofis {ofis_id} için benzerlik dizini hazırlanıyor")
+        self.ofis_id = ofis_id
+
+
+def _ilan_fields(ilan) -> Dict:
+    return {key: getattr(ilan, key) for key in ("id", "baslik", "aciklama", "mahalle", "fiyat", "metrekare", "oda", "oda_sayisi")}
+
+
+class SimilarityIndex:
+    """Diskteki temel parça (mmap) + bellekteki ek parça"""
+
+    def __init__(self, directory: str, meta: Dict, arrays: Dict[str, np.ndarray]):
+        self.directory = directory
+        self.meta = meta
+        self.ofis_id = meta["ofis_id"]
+        self.generation = meta["generation"]
+        self.cursor = meta["cursor"]
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.data = arrays["data"]
+        self.ids = arrays["ids"]
+        self.numeric = arrays["numeric"]
+        self.idf = arrays["idf"]
+        self.mean = np.array(meta["numeric_mean"], dtype=np.float32)
+        self.std = np.array(meta["numeric_std"], dtype=np.float32)
+        # Silinen ilanların temel parçadaki satırları
+        self.dead = np.zeros(len(self.ids), dtype=bool)
+        # ilan_id -> (sözcük indisleri, ağırlıklar, ölçeklenmiş sayısal alanlar)
+        self._delta: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        # Sorguların okuduğu değişmez kopya; dead / _delta değişince yeniden kurulur
+        self._snapshot = None
+        # _lock dead, _delta ve _snapshot'ı korur; _sync_lock günlük okumalarını sıraya koyar
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_at = 0.0
+
+    # --- kurulum ve yükleme ---
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["SimilarityIndex"]:
+        """Diskteki dizini aç; yoksa ya da okunamıyorsa None (yeniden kurulmalı)"""
+        # meta.json okunduktan sonra yeni bir kuşak yazılıp eskisi silinmiş
+        # olabilir; bir kez daha denenir
+        for _ in range(2):
+            try:
+                with open(os.path.join(directory, "meta.json")) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if meta.get("n_features") != N_FEATURES or "ofis_id" not in meta:
+                return None
+            prefix = os.path.join(directory, str(meta["generation"]))
+            try:
+                arrays = {
+                    name: np.load(f"{prefix}.{name}.npy", mmap_mode="r")
+                    for name in ("indptr", "indices", "data", "ids", "numeric", "idf")
+                }
+            except (OSError, ValueError) as e:
+                logger.warning("Benzerlik dizini okunamadı (%s): %s", directory, e)
+                continue
+            return cls(directory, meta, arrays)
+        return None
+
+    # --- vektörler ---
+
+    def _text_vector(self, fields: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        counts = _terms(fields)
+        if not counts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        terms = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        weights = tf * self.idf[terms]
+        keep = weights > 0
+        terms, weights = terms[keep], weights[keep]
+        norm = np.linalg.norm(weights)
+        return terms, (weights / norm if norm else weights).astype(np.float32)
+
+    def _scaled_numeric(self, fields: Dict) -> np.ndarray:
+        return ((np.array(_numeric(fields), dtype=np.float32) - self.mean) / self.std).astype(np.float32)
+
+    # --- günlükten güncelleme ---
+
+    def _base_row(self, ilan_id: int) -> int:
+        row = int(np.searchsorted(self.ids, ilan_id))
+        return row if row < len(self.ids) and self.ids[row] == ilan_id else -1
+
+    def _add(self, fields: Dict):
+        row = self._base_row(fields["id"])
+        if row >= 0:
+            self.dead[row] = True
+        terms, weights = self._text_vector(fields)
+        self._delta[fields["id"]] = (terms, weights, self._scaled_numeric(fields))
+        self._snapshot = None
+
+    def _remove(self, ilan_id: int):
+        row = self._base_row(ilan_id)
+        if row >= 0:
+            self.dead[row] = True
+        self._delta.pop(ilan_id, None)
+        self._snapshot = None
+
+    def add(self, fields: Dict):
+        """İlanı ek parçaya ekle (güncellemede eski satırın yerine geçer)"""
+        with self._lock:
+            self._add(fields)
+
+    def remove(self, ilan_id: int):
+        with self._lock:
+            self._remove(ilan_id)
+
+    def catch_up(self, db: Session, force: bool = False) -> int:
+        """Kurulumdan / son okumadan beri değişen ilanları işle, işlenen değişiklik sayısını döndür"""
+        if not force and time.monotonic() - self._synced_at < SIMILARITY_SYNC_S:
+            return 0
+        with self._sync_lock:
+            # Kilidi beklerken başka bir istek günlüğü okumuş olabilir
+            if not force and time.monotonic() - self._synced_at < SIMILARITY_SYNC_S:
+                return 0
+            applied = 0
+            while True:
+                rows = (
+                    db.query(models.IlanDegisiklik)
+                    .filter(models.IlanDegisiklik.ofis_id == self.ofis_id, models.IlanDegisiklik.seq > self.cursor)
+                    .order_by(models.IlanDegisiklik.seq)
+                    .limit(CATCH_UP_BATCH_SIZE)
+                    .all()
+                )
+                if not rows:
+                    break
+                last = {row.ilan_id: row.islem for row in rows}
+                live_ids = [ilan_id for ilan_id, islem in last.items() if islem != changes.DELETE]
+                ilanlar = {
+                    ilan.id: ilan for ilan in
+                    db.query(models.Ilan).filter(models.Ilan.ofis_id == self.ofis_id, models.Ilan.id.in_(live_ids))
+                } if live_ids else {}
+                # Veritabanı okunurken sorgular beklemesin; kilit yalnızca uygularken alınır
+                with self._lock:
+                    for ilan_id in last:
+                        if ilan_id in ilanlar:
+                            self._add(_ilan_fields(ilanlar[ilan_id]))
+                        else:
+                            self._remove(ilan_id)
+                self.cursor = rows[-1].seq
+                applied += len(rows)
+            self._synced_at = time.monotonic()
+            return applied
+
+    def _current_snapshot(self):
+        """Silinenler maskesi ve ek parça (id'ler, CSR matris, sayısal alanlar)
+
+        Kopyalar kilit altında alınır ve bir daha değiştirilmez; sorgu kilitsiz
+        okur. Değişiklik olmadıkça yeniden kurulmaz.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            items = list(self._delta.items())
+            ids = np.array([ilan_id for ilan_id, _ in items], dtype=np.int64)
+            indptr = np.zeros(len(items) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(terms) for _, (terms, _, _) in items])
+            indices = np.concatenate([terms for _, (terms, _, _) in items]) if items else np.empty(0, dtype=np.int32)
+            data = np.concatenate([weights for _, (_, weights, _) in items]) if items else np.empty(0, dtype=np.float32)
+            matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(items), N_FEATURES))
+            numeric = np.array([values for _, (_, _, values) in items], dtype=np.float32).reshape(-1, NUMERIC_FIELDS)
+            self._snapshot = (self.dead.copy(), ids, matrix, numeric)
+            return self._snapshot
+
+    # --- sorgu ---
+
+    def _numeric_similarity(self, numeric: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Ölçeklenmiş alanlardaki farktan 0-1 arası yakınlık; eksik alan nötr (0.5) sayılır"""
+        similarity = np.exp(-0.5 * np.square(numeric - query))
+        return np.where(np.isnan(similarity), np.float32(0.5), similarity).mean(axis=1)
+
+    def query(self, fields: Dict, k: int = 10, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """En benzer k ilan: [(ilan_id, puan)], puan 0-1 arası"""
+        terms, weights = self._text_vector(fields)
+        if len(terms) == 0:
+            return []
+        if len(terms) > QUERY_TERMS:
+            top = np.argpartition(-weights, QUERY_TERMS)[:QUERY_TERMS]
+            terms, weights = terms[top], weights[top]
+        query_numeric = self._scaled_numeric(fields)
+        dead, delta_ids, delta_matrix, delta_numeric = self._current_snapshot()
+
+        # Temel parça: sözcüklerin ilan listeleri üzerinden nokta çarpımı. Ağırlığı
+        # yüksek sözcüklerden başlanır; toplam liste uzunluğu QUERY_MAX_POSTINGS'i
+        # aşacaksa sıradaki (düşük IDF'li, uzun listeli) sözcükler atlanır.
+        lengths = (self.indptr[terms + 1] - self.indptr[terms]).astype(np.int64)
+        chosen, budget = [], QUERY_MAX_POSTINGS
+        for i in np.argsort(-weights):
+            if lengths[i] and (lengths[i] <= budget or not chosen):
+                chosen.append(i)
+                budget -= lengths[i]
+        ids, scores = [], []
+        if chosen:
+            starts = self.indptr[terms[chosen]]
+            rows = np.concatenate([self.indices[s:s + n] for s, n in zip(starts, lengths[chosen])])
+            values = np.concatenate([self.data[s:s + n] for s, n in zip(starts, lengths[chosen])])
+            text = np.bincount(rows, weights=values * np.repeat(weights[chosen], lengths[chosen]), minlength=len(self.ids))
+            text[dead] = 0
+            candidates = np.flatnonzero(text)
+            text = text[candidates].astype(np.float32)
+            ids.append(np.asarray(self.ids[candidates], dtype=np.int64))
+            scores.append(TEXT_WEIGHT * text + (1 - TEXT_WEIGHT) * self._numeric_similarity(self.numeric[candidates], query_numeric))
+
+        # Ek parça: küçük CSR matris ile çarpım
+        if len(delta_ids):
+            query_vector = sparse.csr_matrix((weights, terms, [0, len(terms)]), shape=(1, N_FEATURES))
+            text = (delta_matrix @ query_vector.T).toarray().ravel().astype(np.float32)
+            hit = text > 0
+            if hit.any():
+                ids.append(delta_ids[hit])
+                scores.append(TEXT_WEIGHT * text[hit] + (1 - TEXT_WEIGHT) * self._numeric_similarity(delta_numeric[hit], query_numeric))
+
+        if not ids:
+            return []
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        if exclude_id is not None:
+            keep = ids != exclude_id
+            ids, scores = ids[keep], scores[keep]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in order]
+
+
+def office_dir(ofis_id: int) -> str:
+    return os.path.join(SIMILARITY_DIR, f"ofis_{int(ofis_id)}")
+
+
+def _meta_generation(directory: str) -> Optional[int]:
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+
+
+_local_build_lock = threading.Lock()
+
+
+@contextmanager
+def _build_lock(db: Session, ofis_id: int):
+    """Aynı ofisin dizinini aynı anda yalnızca bir kurulum yazsın"""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        with _local_build_lock:
+            yield
+        return
+    # Oturum düzeyinde kilit ayrı bir bağlantıda tutulur; çağıranın işlemine karışmaz
+    with bind.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(hashtext('emlak_similarity'), :ofis_id)"), {"ofis_id": ofis_id})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('emlak_similarity'), :ofis_id)"), {"ofis_id": ofis_id})
+
+
+def build(db: Session, ofis_id: int, directory: Optional[str] = None) -> Dict:
+    """Ofisin tüm ilanlarından dizini baştan kur ve diske yaz"""
+    with _build_lock(db, ofis_id):
+        return _build(db, ofis_id, directory or office_dir(ofis_id))
+
+
+def _build(db: Session, ofis_id: int, directory: str) -> Dict:
+    from backend.crud import stream_ilanlar
+
+    # İmleç kurulumdan önce alınır; kurulum sırasında gelen değişiklikler catch_up ile işlenir
+    cursor = changes.latest_seq(db)
+    return write_index(stream_ilanlar(db, batch_size=BUILD_BATCH_SIZE, ofis_id=ofis_id), ofis_id, cursor, directory)
+
+
+def write_index(rows: Iterable[Dict], ofis_id: int, cursor: int, directory: str) -> Dict:
+    """İlan satırlarından (id sırasıyla) dizini kurup yeni kuşak olarak diske yaz
+
+    Veritabanına dokunmaz; cursor, satırların okunduğu andaki günlük seq'idir.
+    """
+    started = time.monotonic()
+    ids, numeric = [], []
+    # Python listeleri yerine sıkışık diziler: 1M ilanda ~40M girdi olur
+    indptr, indices, counts = [0], array("i"), array("i")
+    for row in rows:
+        terms = _terms(row)
+        ids.append(row["id"])
+        numeric.append(_numeric(row))
+        indices.extend(terms.keys())
+        counts.extend(terms.values())
+        indptr.append(len(indices))
+
+    n_docs = len(ids)
+    indices = np.frombuffer(indices, dtype=np.int32) if indices else np.empty(0, dtype=np.int32)
+    indptr = np.array(indptr, dtype=np.int64)
+    df = np.bincount(indices, minlength=N_FEATURES)
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+    if n_docs >= MAX_DF_MIN_DOCS:
+        idf[df > MAX_DF * n_docs] = 0
+
+    # TF-IDF ağırlıkları ve satır başına L2 normalizasyonu
+    data = (1 + np.log(np.frombuffer(counts, dtype=np.int32).astype(np.float32) if counts else np.empty(0, dtype=np.float32))) * idf[indices]
+    row_of = np.repeat(np.arange(n_docs), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_of, weights=np.square(data), minlength=n_docs)).astype(np.float32)
+    data = data / np.where(norms > 0, norms, 1)[row_of]
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(n_docs, N_FEATURES))
+    matrix.eliminate_zeros()
+    matrix = matrix.tocsc()
+    matrix.sort_indices()
+
+    numeric = np.array(numeric, dtype=np.float64).reshape(-1, NUMERIC_FIELDS)
+    with np.errstate(invalid="ignore"):
+        mean = np.nan_to_num(np.nanmean(numeric, axis=0)) if n_docs else np.zeros(NUMERIC_FIELDS)
+        std = np.nan_to_num(np.nanstd(numeric, axis=0), nan=1.0) if n_docs else np.ones(NUMERIC_FIELDS)
+    std[std == 0] = 1.0
+
+    os.makedirs(directory, exist_ok=True)
+    # Kuşaklar sayısal olarak artmalı; eski kuşak temizliği buna dayanır
+    generation = max(int(time.time() * 1000), (_meta_generation(directory) or 0) + 1)
+    prefix = os.path.join(directory, str(generation))
+    arrays = {
+        "indptr": matrix.indptr.astype(np.int64),
+        "indices": matrix.indices.astype(np.int32),
+        "data": matrix.data.astype(np.float32),
+        "ids": np.array(ids, dtype=np.int64),
+        "numeric": ((numeric - mean) / std).astype(np.float32),
+        "idf": idf,
+    }
+    for name, values in arrays.items():
+        np.save(f"{prefix}.{name}.npy", values)
+    meta = {
+        "generation": generation, "ofis_id": ofis_id, "cursor": cursor, "n_docs": n_docs, "n_features": N_FEATURES,
+        "nnz": int(matrix.nnz), "numeric_mean": mean.tolist(), "numeric_std": std.tolist(),
+    }
+    tmp_path = os.path.join(directory, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    # Yalnızca meta.json'un gösterdiğinden eski kuşakları sil (açık mmap'ler
+    # silinen dosyayı okumaya devam eder)
+    for name in os.listdir(directory):
+        prefix = name.split(".", 1)[0]
+        if name.endswith(".npy") and prefix.isdigit() and int(prefix) < generation:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    logger.info("Benzerlik dizini kuruldu (ofis %s): %d ilan, %d sözcük girdisi, %.1f sn",
+                ofis_id, n_docs, matrix.nnz, time.monotonic() - started)
+    return meta
+
+
+# ofis_id -> dizin
+_indexes: Dict[int, SimilarityIndex] = {}
+# Arka planda dizini kurulan ofisler
+_building: set = set()
+_index_lock = threading.Lock()
+
+
+def _build_missing(ofis_id: int):
+    from backend.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        directory = office_dir(ofis_id)
+        with _build_lock(db, ofis_id):
+            # Kilit beklenirken başka bir süreç kurmuş olabilir
+            if SimilarityIndex.load(directory) is None:
+                _build(db, ofis_id, directory)
+    except Exception:
+        logger.exception("Benzerlik dizini kurulamadı (ofis %s)", ofis_id)
+    finally:
+        db.close()
+        with _index_lock:
+            _building.discard(ofis_id)
+
+
+def schedule_build(ofis_id: int) -> bool:
+    """Ofisin dizinini arka planda kur; zaten kuruluyorsa False"""
+    with _index_lock:
+        if ofis_id in _building:
+            return False
+        _building.add(ofis_id)
+    threading.Thread(target=_build_missing, args=(ofis_id,), name=f"similarity-build-{ofis_id}", daemon=True).start()
+    return True
+
+
+def get_similarity_index(db: Session, ofis_id: int) -> SimilarityIndex:
+    """Süreç başına ofis dizini; başka süreç yeniden kurduysa yeni kuşak yüklenir
+
+    Diskte okunabilir dizin yoksa kurulum arka planda başlatılır ve
+    IndexNotReady fırlatılır.
+    """
+    directory = office_dir(ofis_id)
+    with _index_lock:
+        index = _indexes.get(ofis_id)
+        generation = _meta_generation(directory)
+        if index is None or (generation is not None and generation != index.generation):
+            loaded = SimilarityIndex.load(directory)
+            if loaded is not None:
+                index = _indexes[ofis_id] = loaded
+    if index is None:
+        schedule_build(ofis_id)
+        raise IndexNotReady(ofis_id)
+    index.catch_up(db)
+    return index
+
+
+def similar_ilanlar(db: Session, ilan, k: int = 10) -> List[Tuple[int, float]]:
+    """Verilen ilana kendi ofisinde en benzer k ilanın (id, puan) listesi; dizin yoksa IndexNotReady"""
+    return get_similarity_index(db, ilan.ofis_id).query(_ilan_fields(ilan), k=k, exclude_id=ilan.id)
+
+
+if __name__ == "__main__":
+    from backend.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if args[:1] != ["build"] or len(args) > 2 or not all(arg.isdigit() for arg in args[1:]):
+        print("Kullanım: python -m backend.similarity build [ofis_id]")
+        sys.exit(1)
+    session = SessionLocal()
+    try:
+        ofis_ids = [int(args[1])] if len(args) == 2 else [ofis.id for ofis in session.query(models.Ofis).order_by(models.Ofis.id)]
+        for ofis_id in ofis_ids:
+            print(f"Benzerlik dizini (ofis {ofis_id}): {build(session, ofis_id)}")
+    finally:
+        session.close()
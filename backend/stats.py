@@ -0,0 +1,202 @@
+# backend/stats.py
+
+"""Mahalle ve oda sayısına göre m² fiyatı istatistikleri
+
+Her ofisin her (mahalle, oda_sayisi) çifti için adet, toplam, kareler toplamı ve
+medyan için logaritmik kovalı bir çeyreklik taslağı (DDSketch benzeri)
+ilan_istatistikleri tablosunda tutulur. İlan eklenip silindikçe ilgili satır
+aynı işlem içinde artımlı olarak güncellenir; sorgular ilan tablosunu taramaz.
+Taslaklar toplanabilir olduğundan mahalle ya da oda düzeyindeki özetler
+satırlar birleştirilerek hesaplanır.
+
+Tutarsızlık durumunda tabloyu baştan kurmak için:
+    python -m backend.stats rebuild
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend import models
+
+# Taslağın göreli hata payı: medyan gerçek değerin %1'i içinde kalır
+SKETCH_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+GROUP_FIELDS = ("mahalle", "oda_sayisi")
+
+
+def _bucket(value: float) -> int:
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def _bucket_value(index: int) -> float:
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+def sketch_quantile(sketch: Dict[str, int], q: float) -> Optional[float]:
+    """Taslaktan q. çeyreklik değerini tahmin et"""
+    buckets = sorted((int(index), count) for index, count in sketch.items() if count > 0)
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for index, count in buckets:
+        seen += count
+        if seen > rank:
+            return _bucket_value(index)
+    return _bucket_value(buckets[-1][0])
+
+
+def _get(row, field):
+    return row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+
+
+def stat_key(row) -> Optional[Tuple[int, str, str]]:
+    """İlanın (ofis, mahalle, oda) anahtarı; m² fiyatı hesaplanamıyorsa None"""
+    fiyat = _get(row, "fiyat")
+    metrekare = _get(row, "metrekare")
+    if not fiyat or not metrekare or fiyat <= 0 or metrekare <= 0:
+        return None
+    return (_get(row, "ofis_id"), (_get(row, "mahalle") or "").strip(), (_get(row, "oda_sayisi") or "").strip())
+
+
+def _collect(rows: Iterable, sign: int):
+    """Satırları anahtar başına toplam değişikliklere indir"""
+    deltas = defaultdict(lambda: {"adet": 0, "toplam": 0.0, "kare_toplam": 0.0, "sketch": defaultdict(int)})
+    for row in rows:
+        key = stat_key(row)
+        if key is None:
+            continue
+        value = _get(row, "fiyat") / _get(row, "metrekare")
+        delta = deltas[key]
+        delta["adet"] += sign
+        delta["toplam"] += sign * value
+        delta["kare_toplam"] += sign * value * value
+        delta["sketch"][str(_bucket(value))] += sign
+    return deltas
+
+
+def _locked_stat(db: Session, ofis_id: int, mahalle: str, oda_sayisi: str):
+    stat_table = models.IlanIstatistik
+    query = select(stat_table).where(
+        stat_table.ofis_id == ofis_id, stat_table.mahalle == mahalle, stat_table.oda_sayisi == oda_sayisi
+    ).with_for_update()
+    stat = db.execute(query).scalar_one_or_none()
+    if stat is not None:
+        return stat
+    try:
+        # Aynı anahtarı başka bir işlem eş zamanlı eklerse yalnızca savepoint geri alınır
+        with db.begin_nested():
+            stat = stat_table(ofis_id=ofis_id, mahalle=mahalle, oda_sayisi=oda_sayisi, adet=0, toplam=0.0, kare_toplam=0.0, sketch={})
+            db.add(stat)
+        return stat
+    except IntegrityError:
+        return db.execute(query).scalar_one()
+
+
+def update_stats(db: Session, rows: Iterable, sign: int = 1):
+    """Eklenen (sign=1) ya da silinen (sign=-1) ilanları istatistiklere yansıt
+
+    Commit çağırana bırakılır; böylece ilan yazımıyla aynı işlemde kalır.
+    """
+    deltas = _collect(rows, sign)
+    # Kilitler hep aynı sırada alınsın ki eş zamanlı toplu işlemler kilitlenmesin
+    for key in sorted(deltas):
+        delta = deltas[key]
+        stat = _locked_stat(db, *key)
+        stat.adet += delta["adet"]
+        stat.toplam += delta["toplam"]
+        stat.kare_toplam += delta["kare_toplam"]
+        sketch = dict(stat.sketch or {})
+        for index, count in delta["sketch"].items():
+            new_count = sketch.get(index, 0) + count
+            if new_count > 0:
+                sketch[index] = new_count
+            else:
+                sketch.pop(index, None)
+        stat.sketch = sketch
+        stat.updated_at = datetime.utcnow()
+
+
+def rebuild_stats(db: Session, batch_size: int = 1000) -> int:
+    """İstatistik tablosunu ilanlardan baştan hesapla"""
+    table = models.Ilan.__table__
+    result = db.execute(
+        select(table.c.ofis_id, table.c.mahalle, table.c.oda_sayisi, table.c.fiyat, table.c.metrekare),
+        execution_options={"yield_per": batch_size},
+    )
+    deltas = _collect(result.mappings(), 1)
+    db.query(models.IlanIstatistik).delete()
+    for (ofis_id, mahalle, oda_sayisi), delta in deltas.items():
+        db.add(models.IlanIstatistik(
+            ofis_id=ofis_id,
+            mahalle=mahalle,
+            oda_sayisi=oda_sayisi,
+            adet=delta["adet"],
+            toplam=delta["toplam"],
+            kare_toplam=delta["kare_toplam"],
+            sketch=dict(delta["sketch"]),
+        ))
+    db.commit()
+    return len(deltas)
+
+
+def get_stats(db: Session, mahalle: str = None, oda_sayisi: str = None,
+              group_by: Tuple[str, ...] = GROUP_FIELDS, ofis_id: int = None) -> List[dict]:
+    """Ön hesaplanmış satırları istenen düzeyde birleştirip özetle
+
+    ofis_id verilmezse tüm ofislerin satırları birleştirilir.
+    """
+    stat_table = models.IlanIstatistik
+    query = db.query(stat_table).filter(stat_table.adet > 0)
+    if ofis_id is not None:
+        query = query.filter(stat_table.ofis_id == ofis_id)
+    if mahalle is not None:
+        query = query.filter(stat_table.mahalle == mahalle.strip())
+    if oda_sayisi is not None:
+        query = query.filter(stat_table.oda_sayisi == oda_sayisi.strip())
+
+    groups = defaultdict(lambda: {"adet": 0, "toplam": 0.0, "kare_toplam": 0.0, "sketch": defaultdict(int)})
+    for stat in query:
+        group = groups[tuple(getattr(stat, field) for field in group_by)]
+        group["adet"] += stat.adet
+        group["toplam"] += stat.toplam
+        group["kare_toplam"] += stat.kare_toplam
+        for index, count in (stat.sketch or {}).items():
+            group["sketch"][index] += count
+
+    summaries = []
+    for key in sorted(groups):
+        group = groups[key]
+        adet = group["adet"]
+        ortalama = group["toplam"] / adet
+        varyans = max(group["kare_toplam"] / adet - ortalama * ortalama, 0.0)
+        summary = dict(zip(group_by, key))
+        summary.update(
+            adet=adet,
+            ortalama_m2_fiyat=round(ortalama, 2),
+            std_m2_fiyat=round(math.sqrt(varyans), 2),
+            medyan_m2_fiyat=round(sketch_quantile(group["sketch"], 0.5), 2),
+        )
+        summaries.append(summary)
+    return summaries
+
+
+if __name__ == "__main__":
+    import sys
+    from backend.database import SessionLocal
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Kullanım: python -m backend.stats rebuild")
+        sys.exit(1)
+    db = SessionLocal()
+    try:
+        print(f"İstatistikler yeniden oluşturuldu: {rebuild_stats(db)} grup")
+    finally:
+        db.close()
@@ -6,7 +6,7 @@ test_data = {
     "baslik": "Test İlanı",
     "aciklama": "Test açıklama",
     "fiyat": 2500000,
-    "emlak_ofisi_id": 1,
+    "ofis_id": 1,
     "konum": "Kadıköy",
     "sokak": "Moda Caddesi",
     "oda_sayisi": "3+1",
@@ -0,0 +1,186 @@
+# backend/test_changes.py
+
+"""İlan değişiklik beslemesinin denenmesi
+
+ChangeFeed testleri veritabanı istemez. İmleç testleri DATABASE_URL'deki
+PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e ulaşılamazsa atlanır.
+
+    python backend/test_changes.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from backend import changes, crud, offices, schemas
+from backend.changes import ChangeFeed
+from backend.testing import postgres_available, session_factory, temp_schema
+
+
+def _ilan(ofis_id, baslik, **fields):
+    return schemas.IlanCreate(baslik=baslik, aciklama=f"{baslik} açıklaması", fiyat=1000000, mahalle="Moda",
+                              sokak="Sokak", oda_sayisi="2+1", metrekare=90, ofis_id=ofis_id, **fields)
+
+
+def _summary(items):
+    return [(item["ilan_id"], item["islem"]) for item in items]
+
+
+def test_feed_office_semantics():
+    feed = ChangeFeed(engine=None)
+    assert not feed.is_current(0)
+    feed._update(10)
+    assert feed.is_current(10) and not feed.is_current(9)
+    # Bildirimi gelmemiş ofis için genel seq üst sınırdır
+    assert feed.is_current(10, ofis_id=2) and not feed.is_current(9, ofis_id=2)
+
+    feed._update(12, {1: 12})
+    assert not feed.is_current(10) and not feed.is_current(10, ofis_id=1)
+    # Başka ofisin yazması ofis 2'yi bekleyenleri etkilemez
+    assert feed.is_current(10, ofis_id=2)
+
+    # Bildirimsiz gelen değişiklik tüm ofisler için geçerli sayılır
+    feed._update(15)
+    assert not feed.is_current(10, ofis_id=2) and feed.is_current(15, ofis_id=2)
+
+
+def test_feed_wait_wakes_only_matching_office():
+    feed = ChangeFeed(engine=None)
+    feed._update(5)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        ofis_1 = asyncio.ensure_future(feed.wait(5, timeout=2, ofis_id=1))
+        ofis_2 = asyncio.ensure_future(feed.wait(5, timeout=0.3, ofis_id=2))
+        await asyncio.sleep(0.05)
+        start = time.monotonic()
+        await loop.run_in_executor(None, feed._update, 6, {1: 6})
+        await ofis_1
+        woke_after = time.monotonic() - start
+        await ofis_2
+        return woke_after, time.monotonic() - start
+
+    woke_after, timed_out_after = asyncio.run(scenario())
+    assert woke_after < 0.2, woke_after
+    assert timed_out_after >= 0.2, timed_out_after
+    assert feed._waiters == []
+
+
+def test_db_changes_cursor_and_paging():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            a = crud.create_emlak_ilan(db, _ilan(ofis_id, "A"))
+            b = crud.create_emlak_ilan(db, _ilan(ofis_id, "B"))
+            c = crud.create_emlak_ilan(db, _ilan(diger, "C"))
+            crud.bulk_delete_emlak_ilanlar(db, [a.id], ofis_id=ofis_id)
+            head = changes.latest_seq(db)
+            assert head == 4
+
+            # Aynı ilanın değişiklikleri sonuncusuna indirgenir
+            cursor, items, has_more = crud.get_ilan_changes(db, 0)
+            assert (cursor, has_more) == (head, False)
+            assert _summary(items) == [(b.id, "insert"), (c.id, "insert"), (a.id, "delete")]
+            assert items[0]["ilan"].baslik == "B" and items[2]["ilan"] is None
+
+            # İlk sayfada eklenmiş görünen ilan sonradan silindiyse silindi bildirilir
+            cursor, items, has_more = crud.get_ilan_changes(db, 0, limit=1)
+            assert (cursor, has_more) == (1, True) and _summary(items) == [(a.id, "delete")]
+            cursor, items, has_more = crud.get_ilan_changes(db, cursor, limit=2)
+            assert (cursor, has_more) == (3, True) and _summary(items) == [(b.id, "insert"), (c.id, "insert")]
+
+            assert crud.get_ilan_changes(db, head) == (head, [], False)
+        finally:
+            db.close()
+
+
+def test_db_delete_reports_unlinked_duplicates():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            a = crud.create_emlak_ilan(db, _ilan(ofis_id, "A"))
+            b = crud.create_emlak_ilan(db, _ilan(ofis_id, "B", benzer_ilan_id=a.id))
+            cursor = changes.latest_seq(db)
+
+            crud.bulk_delete_emlak_ilanlar(db, [a.id], ofis_id=ofis_id)
+            # B'nin benzer_ilan_id'si aynı işlemde boşaltıldı; istemci bunu da görür
+            cursor, items, _ = crud.get_ilan_changes(db, cursor)
+            assert _summary(items) == [(b.id, "update"), (a.id, "delete")]
+            assert items[0]["ilan"].benzer_ilan_id is None
+        finally:
+            db.close()
+
+
+def test_db_office_cursor_skips_other_offices():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            a = crud.create_emlak_ilan(db, _ilan(ofis_id, "A"))
+            for i in range(3):
+                crud.create_emlak_ilan(db, _ilan(diger, f"D{i}"))
+
+            # Ofisin son değişikliğinden sonrası başka ofislerin; imleç yine de başa ilerler
+            cursor, items, has_more = crud.get_ilan_changes(db, 0, ofis_id=ofis_id)
+            assert (cursor, has_more) == (4, False) and _summary(items) == [(a.id, "insert")]
+            assert crud.get_ilan_changes(db, cursor, ofis_id=ofis_id) == (4, [], False)
+
+            # Sayfa dolduysa imleç son döndürülen satırda kalır
+            cursor, items, has_more = crud.get_ilan_changes(db, 0, limit=2, ofis_id=diger)
+            assert has_more and cursor == items[-1]["seq"] and len(items) == 2
+            cursor, items, has_more = crud.get_ilan_changes(db, cursor, limit=2, ofis_id=diger)
+            assert (cursor, has_more, len(items)) == (4, False, 1)
+        finally:
+            db.close()
+
+
+def test_db_changes_are_written_at_commit():
+    with temp_schema() as engine:
+        factory = session_factory(engine)
+        db, other = factory(), factory()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            a = crud.create_emlak_ilan(db, _ilan(ofis_id, "A"))
+            head = changes.latest_seq(db)
+
+            # Açık işlem günlüğe henüz yazmadı ve kilidi tutmuyor
+            db.execute(text("UPDATE emlak_ilanlar SET baslik = 'A2' WHERE id = :id"), {"id": a.id})
+            changes.record_changes(db, changes.UPDATE, [(a.id, ofis_id)])
+            created = []
+            thread = threading.Thread(target=lambda: created.append(crud.create_emlak_ilan(other, _ilan(diger, "B"))))
+            thread.start()
+            thread.join(5)
+            assert created, "başka ofisin yazması açık işlemin kilidini bekledi"
+            assert changes.latest_seq(other) == head + 1
+
+            # Geri alınan işlemin bekleyen satırları sonraki commit'e taşınmaz
+            db.rollback()
+            offices.create_ofis(db, "Boş işlem")
+            cursor, items, _ = crud.get_ilan_changes(db, head)
+            assert _summary(items) == [(created[0].id, "insert")]
+            # Ofise göre süzülen sayfa diğer ofisin ilanını yüklemez
+            assert crud.get_ilan_changes(db, head, ofis_id=ofis_id) == (cursor, [], False)
+        finally:
+            db.close()
+            other.close()
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,111 @@
+# backend/test_database.py
+
+"""Engine fabrikasının ve okuma/yazma oturumlarının denenmesi
+
+Veritabanına bağlanmaz; engine'ler yalnızca kurulur, bağlantı açılmaz.
+
+    python backend/test_database.py
+"""
+
+import importlib
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.pool import NullPool, QueuePool
+from backend import database
+
+URL = "postgresql://kullanici@db.example:5432/emlak"
+REPLICA_URL = "postgresql://kullanici@replika.example:5432/emlak"
+
+
+class patched_env:
+    """Ortam değişkenlerini değiştirip database modülünü yeniden yükle"""
+
+    def __init__(self, **values):
+        self.values = values
+
+    def __enter__(self):
+        self.saved = {name: os.environ.get(name) for name in self.values}
+        for name, value in self.values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return importlib.reload(database)
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        importlib.reload(database)
+
+
+def _engine_kwargs(db, url, **overrides):
+    """create_db_engine'in create_engine'e verdiği argümanlar ve engine"""
+    captured = {}
+    original = db.create_engine
+    db.create_engine = lambda url, **kwargs: captured.update(kwargs) or original(url, **kwargs)
+    try:
+        return db.create_db_engine(url, **overrides), captured
+    finally:
+        db.create_engine = original
+
+
+def test_pool_settings_from_env():
+    with patched_env(DB_POOL_SIZE="7", DB_MAX_OVERFLOW="3", DB_POOL_TIMEOUT="4", DB_POOL_RECYCLE="60",
+                     DB_STATEMENT_TIMEOUT_MS="1500", DB_PGBOUNCER=None) as db:
+        engine, kwargs = _engine_kwargs(db, URL)
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 7 and engine.pool._max_overflow == 3
+        assert engine.pool._timeout == 4 and engine.pool._recycle == 60 and engine.pool._pre_ping
+        stats = db._pool_stats(engine)
+        assert stats["capacity"] == 10 and stats["saturation"] == 0.0
+        assert kwargs["connect_args"] == {"options": "-c statement_timeout=1500"}
+
+
+def test_connect_args_merge_options():
+    with patched_env(DB_STATEMENT_TIMEOUT_MS="1500", DB_PGBOUNCER=None) as db:
+        # temp_schema gibi kendi options'ını veren çağıran zaman aşımını kaybetmez
+        _, kwargs = _engine_kwargs(db, URL, connect_args={"options": "-c search_path=deneme", "connect_timeout": 3})
+        assert kwargs["connect_args"] == {
+            "options": "-c statement_timeout=1500 -c search_path=deneme", "connect_timeout": 3,
+        }
+
+
+def test_pgbouncer_uses_null_pool_and_set_local():
+    with patched_env(DB_PGBOUNCER="true", DB_STATEMENT_TIMEOUT_MS="1500") as db:
+        engine, kwargs = _engine_kwargs(db, URL)
+        assert isinstance(engine.pool, NullPool)
+        # Başlangıç parametresi gönderilmez; zaman aşımı her işlemde SET LOCAL ile verilir
+        assert "connect_args" not in kwargs
+        assert len(engine.dispatch.begin) == 1
+        assert db._pool_stats(engine) == {"pool": "NullPool"}
+
+    with patched_env(DB_PGBOUNCER="true", DB_STATEMENT_TIMEOUT_MS="0") as db:
+        assert len(db.create_db_engine(URL).dispatch.begin) == 0
+
+
+def test_read_sessions_use_replica():
+    with patched_env(DATABASE_URL=URL, DATABASE_REPLICA_URL=REPLICA_URL, DB_PGBOUNCER=None) as db:
+        assert db.read_engine is not db.engine
+        assert db.read_engine.url.host == "replika.example"
+        session = next(db.get_read_db())
+        assert session.get_bind().url.host == "replika.example"
+        assert next(db.get_db()).get_bind().url.host == "db.example"
+        assert set(db.get_pool_stats()) == {"primary", "replica"}
+
+    with patched_env(DATABASE_URL=URL, DATABASE_REPLICA_URL=None, DB_PGBOUNCER=None) as db:
+        assert db.read_engine is db.engine
+        assert next(db.get_read_db()).get_bind().url.host == "db.example"
+        assert set(db.get_pool_stats()) == {"primary"}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -1,16 +1,16 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dotenv import load_dotenv
 import os
+import sys
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SQLALCHEMY_DATABASE_URL as DATABASE_URL, engine
 print(f"Veritabanı URL'si: {DATABASE_URL}")
 
 try:
-    # Veritabanı bağlantısını oluştur
-    engine = create_engine(DATABASE_URL)
-    
     # Bağlantıyı test et
     with engine.connect() as connection:
         result = connection.execute(text("SELECT 1"))
@@ -0,0 +1,104 @@
+# backend/test_dedup.py
+
+"""Kopya ilan tespitinin (MinHash + LSH) denenmesi
+
+İmza testleri veritabanı istemez. Aday arama ve sonradan indeksleme
+testleri DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada çalışır;
+PostgreSQL'e ulaşılamazsa atlanır.
+
+    python backend/test_dedup.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import crud, dedup, models, offices, schemas
+from backend.testing import postgres_available, session_factory, temp_schema
+
+ACIKLAMA = "Deniz manzaralı, asansörlü binada güney cephe geniş balkonlu bakımlı daire, metroya yürüme mesafesinde"
+FIELDS = {"aciklama": ACIKLAMA, "mahalle": "Moda", "sokak": "Şair Nefi Sokak",
+          "fiyat": 5_000_000, "metrekare": 120, "oda_sayisi": "3+1"}
+
+
+def _ilan(ofis_id, **overrides):
+    fields = dict(FIELDS, **overrides)
+    return schemas.IlanCreate(baslik="İlan", ofis_id=ofis_id, **fields)
+
+
+def test_signature_similarity():
+    signature = dedup.minhash(FIELDS)
+    assert len(signature) == dedup.NUM_PERM
+    assert dedup.minhash({"aciklama": "", "mahalle": None}) is None
+    # Büyük/küçük harf ve Türkçe karakter farkı imzayı değiştirmez
+    assert dedup.minhash(dict(FIELDS, aciklama=ACIKLAMA.upper())) == signature
+
+    stored = {"fiyat": 5_000_000, "metrekare": 120, "oda": 3}
+    assert dedup.similarity(signature, signature, FIELDS, stored) == 1.0
+    yazim = dedup.minhash(dict(FIELDS, aciklama=ACIKLAMA.replace("geniş", "genis").replace("bakımlı", "bakimli ")))
+    assert dedup.similarity(yazim, signature, dict(FIELDS, fiyat="4.900.000 TL"), stored) >= dedup.DUPLICATE_THRESHOLD
+    baska = dedup.minhash({"aciklama": "Bahçeli müstakil köy evi, şömineli", "mahalle": "Kilyos", "sokak": "Orman Yolu"})
+    assert dedup.similarity(baska, signature, FIELDS, stored) < dedup.DUPLICATE_THRESHOLD
+
+
+def test_band_hashes_are_signed_64_bit():
+    bands = dedup.band_hashes(dedup.minhash(FIELDS))
+    assert [band for band, _ in bands] == list(range(dedup.BANDS))
+    assert all(-(1 << 63) <= value < (1 << 63) for _, value in bands)
+
+
+def test_db_find_duplicates_per_office():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            ilan = crud.create_emlak_ilan(db, _ilan(ofis_id))
+            crud.create_emlak_ilan(db, _ilan(ofis_id, aciklama="Bahçeli müstakil köy evi", mahalle="Kilyos"))
+
+            matches = dedup.find_duplicates(db, dict(FIELDS, fiyat="4,9 milyon"), ofis_id)
+            assert [ilan_id for ilan_id, _ in matches] == [ilan.id], matches
+            # Bantlar ofise göre anahtarlı; başka ofis aynı ilanı görmez
+            assert dedup.find_duplicates(db, FIELDS, diger) == []
+            assert dedup.find_duplicates(db, {"aciklama": ""}, ofis_id) == []
+
+            crud.bulk_delete_emlak_ilanlar(db, [ilan.id])
+            assert dedup.find_duplicates(db, FIELDS, ofis_id) == []
+        finally:
+            db.close()
+
+
+def test_db_index_pending_after_bulk():
+    with temp_schema() as engine:
+        factory = session_factory(engine)
+        db = factory()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            ids = crud.bulk_create_emlak_ilanlar(db, [
+                _ilan(ofis_id, sokak=f"Sokak {i}", aciklama=f"{ACIKLAMA} {i}") for i in range(5)
+            ] + [_ilan(ofis_id, aciklama="", mahalle="", sokak="")])
+            # Toplu ekleme imza yazmaz
+            assert db.query(models.IlanMinhash).count() == 0
+            assert dedup.find_duplicates(db, FIELDS, ofis_id) == []
+
+            assert dedup.index_pending(ids[:2], batch_size=1, session_factory=factory) == 2
+            # Metni boş ilanın imzası olmaz; kalanlar tam taramada bulunur
+            assert dedup.index_pending(batch_size=2, session_factory=factory) == 3
+            assert dedup.index_pending(session_factory=factory) == 0
+            assert db.query(models.IlanMinhash).count() == 5
+            assert db.query(models.IlanLshBant).count() == 5 * dedup.BANDS
+            assert len(dedup.find_duplicates(db, FIELDS, ofis_id, limit=10)) == 5
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,156 @@
+# backend/test_deletion.py
+
+"""İlanların veritabanından ve Drive'dan birlikte silinmesinin denenmesi
+
+Drive, drive_service/test_drive_index.py'deki bellek içi taklitle
+değiştirilir. İlanlar DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada
+tutulur; PostgreSQL'e ulaşılamazsa testler atlanır.
+
+    python backend/test_deletion.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sahte servis için hız sınırı veritabanına gitmesin
+os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+
+from backend import crud, deletion, offices, schemas
+from backend.testing import postgres_available, session_factory, temp_schema
+from drive_service import drive_index
+from drive_service.drive_index import DriveIndex
+from drive_service.test_drive_index import FakeDrive, FakeHttpError, _Request
+
+
+class FlakyDrive(FakeDrive):
+    """Seçilen dosyalarda ("update" ya da "delete") kalıcı hata veren Drive taklidi"""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = {}
+
+    def _maybe_fail(self, method, file_id, request):
+        if self.failing.get(file_id) == method:
+            def run():
+                raise FakeHttpError(400)
+            return _Request(run)
+        return request
+
+    def update(self, fileId, **kwargs):
+        return self._maybe_fail("update", fileId, super().update(fileId, **kwargs))
+
+    def delete(self, fileId):
+        return self._maybe_fail("delete", fileId, super().delete(fileId))
+
+
+def _setup(db):
+    """Farklı numaralardan gönderilmiş iki ilan ve fotoğraflı Drive klasörleri; dizin yüklenmiş olarak"""
+    drive = FlakyDrive()
+    root = drive.put("Emlak", folder=True)
+    ilanlar = []
+    for name in ("A", "B"):
+        folder = drive.put(f"Moda-{name}-3+1", root, folder=True)
+        drive.put("photo_1.jpg", folder, size=10)
+        ilanlar.append(crud.create_emlak_ilan(db, schemas.IlanCreate(
+            baslik=name, aciklama="a", fiyat=1000000, mahalle="Moda", sokak="Sokak", oda_sayisi="3+1",
+            metrekare=100, drive_folder_id=folder, ofis_id=offices.DEFAULT_OFIS_ID,
+        ), gonderen=f"+90555000000{len(ilanlar)}"))
+    index = drive_index._indexes[root] = DriveIndex(root, None)
+    index.sync(drive)
+    return drive, index, ilanlar
+
+
+def _trashed(drive, file_id):
+    return drive.store[file_id]["trashed"]
+
+
+def test_delete_trashes_then_deletes_permanently():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            drive, index, (a, b) = _setup(db)
+            result = deletion.bulk_delete_ilanlar(db, [a.id, 999], service=drive)
+            assert result == {"silinen": [a.id], "bulunamayan": [999], "hatali": {}}
+            assert crud.get_ilan(db, a.id) is None and crud.get_ilan(db, b.id) is not None
+            assert a.drive_folder_id not in drive.store and index.get(a.drive_folder_id) is None
+            assert index.get(b.drive_folder_id) is not None
+        finally:
+            db.close()
+            drive_index._indexes.clear()
+
+
+def test_sender_deletes_only_own_ilan():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            drive, index, (a, b) = _setup(db)
+            assert deletion.delete_ilan(db, b.id, service=drive, gonderen=a.gonderen) == (False, "İlan bulunamadı")
+            assert crud.get_ilan(db, b.id) is not None and not _trashed(drive, b.drive_folder_id)
+            assert deletion.delete_ilan(db, a.id, service=drive, gonderen=a.gonderen) == (True, "İlan başarıyla silindi")
+        finally:
+            db.close()
+            drive_index._indexes.clear()
+
+
+def test_trash_failure_keeps_ilan():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            drive, index, (a, b) = _setup(db)
+            drive.failing[a.drive_folder_id] = "update"
+            result = deletion.bulk_delete_ilanlar(db, [a.id, b.id], service=drive)
+            assert result["silinen"] == [b.id] and list(result["hatali"]) == [a.id]
+            assert result["hatali"][a.id].startswith("Drive klasörü silinemedi")
+            assert crud.get_ilan(db, a.id) is not None and not _trashed(drive, a.drive_folder_id)
+            assert index.get(a.drive_folder_id) is not None
+        finally:
+            db.close()
+            drive_index._indexes.clear()
+
+
+def test_db_failure_restores_folders():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        saved = crud.bulk_delete_emlak_ilanlar
+
+        def failing_delete(db, ilan_ids, ofis_id=None):
+            raise RuntimeError("bağlantı koptu")
+
+        try:
+            drive, index, (a, b) = _setup(db)
+            crud.bulk_delete_emlak_ilanlar = failing_delete
+            result = deletion.bulk_delete_ilanlar(db, [a.id, b.id], service=drive)
+            assert result["silinen"] == [] and sorted(result["hatali"]) == sorted([a.id, b.id])
+            # Klasörler çöpten geri alınır ve fotoğraflarıyla dizine döner
+            for ilan in (a, b):
+                assert not _trashed(drive, ilan.drive_folder_id)
+                assert len(index.children(ilan.drive_folder_id)) == 1
+        finally:
+            crud.bulk_delete_emlak_ilanlar = saved
+            db.close()
+            drive_index._indexes.clear()
+
+
+def test_permanent_delete_failure_leaves_folder_in_trash():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            drive, index, (a, b) = _setup(db)
+            drive.failing[a.drive_folder_id] = "delete"
+            assert deletion.delete_ilan(db, a.id, service=drive) == (True, "İlan başarıyla silindi")
+            assert crud.get_ilan(db, a.id) is None
+            assert _trashed(drive, a.drive_folder_id) and index.get(a.drive_folder_id) is None
+        finally:
+            db.close()
+            drive_index._indexes.clear()
+
+
+if __name__ == "__main__":
+    if not postgres_available():
+        print("PostgreSQL'e ulaşılamadı (DATABASE_URL), testler atlandı")
+        sys.exit(0)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,144 @@
+# backend/test_geo.py
+
+"""Mahalle sözlüğünün ve geohash yakınlık aramasının denenmesi
+
+Sözlük ve geohash testleri veritabanı istemez. Yakınlık sorgusu
+DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e
+ulaşılamazsa atlanır.
+
+    python backend/test_geo.py
+"""
+
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import crud, geo, offices, schemas
+from backend.testing import postgres_available, session_factory, temp_schema
+
+MODA = (40.9830, 29.0260)
+
+
+def _ilan(mahalle, baslik="İlan", ofis_id=offices.DEFAULT_OFIS_ID):
+    return schemas.IlanCreate(baslik=baslik, aciklama="a", fiyat=1000000, mahalle=mahalle, sokak="Sokak",
+                              oda_sayisi="2+1", metrekare=90, ofis_id=ofis_id)
+
+
+def _use_gazetteer(path):
+    geo.GAZETTEER_PATH = path
+    geo.load_gazetteer.cache_clear()
+    geo.geocode_mahalle.cache_clear()
+
+
+def test_geocode_spelling_variants():
+    assert geo.geocode_mahalle("Moda") == MODA
+    assert geo.geocode_mahalle("MODA MAH.") == MODA
+    assert geo.geocode_mahalle("caferaga mahallesi") == (40.9870, 29.0270)
+    assert geo.geocode_mahalle("Fenerbahce") == geo.geocode_mahalle("Fenerbahçe") is not None
+    assert geo.geocode_mahalle("Zühtüpasa") == geo.geocode_mahalle("Zühtüpaşa")  # bulanık
+    assert geo.geocode_mahalle("Moda, Kadıköy") == geo.geocode_mahalle("Kadıköy Moda") == MODA
+    assert geo.geocode_mahalle("Moda", ilce="Kadıköy") == MODA
+    assert geo.geocode_mahalle("Moda", ilce="Beşiktaş") is None
+    assert geo.geocode_mahalle("Bilinmeyen Köy") is None
+    assert geo.geocode_mahalle("") is None and geo.geocode_mahalle("Mah.") is None
+    assert geo.locate("Bilinmeyen") == {"lat": None, "lon": None, "geohash": None}
+    assert geo.locate("Moda")["geohash"] == geo.geohash_encode(*MODA)
+
+
+def test_ambiguous_names_need_ilce():
+    saved = geo.GAZETTEER_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mahalleler.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("ilce,mahalle,lat,lon\nKadıköy,Merkez,40.1,29.1\nŞişli,Merkez,41.1,28.9\nŞişli,Tek,41.2,28.8\n")
+        try:
+            _use_gazetteer(path)
+            assert geo.geocode_mahalle("Merkez") is None
+            assert geo.geocode_mahalle("Merkez Mah., Şişli") == (41.1, 28.9)
+            assert geo.geocode_mahalle("Merkez", ilce="kadikoy") == (40.1, 29.1)
+            assert geo.geocode_mahalle("Tek") == (41.2, 28.8)
+        finally:
+            _use_gazetteer(saved)
+
+
+def test_geohash_and_distance():
+    # Bilinen referans değerleri
+    assert geo.geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geo.geohash_encode(*MODA).startswith(geo.geohash_encode(*MODA, precision=5))
+    assert geo.haversine_m(*MODA, *MODA) == 0
+    # Moda ile Bostancı arası ~6,4 km (kuş uçuşu)
+    assert 6300 < geo.haversine_m(*MODA, 40.9580, 29.0950) < 6550
+
+
+def test_covering_cells_contain_every_point_in_radius():
+    for radius in (150, 1000, 5000, 40000):
+        cells = geo.covering_cells(*MODA, radius)
+        assert 1 <= len(cells) <= 9 and len({len(cell) for cell in cells}) == 1
+        precision = len(cells[0])
+        assert geo.geohash_encode(*MODA, precision) in cells
+        # Dairenin kenarındaki noktalar da kapsanan hücrelerde olmalı
+        for dlat, dlon in ((1, 0), (-1, 0), (0, 1), (0, -1), (0.7, 0.7), (-0.7, -0.7)):
+            lat = MODA[0] + dlat * radius / 111320.0
+            lon = MODA[1] + dlon * radius / (111320.0 * 0.755)
+            assert geo.geohash_encode(lat, lon, precision) in cells, (radius, dlat, dlon)
+    # Küçük yarıçap daha ince hücre kullanır
+    assert len(geo.covering_cells(*MODA, 150)[0]) > len(geo.covering_cells(*MODA, 5000)[0])
+
+
+def test_db_near_filters_by_radius():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            moda = crud.create_emlak_ilan(db, _ilan("Moda"))
+            caferaga = crud.create_emlak_ilan(db, _ilan("Caferağa"))
+            bostanci = crud.create_emlak_ilan(db, _ilan("Bostancı"))
+            konumsuz = crud.create_emlak_ilan(db, _ilan("Bilinmeyen"))
+            assert konumsuz.lat is None and moda.geohash
+
+            results = crud.get_ilanlar_near(db, *MODA, 1000)
+            assert [(ilan.id, mesafe) for ilan, mesafe in results][0] == (moda.id, 0.0)
+            assert [ilan.id for ilan, _ in results] == [moda.id, caferaga.id]
+            assert [ilan.id for ilan, _ in crud.get_ilanlar_near(db, *MODA, 10000)] == [
+                moda.id, caferaga.id, bostanci.id,
+            ]
+            assert len(crud.get_ilanlar_near(db, *MODA, 10000, limit=1)) == 1
+            assert crud.get_ilanlar_near(db, 41.5, 28.0, 1000) == []
+
+            sube = crud.create_emlak_ilan(db, _ilan("Moda", ofis_id=offices.create_ofis(db, "Şube").id))
+            assert sube.id in [ilan.id for ilan, _ in crud.get_ilanlar_near(db, *MODA, 1000)]
+            assert [ilan.id for ilan, _ in crud.get_ilanlar_near(db, *MODA, 1000, ofis_id=offices.DEFAULT_OFIS_ID)] == [
+                moda.id, caferaga.id,
+            ]
+        finally:
+            db.close()
+
+
+def test_db_ungeocoded_count_is_logged():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    crud.logger.addHandler(handler)
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            crud.bulk_create_emlak_ilanlar(db, [_ilan("Moda"), _ilan("Yok 1"), _ilan("Yok 2")])
+            assert [record.getMessage() for record in records if record.levelno == logging.WARNING] == [
+                "Toplu yükleme: 2/3 ilanın mahallesi sözlükte yok, konumsuz kaydedildi",
+            ]
+        finally:
+            db.close()
+            crud.logger.removeHandler(handler)
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
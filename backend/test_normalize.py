@@ -0,0 +1,80 @@
+# backend/test_normalize.py
+
+"""Oda, fiyat ve metrekare metinlerinin çözümlenmesinin denenmesi
+
+    python backend/test_normalize.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import schemas
+from backend.normalize import canonical_oda_sayisi, fold_tr, parse_number, parse_oda
+
+
+def test_parse_oda():
+    cases = {
+        "3+1": (3, 1),
+        "3 + 1": (3, 1),
+        "2.5+1": (2, 1),
+        "4 oda 2 salon": (4, 2),
+        "Stüdyo": (1, 0),
+        "1+0 stüdyo daire": (1, 0),
+        "5": (5, None),
+        "3 oda": (3, None),
+        "dubleks": (None, None),
+        None: (None, None),
+    }
+    for value, expected in cases.items():
+        assert parse_oda(value) == expected, (value, parse_oda(value))
+
+
+def test_canonical_oda_sayisi():
+    assert canonical_oda_sayisi(" 3 + 1 ") == "3+1"
+    assert canonical_oda_sayisi("STÜDYO") == "1+0"
+    assert canonical_oda_sayisi("3") == "3"
+    assert canonical_oda_sayisi(" dubleks ") == "dubleks"
+    assert canonical_oda_sayisi(None) == ""
+
+
+def test_parse_number():
+    cases = {
+        "2.500.000 TL": 2_500_000.0,
+        "2,5 milyon": 2_500_000.0,
+        "1,250,000": 1_250_000.0,
+        "1.250,50": 1250.5,
+        "120,5": 120.5,
+        "120 m2": 120.0,
+        "120m²": 120.0,
+        "850 bin TL": 850_000.0,
+        "0.5": 0.5,
+        "fiyat sorunuz": None,
+        "1.2.3": None,
+        "": None,
+        None: None,
+        True: None,
+        float("nan"): None,
+        95: 95.0,
+    }
+    for value, expected in cases.items():
+        assert parse_number(value) == expected, (value, parse_number(value))
+
+
+def test_fold_tr():
+    assert fold_tr("  IŞIKLI   Çarşı ") == "isikli carsi"
+    assert fold_tr("İstanbul") == "istanbul"
+
+
+def test_ilan_create_normalizes():
+    ilan = schemas.IlanCreate(baslik="b", aciklama="a", fiyat="2,5 milyon TL", mahalle="Moda", sokak="s",
+                              oda_sayisi="3 + 1", metrekare="120 m2", ofis_id=1)
+    assert (ilan.fiyat, ilan.metrekare, ilan.oda_sayisi) == (2_500_000.0, 120.0, "3+1")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,129 @@
+# backend/test_offices.py
+
+"""Ofislerin, numara eşlemelerinin ve ofise göre süzülen ilan işlemlerinin denenmesi
+
+Numara testleri veritabanı istemez. Diğerleri DATABASE_URL'deki
+PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e ulaşılamazsa atlanır.
+
+    python backend/test_offices.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from backend import crud, deletion, offices, schemas
+from backend.database import get_db, get_read_db
+from backend.testing import postgres_available, session_factory, temp_schema
+
+
+def _ilan(ofis_id, baslik="İlan"):
+    return schemas.IlanCreate(baslik=baslik, aciklama="a", fiyat=2000000, mahalle="Moda", sokak="Sokak",
+                              oda_sayisi="2+1", metrekare=100, ofis_id=ofis_id)
+
+
+def _payload(ofis_id=None):
+    payload = {"baslik": "İlan", "aciklama": "a", "fiyat": 2000000, "mahalle": "Moda", "sokak": "Sokak",
+               "oda_sayisi": "2+1", "metrekare": 100}
+    if ofis_id is not None:
+        payload["ofis_id"] = ofis_id
+    return payload
+
+
+def test_normalize_numara():
+    assert offices.normalize_numara("whatsapp:+90 555 123 45 67") == "+905551234567"
+    assert offices.normalize_numara(" WhatsApp:+90(555)1234567 ") == "+905551234567"
+    assert offices.normalize_numara(None) == ""
+
+
+def test_db_numara_mapping():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            sube = offices.create_ofis(db, "Şube", numaralar=["whatsapp:+90 555 000 00 01"])
+            assert offices.get_ofis_for_numara(db, "whatsapp:+905550000001").id == sube.id
+            # Eşlenmemiş numara varsayılan ofise düşer
+            assert offices.find_numara(db, "whatsapp:+905550000002") is None
+            assert offices.get_ofis_for_numara(db, "whatsapp:+905550000002").id == offices.DEFAULT_OFIS_ID
+
+            diger = offices.create_ofis(db, "Diğer", bolum=False)
+            offices.set_numara(db, diger.id, "+90 555 000 00 01")
+            assert offices.get_ofis_for_numara(db, "whatsapp:+905550000001").id == diger.id
+            assert offices.missing_ofisler(db, [sube.id, 999, offices.DEFAULT_OFIS_ID, 998]) == [998, 999]
+            assert offices.missing_ofisler(db, []) == []
+        finally:
+            db.close()
+
+
+def test_db_queries_are_scoped_to_office():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            merkez = offices.DEFAULT_OFIS_ID
+            sube = offices.create_ofis(db, "Şube").id
+            a = crud.create_emlak_ilan(db, _ilan(merkez, "A"))
+            b = crud.create_emlak_ilan(db, _ilan(sube, "B"))
+
+            assert [ilan.id for ilan in crud.get_ilanlar(db, ofis_id=sube)] == [b.id]
+            assert len(crud.get_ilanlar(db)) == 2
+            assert crud.get_ilan(db, a.id, ofis_id=sube) is None
+            assert crud.get_ilanlar_by_ids(db, [a.id, b.id], ofis_id=merkez) == [crud.get_ilan(db, a.id)]
+            assert [row["id"] for row in crud.stream_ilanlar(db, ofis_id=merkez)] == [a.id]
+
+            # Başka ofisin ilanı silinmez, bulunamadı sayılır
+            result = deletion.bulk_delete_ilanlar(db, [a.id, b.id], ofis_id=sube)
+            assert result["silinen"] == [b.id] and result["bulunamayan"] == [a.id]
+            assert crud.get_ilan(db, a.id) is not None
+        finally:
+            db.close()
+
+
+def test_db_api_rejects_unknown_or_missing_office():
+    from backend.main import app
+
+    with temp_schema() as engine:
+        factory = session_factory(engine)
+
+        def override():
+            db = factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override
+        app.dependency_overrides[get_read_db] = override
+        try:
+            client = TestClient(app)
+            assert client.post("/ilan/", json=_payload()).status_code == 422
+            response = client.post("/ilan/", json=_payload(999))
+            assert response.status_code == 400 and "999" in response.json()["detail"], response.text
+            response = client.post("/ilan/bulk", json=[_payload(offices.DEFAULT_OFIS_ID), _payload(998)])
+            assert response.status_code == 400 and "998" in response.json()["detail"], response.text
+
+            ilan_id = client.post("/ilan/", json=_payload(offices.DEFAULT_OFIS_ID)).json()["id"]
+            assert client.delete(f"/ilan/{ilan_id}").status_code == 422
+            assert client.delete(f"/ilan/{ilan_id}", params={"ofis_id": 999}).status_code == 400
+            db = factory()
+            try:
+                sube = offices.create_ofis(db, "Şube").id
+            finally:
+                db.close()
+            assert client.delete(f"/ilan/{ilan_id}", params={"ofis_id": sube}).status_code == 404
+            assert client.delete(f"/ilan/{ilan_id}", params={"ofis_id": offices.DEFAULT_OFIS_ID}).status_code == 200
+            assert client.post("/ilan/bulk-delete", json={"idler": [ilan_id]}).status_code == 422
+        finally:
+            app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,158 @@
+# backend/test_photo_cache.py
+
+"""Fotoğraf önbelleğinin sahte bir indiriciyle denenmesi
+
+Drive'a ve veritabanına bağlanmaz; önbellek geçici bir klasörde kurulur.
+
+    python backend/test_photo_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.photo_cache import PhotoCache, PhotoNotFound, sniff_media_type
+
+
+class FakeFetch:
+    """İstenen dosyaya size bayt yazan, çağrıları sayan indirici"""
+
+    def __init__(self, size=100, delay=0.0):
+        self.size = size
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, file_id, out):
+        self.calls.append(file_id)
+        time.sleep(self.delay)
+        out.write(b"\xff\xd8\xff" + b"x" * (self.size - 3))
+
+
+def _keys(cache):
+    return list(cache._entries)
+
+
+def test_eviction_follows_mtime_order():
+    with tempfile.TemporaryDirectory() as directory:
+        # Önceki çalıştırmadan kalan dosyalar: okunma sırası mtime'dan gelir
+        now = time.time()
+        for age, name in ((30, "eski_dosya_1"), (10, "yeni_dosya_1"), (20, "orta_dosya_1")):
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(os.path.join(directory, name), (now - age, now - age))
+        cache = PhotoCache(directory, max_bytes=300)
+        assert _keys(cache) == ["eski_dosya_1", "orta_dosya_1", "yeni_dosya_1"]
+
+        fetch = FakeFetch()
+        # Okunan dosya en son kullanılan olur ve mtime'ı güncellenir
+        assert cache.get("eski_dosya_1", fetch) == os.path.join(directory, "eski_dosya_1")
+        assert fetch.calls == [] and os.path.getmtime(os.path.join(directory, "eski_dosya_1")) > now - 5
+
+        cache.get("yeni_indirme", fetch)
+        assert fetch.calls == ["yeni_indirme"]
+        assert _keys(cache) == ["yeni_dosya_1", "eski_dosya_1", "yeni_indirme"]
+        assert not os.path.exists(os.path.join(directory, "orta_dosya_1"))
+        assert cache.stats() == (3, 300)
+
+        # Yeniden açılışta aynı sıra korunur
+        assert _keys(PhotoCache(directory, max_bytes=300)) == _keys(cache)
+
+
+def test_concurrent_requests_download_once():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhotoCache(directory, max_bytes=10_000)
+        fetch = FakeFetch(delay=0.2)
+        paths, start = [], threading.Barrier(8)
+
+        def worker():
+            start.wait()
+            paths.append(cache.get("ayni_dosya_1", fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert fetch.calls == ["ayni_dosya_1"] and len(set(paths)) == 1 and len(paths) == 8
+        assert cache._inflight == {}
+
+
+def test_failed_download_is_not_cached():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhotoCache(directory, max_bytes=10_000)
+
+        def missing(file_id, out):
+            out.write(b"yarim")
+            raise PhotoNotFound(file_id)
+
+        try:
+            cache.get("olmayan_dosya", missing)
+            raise AssertionError("PhotoNotFound bekleniyordu")
+        except PhotoNotFound:
+            pass
+        assert cache.stats() == (0, 0) and cache._inflight == {}
+        assert [name for name in os.listdir(directory)] == []
+
+
+def test_pinned_files_survive_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhotoCache(directory, max_bytes=200)
+        fetch = FakeFetch()
+        pinned = cache.get("sunulan_dosya", fetch, pin=True)
+        cache.get("ikinci_dosya", fetch)
+        cache.get("ucuncu_dosya", fetch)
+        # En eski dosya gönderiliyor; onun yerine bir sonraki silinir
+        assert os.path.exists(pinned) and "ikinci_dosya" not in cache._entries
+
+        cache.release("sunulan_dosya")
+        cache.get("dorduncu_dosya", fetch)
+        assert not os.path.exists(pinned) and _keys(cache) == ["ucuncu_dosya", "dorduncu_dosya"]
+        assert not cache._pins
+
+
+def test_thumbnail_is_made_once():
+    from PIL import Image
+
+    def fetch(file_id, out):
+        fetch.calls += 1
+        Image.new("RGB", (1200, 800), "red").save(out, "PNG")
+    fetch.calls = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhotoCache(directory, max_bytes=10_000_000)
+        path = cache.get("kucuk_resim_1", fetch, thumb=True)
+        assert cache.get("kucuk_resim_1", fetch, thumb=True) == path and fetch.calls == 1
+        assert sniff_media_type(path) == "image/jpeg"
+        with Image.open(path) as image:
+            assert max(image.size) <= 400
+        assert cache.contains("kucuk_resim_1") and not cache._pins
+
+
+def test_sniff_media_type():
+    samples = {
+        b"\xff\xd8\xff\xe0" + b"\0" * 8: "image/jpeg",
+        b"\x89PNG\r\n\x1a\n" + b"\0" * 4: "image/png",
+        b"RIFF\0\0\0\0WEBPVP8 ": "image/webp",
+        b"\0\0\0\x18ftypheic\0\0\0\0": "image/heic",
+        b"\0\0\0\x1cftypavif\0\0\0\0": "image/avif",
+        b"\0\0\0\x20ftypqt  \0\0\0\0": "video/quicktime",
+        b"\0\0\0\x18ftypxxxx\0\0\0\0": "application/octet-stream",
+        b"<html>": "application/octet-stream",
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ornek")
+        for head, media_type in samples.items():
+            with open(path, "wb") as f:
+                f.write(head)
+            assert sniff_media_type(path) == media_type, (head, sniff_media_type(path))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,64 @@
+# backend/test_photos.py
+
+"""Oturum fotoğraflarının ilana bağlanmasının denenmesi
+
+DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e
+ulaşılamazsa testler atlanır.
+
+    python backend/test_photos.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import crud, offices, schemas
+from backend.models import IlanPhoto
+from backend.schemas.ilan import PhotoUploadSessionCreate
+from backend.testing import postgres_available, session_factory, temp_schema
+
+
+def _ilan(baslik="İlan"):
+    return schemas.IlanCreate(baslik=baslik, aciklama="a", fiyat=2000000, mahalle="Moda", sokak="Sokak",
+                              oda_sayisi="2+1", metrekare=100, ofis_id=offices.DEFAULT_OFIS_ID)
+
+
+def _upload(db, user_id, count):
+    session = crud.create_photo_upload_session(db, PhotoUploadSessionCreate(user_id=user_id, expected_photos=count))
+    for i in range(count):
+        crud.add_session_photo(db, session.id, f"{user_id}-{i}", boyut=100 + i, sha256=f"{user_id}{i}")
+    return session
+
+
+def test_session_photos_attach_to_created_ilan():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            session = _upload(db, "a", 3)
+            diger = _upload(db, "b", 1)
+            assert crud.session_has_photo(db, session.id, "a1") and not crud.session_has_photo(db, session.id, "b0")
+
+            ilan = crud.create_emlak_ilan(db, _ilan(), photo_session_id=session.id)
+            assert [(foto.drive_file_id, foto.sira) for foto in ilan.fotolar] == [("a-0", 1), ("a-1", 2), ("a-2", 3)]
+            # Başka oturumun fotoğrafları bağlanmaz
+            assert db.query(IlanPhoto).filter(IlanPhoto.session_id == diger.id).one().ilan_id is None
+
+            # İkinci bağlama bir şey değiştirmez; fotoğraflar ilk ilanda kalır
+            ikinci = crud.create_emlak_ilan(db, _ilan("İkinci"))
+            assert crud.attach_session_photos(db, session.id, ikinci.id) == 0
+            db.commit()
+            assert db.query(IlanPhoto).filter(IlanPhoto.ilan_id == ikinci.id).count() == 0
+            assert db.query(IlanPhoto).filter(IlanPhoto.ilan_id == ilan.id).count() == 3
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    if not postgres_available():
+        print("PostgreSQL'e ulaşılamadı (DATABASE_URL), testler atlandı")
+        sys.exit(0)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,122 @@
+# backend/test_profiling.py
+
+"""İstek profilleyicisinin denenmesi
+
+Küçük bir FastAPI uygulamasına middleware eklenir, profiller geçici bir
+klasöre yazılır. Veritabanı istemez.
+
+    python backend/test_profiling.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend import profiling
+
+TOKEN = "gizli"
+
+
+def yavas_is(ms):
+    """Örnekleyicinin yakalayacağı kadar uzun süren CPU işi"""
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/yavas")
+    def yavas(ms: int = 60):
+        yavas_is(ms)
+        return {"ok": True}
+
+    profiling.install_profiler(app, "deneme")
+    return app
+
+
+@contextmanager
+def profiler_settings(**values):
+    with tempfile.TemporaryDirectory() as directory:
+        settings = dict(PROFILE_ENABLED=True, PROFILE_TOKEN=TOKEN, PROFILE_SAMPLE_RATE=0.0, PROFILE_SLOW_MS=0.0,
+                        PROFILE_INTERVAL_MS=1.0, PROFILE_DIR=directory, PROFILE_MAX_FILES=50)
+        settings.update(values)
+        saved = {name: getattr(profiling, name) for name in settings}
+        for name, value in settings.items():
+            setattr(profiling, name, value)
+        try:
+            yield directory
+        finally:
+            for name, value in saved.items():
+                setattr(profiling, name, value)
+
+
+def _profiles(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".speedscope.json"))
+
+
+def test_disabled_adds_no_middleware():
+    with profiler_settings(PROFILE_ENABLED=False):
+        app = _app()
+        assert not [m for m in app.user_middleware if m.cls is profiling.ProfilerMiddleware]
+
+
+def test_header_writes_speedscope_file():
+    with profiler_settings() as directory:
+        client = TestClient(_app())
+        response = client.get("/yavas", headers={"X-Profile": "yanlis"})
+        assert "x-profile-file" not in response.headers and _profiles(directory) == []
+
+        response = client.get("/yavas", headers={"X-Profile": TOKEN})
+        assert response.status_code == 200 and response.json() == {"ok": True}
+        file_name = response.headers["x-profile-file"]
+        assert _profiles(directory) == [file_name + ".speedscope.json"]
+        assert "-deneme-GET-yavas" in file_name
+
+        with open(os.path.join(directory, file_name + ".speedscope.json")) as f:
+            profile = json.load(f)
+        assert profile["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+        assert profile["name"].startswith("deneme GET /yavas")
+        frames = profile["shared"]["frames"]
+        assert profile["profiles"] and all({"name", "file", "line"} <= set(frame) for frame in frames)
+        for thread in profile["profiles"]:
+            assert thread["type"] == "sampled" and thread["unit"] == "seconds" and thread["endValue"] > 0
+            assert len(thread["samples"]) == len(thread["weights"])
+            assert all(0 <= i < len(frames) for stack in thread["samples"] for i in stack)
+        # Threadpool'da çalışan senkron endpoint'in çerçevesi görünür
+        assert "yavas_is" in {frame["name"] for frame in frames}
+
+
+def test_slow_threshold_keeps_only_slow_requests():
+    with profiler_settings(PROFILE_SLOW_MS=40.0) as directory:
+        client = TestClient(_app())
+        client.get("/yavas", params={"ms": 0})
+        assert _profiles(directory) == []
+        client.get("/yavas", params={"ms": 80})
+        assert len(_profiles(directory)) == 1
+
+
+def test_old_profiles_are_pruned():
+    with profiler_settings(PROFILE_MAX_FILES=2) as directory:
+        client = TestClient(_app())
+        names = []
+        for _ in range(4):
+            names.append(client.get("/yavas", params={"ms": 5}, headers={"X-Profile": TOKEN}).headers["x-profile-file"])
+            # mtime çözünürlüğü sıralamayı bozmasın
+            time.sleep(0.02)
+        assert _profiles(directory) == sorted(name + ".speedscope.json" for name in names[-2:])
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,259 @@
+# backend/test_rate_limit.py
+
+"""Ortak hız sınırlamanın denenmesi
+
+Süreç içi depo testleri veritabanı istemez. Süreçler arası depo
+(_DbStore) testleri DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada
+çalışır; PostgreSQL'e ulaşılamazsa atlanır.
+
+    python backend/test_rate_limit.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from backend import rate_limit
+from backend.rate_limit import Limiter, Overloaded, ServiceLimit
+from backend.testing import postgres_available, temp_schema
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def _limiter(store=None, rate=50.0, burst=2, concurrency=2, queue_timeout_s=0.5):
+    limit = ServiceLimit("deneme", rate, burst, concurrency, queue_timeout_s)
+    return Limiter(store=store or rate_limit._LocalStore(), limits={"deneme": limit})
+
+
+def test_rate_limit_info():
+    assert rate_limit.rate_limit_info(FakeHttpError(429, {"Retry-After": "3"})) == (True, 3.0)
+    assert rate_limit.rate_limit_info(FakeHttpError(503)) == (True, None)
+    assert rate_limit.rate_limit_info(FakeHttpError(404)) == (False, None)
+    assert rate_limit.rate_limit_info(ValueError("x")) == (False, None)
+    drive = FakeHttpError(403)
+    drive.args = ("userRateLimitExceeded",)
+    assert rate_limit.rate_limit_info(drive)[0] is True
+
+
+def test_bucket_waits_after_burst():
+    limiter = _limiter(rate=20.0, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        with limiter.slot("deneme"):
+            pass
+    # İlk ikisi ani yük payından, kalan ikisi saniyede 20 token hızıyla
+    elapsed = time.monotonic() - start
+    assert 0.08 <= elapsed < 0.4, elapsed
+
+
+def test_queue_timeout_raises_overloaded():
+    limiter = _limiter(rate=1.0, burst=1, queue_timeout_s=0.2)
+    with limiter.slot("deneme"):
+        pass
+    start = time.monotonic()
+    try:
+        with limiter.slot("deneme"):
+            raise AssertionError("token kalmamalıydı")
+    except Overloaded as e:
+        assert e.service == "deneme" and e.retry_after > 0.2
+    # Bekleme süresinin sonuna kadar uyumadan hemen reddedilmeli
+    assert time.monotonic() - start < 0.1
+
+
+def test_concurrency_limit():
+    limiter = _limiter(rate=1000.0, burst=100, concurrency=2, queue_timeout_s=2.0)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def work():
+        with limiter.slot("deneme"):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2, peak
+
+
+def test_max_waiters_rejects_immediately():
+    limiter = _limiter(rate=1000.0, burst=100, concurrency=1, queue_timeout_s=2.0)
+    limiter.limits["deneme"].max_waiters = 1
+    started, done = threading.Event(), threading.Event()
+
+    def hold():
+        with limiter.slot("deneme"):
+            started.set()
+            done.wait(2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    started.wait(2)
+
+    def wait():
+        with limiter.slot("deneme"):
+            pass
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.05)
+    try:
+        with limiter.slot("deneme"):
+            raise AssertionError("bekleyen sayısı dolu olmalıydı")
+    except Overloaded:
+        pass
+    finally:
+        done.set()
+        holder.join()
+        waiter.join()
+
+
+def test_call_retries_after_429():
+    limiter = _limiter(rate=100.0, burst=5, queue_timeout_s=2.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise FakeHttpError(429, {"retry-after": "0.1"})
+        return "tamam"
+
+    assert limiter.call("deneme", flaky) == "tamam"
+    assert len(attempts) == 3
+    # Retry-After süresi kovaya yazılır; sonraki deneme en az o kadar bekler
+    assert attempts[1] - attempts[0] >= 0.1 and attempts[2] - attempts[1] >= 0.1
+
+    def not_found():
+        raise FakeHttpError(404)
+
+    try:
+        limiter.call("deneme", not_found)
+        raise AssertionError("404 yeniden denenmemeliydi")
+    except FakeHttpError as e:
+        assert e.status_code == 404
+
+
+class FlakyStore(rate_limit._LocalStore):
+    """İlk failures çağrıda bağlantı hatası veren ortak depo taklidi"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.calls = []
+
+    def _call(self, name):
+        self.calls.append(name)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("veritabanı yok")
+
+    def take(self, limit, cost):
+        self._call("take")
+        return super().take(limit, cost)
+
+    def lease(self, limit, holder):
+        self._call("lease")
+        return 7
+
+    def release(self, limit, slot, holder):
+        self._call("release")
+        assert slot == 7, slot
+
+
+def test_fallback_is_temporary():
+    shared = FlakyStore(failures=1)
+    limit = ServiceLimit("deneme", 1000.0, 100, 2, 1.0)
+    limiter = Limiter(store=shared, limits={"deneme": limit}, fallback_s=0.2)
+
+    # Hata: süreç içi depoya geçilir, kiralama da oradan alınıp oraya bırakılır
+    with limiter.slot("deneme"):
+        assert limiter.store is limiter._local
+    assert shared.calls == ["take"]
+    # Geri çekilme süresince ortak depo denenmez
+    with limiter.slot("deneme"):
+        pass
+    assert shared.calls == ["take"]
+
+    time.sleep(0.25)
+    with limiter.slot("deneme"):
+        assert limiter._fallback_until is None and limiter.store is shared
+    assert shared.calls == ["take", "take", "lease", "release"]
+
+    # Yeniden denemede hâlâ hata varsa süre uzatılır
+    shared.failures = 2
+    with limiter.slot("deneme"):
+        pass
+    time.sleep(0.25)
+    with limiter.slot("deneme"):
+        pass
+    assert shared.calls[-2:] == ["take", "take"]
+    assert limiter.store is limiter._local and limiter._fallback_until > time.monotonic()
+
+
+def test_db_store_uses_own_pool():
+    from backend import database
+
+    engine = rate_limit._db_engine()
+    try:
+        assert engine is not database.engine and engine.url == database.engine.url
+        if not database.DB_PGBOUNCER and engine.dialect.name == "postgresql":
+            assert engine.pool.size() == rate_limit.RATE_LIMIT_DB_POOL_SIZE
+    finally:
+        engine.dispose()
+
+
+def test_db_store_shares_tokens_and_leases():
+    with temp_schema() as engine:
+        store = rate_limit._DbStore(engine)
+        # İki ayrı Limiter, iki süreci temsil eder
+        first = _limiter(store=store, rate=1.0, burst=2, concurrency=1, queue_timeout_s=0.2)
+        second = _limiter(store=rate_limit._DbStore(engine), rate=1.0, burst=2, concurrency=1, queue_timeout_s=0.2)
+        limit = first.limits["deneme"]
+
+        with first.slot("deneme"):
+            # Tek yuva ilk süreçte; ikinci süreç kiralama alamaz
+            try:
+                with second.slot("deneme"):
+                    raise AssertionError("yuva dolu olmalıydı")
+            except Overloaded:
+                pass
+        # İki token da harcandı; kova ortak olduğundan ikinci süreç de bekler
+        assert store.take(limit, 1) > 0.2
+
+        first.penalize("deneme", 5.0)
+        assert store.take(limit, 1) > 4.0
+
+        # Süresi dolmuş kiralama yeniden kullanılır
+        assert store.lease(limit, "a") == 0
+        assert store.lease(limit, "b") is None
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE rate_limit_leases SET expires_at = 0 WHERE service = 'deneme'"))
+        assert store.lease(limit, "b") == 0
+        # Başkasının kiralamasını bırakmak etkisizdir
+        store.release(limit, 0, "a")
+        assert store.lease(limit, "c") is None
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
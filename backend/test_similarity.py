@@ -0,0 +1,259 @@
+# backend/test_similarity.py
+
+"""Benzer ilan dizininin denenmesi
+
+Dizin geçici bir klasöre kurulur. Vektör, sıralama ve ek parça testleri
+dizini bellekteki satırlardan kurar, veritabanı istemez. Kurulum ve günlük
+testleri ilanları DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada tutar;
+PostgreSQL'e ulaşılamazsa atlanır.
+
+    python backend/test_similarity.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import crud, database, offices, schemas, similarity
+from backend.similarity import IndexNotReady, SimilarityIndex
+from backend.testing import postgres_available, session_factory, temp_schema
+
+ILANLAR = [
+    ("Deniz manzaralı bahçeli dubleks", "Moda", 9_000_000, 180, "4+1"),
+    ("Deniz manzaralı bahçeli dubleks daire", "Moda", 9_500_000, 175, "4+1"),
+    ("Metroya yakın öğrenciye uygun stüdyo", "Kozyatağı", 2_000_000, 35, "1+0"),
+    ("Site içinde havuzlu aile dairesi", "Ataşehir", 6_000_000, 140, "3+1"),
+]
+
+
+def _ilan(ofis_id, aciklama, mahalle, fiyat, metrekare, oda_sayisi):
+    return schemas.IlanCreate(baslik=f"{mahalle} {oda_sayisi}", aciklama=aciklama, fiyat=fiyat, mahalle=mahalle,
+                              sokak="Sokak", oda_sayisi=oda_sayisi, metrekare=metrekare, ofis_id=ofis_id)
+
+
+def _seed(db, ofis_id):
+    return [crud.create_emlak_ilan(db, _ilan(ofis_id, *values)) for values in ILANLAR]
+
+
+def _fields(ilan):
+    return similarity._ilan_fields(ilan)
+
+
+def _rows():
+    """ILANLAR'ın veritabanına gitmeden dizine verilecek satırları (id 1'den)"""
+    return [
+        {"id": i, "baslik": f"{mahalle} {oda_sayisi}", "aciklama": aciklama, "mahalle": mahalle, "fiyat": fiyat,
+         "metrekare": metrekare, "oda_sayisi": oda_sayisi}
+        for i, (aciklama, mahalle, fiyat, metrekare, oda_sayisi) in enumerate(ILANLAR, start=1)
+    ]
+
+
+def _memory_index(directory, rows=None):
+    similarity.write_index(rows or _rows(), offices.DEFAULT_OFIS_ID, 0, directory)
+    return SimilarityIndex.load(directory)
+
+
+def test_vectorising():
+    assert similarity._terms({"baslik": "Deniz MANZARALI", "aciklama": "ŞİŞLİ a"}) == \
+        similarity._terms({"baslik": "deniz manzarali", "aciklama": "sisli"})
+    # Tek harfli sözcükler alınmaz, tekrarlar sayılır
+    assert sorted(similarity._terms({"aciklama": "a b daire daire"}).values()) == [2]
+    fiyat, metrekare, oda = similarity._numeric({"fiyat": 1000, "metrekare": None, "oda_sayisi": "3+1"})
+    assert abs(fiyat - np.log1p(1000)) < 1e-9 and np.isnan(metrekare) and oda == 3
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        terms, weights = index._text_vector({"aciklama": "deniz manzaralı dubleks"})
+        assert len(terms) == 3 and abs(float(np.linalg.norm(weights)) - 1) < 1e-5
+        # Dizinde hiç geçmeyen sözcüğün IDF'i, her yerde geçenden yüksektir
+        terms, weights = index._text_vector({"aciklama": "deniz zzzyyy"})
+        rare = list(similarity._terms({"aciklama": "zzzyyy"}))[0]
+        assert weights[list(terms).index(rare)] == weights.max()
+
+
+def test_ranking():
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        assert index.meta["n_docs"] == len(ILANLAR) and index.cursor == 0
+        query = _rows()[0]
+        results = index.query(query, exclude_id=1)
+        assert results[0][0] == 2 and all(ilan_id != 1 for ilan_id, _ in results)
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True) and all(0 < score <= 1 for score in scores)
+        assert index.query(query)[0] == (1, 1.0)
+        assert len(index.query(query, k=1)) == 1
+        # Metin ortak değilse sayısal yakınlık tek başına aday getirmez
+        assert index.query({"aciklama": "hiçbir ilanda geçmeyen sözler"}) == []
+
+
+def test_delta_add_and_remove():
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        query = _rows()[0]
+        index.add(dict(query, id=10))
+        # Ek parçadaki birebir kopya temel parçadaki benzerinin önüne geçer
+        assert [ilan_id for ilan_id, _ in index.query(query, exclude_id=1)][:2] == [10, 2]
+
+        # Güncelleme: temel parçadaki satır ölür, yeni metin ek parçadan gelir
+        index.add(dict(_rows()[1], baslik="Stüdyo", aciklama="Metroya yakın stüdyo", mahalle="Kozyatağı"))
+        assert index.dead[1] and 2 not in [ilan_id for ilan_id, _ in index.query(query)]
+        assert 2 in [ilan_id for ilan_id, _ in index.query({"aciklama": "metroya yakın stüdyo"})]
+
+        index.remove(10)
+        index.remove(2)
+        ids = [ilan_id for ilan_id, _ in index.query(query)] + [i for i, _ in index.query({"aciklama": "stüdyo"})]
+        assert 10 not in ids and 2 not in ids
+        assert index._delta == {}
+
+
+def test_snapshot_is_immutable():
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        first = index._current_snapshot()
+        assert index._current_snapshot() is first
+        dead, ids, matrix, numeric = first
+        index.add(dict(_rows()[0], id=20))
+        index.remove(3)
+        # Eski kopyayı okuyan sorgu değişiklikleri görmez
+        assert len(ids) == 0 and matrix.shape[0] == 0 and not dead.any()
+        second = index._current_snapshot()
+        assert second is not first and list(second[1]) == [20] and second[0][2]
+
+
+def test_catch_up_rechecks_after_lock():
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        results = []
+        index._sync_lock.acquire()
+        # Kilidi bekleyen ikinci istek, ilki günlüğü okuduysa veritabanına gitmez (db=None)
+        thread = threading.Thread(target=lambda: results.append(index.catch_up(None)))
+        thread.start()
+        time.sleep(0.05)
+        index._synced_at = time.monotonic()
+        index._sync_lock.release()
+        thread.join()
+        assert results == [0]
+
+
+def test_db_build_and_query():
+    with temp_schema() as engine, tempfile.TemporaryDirectory() as directory:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            ilanlar = _seed(db, ofis_id)
+            # Başka ofisin aynı ilanı benzerler arasında çıkmamalı
+            crud.create_emlak_ilan(db, _ilan(diger, *ILANLAR[0]))
+
+            meta = similarity.build(db, ofis_id, directory)
+            assert meta["n_docs"] == len(ILANLAR) and meta["ofis_id"] == ofis_id
+            index = SimilarityIndex.load(directory)
+            results = index.query(_fields(ilanlar[0]), k=2, exclude_id=ilanlar[0].id)
+            assert results[0][0] == ilanlar[1].id and 0 < results[0][1] <= 1, results
+            assert all(ilan_id != ilanlar[0].id for ilan_id, _ in results)
+            assert index.query({"baslik": "", "aciklama": "?"}) == []
+        finally:
+            db.close()
+
+
+def test_db_catch_up_applies_changes():
+    with temp_schema() as engine, tempfile.TemporaryDirectory() as directory:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            ilanlar = _seed(db, ofis_id)
+            similarity.build(db, ofis_id, directory)
+            index = SimilarityIndex.load(directory)
+
+            yeni = crud.create_emlak_ilan(db, _ilan(ofis_id, "Deniz manzaralı bahçeli dubleks villa", "Moda",
+                                                    9_200_000, 178, "4+1"))
+            crud.bulk_delete_emlak_ilanlar(db, [ilanlar[1].id])
+            assert index.catch_up(db, force=True) == 2
+            ids = [ilan_id for ilan_id, _ in index.query(_fields(ilanlar[0]), exclude_id=ilanlar[0].id)]
+            assert ids[0] == yeni.id and ilanlar[1].id not in ids, ids
+            # İmleç ilerledi; aynı değişiklikler yeniden işlenmez
+            assert index.catch_up(db, force=True) == 0
+        finally:
+            db.close()
+
+
+def test_queries_during_updates():
+    with tempfile.TemporaryDirectory() as directory:
+        index = _memory_index(directory)
+        rows = _rows()
+        errors, stop = [], threading.Event()
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                i += 1
+                index.add(dict(rows[2], id=10_000 + i % 50, aciklama=f"deniz manzaralı {i}"))
+                index.remove(10_000 + (i * 7) % 50)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                try:
+                    index.query(rows[0])
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            stop.set()
+            thread.join()
+        assert not errors, errors[:3]
+
+
+def test_rebuild_replaces_generation():
+    with tempfile.TemporaryDirectory() as directory:
+        first = similarity.write_index(_rows(), offices.DEFAULT_OFIS_ID, 0, directory)
+        old = SimilarityIndex.load(directory)
+        second = similarity.write_index(_rows(), offices.DEFAULT_OFIS_ID, 5, directory)
+        assert second["generation"] > first["generation"]
+        files = sorted(name for name in os.listdir(directory) if name.endswith(".npy"))
+        assert files and all(name.startswith(f"{second['generation']}.") for name in files), files
+        # Eski kuşağı mmap ile açmış olan dizin okumaya devam eder
+        assert old.query({"aciklama": "deniz manzaralı dubleks"})
+        new = SimilarityIndex.load(directory)
+        assert new.generation == second["generation"] and new.cursor == 5
+
+
+def test_db_missing_index_is_built_in_background():
+    saved = similarity.SIMILARITY_DIR, database.SessionLocal
+    with temp_schema() as engine, tempfile.TemporaryDirectory() as directory:
+        similarity.SIMILARITY_DIR = directory
+        database.SessionLocal = session_factory(engine)
+        db = database.SessionLocal()
+        try:
+            ilanlar = _seed(db, offices.DEFAULT_OFIS_ID)
+            try:
+                similarity.similar_ilanlar(db, ilanlar[0])
+                raise AssertionError("dizin henüz yoktu")
+            except IndexNotReady as e:
+                assert e.ofis_id == offices.DEFAULT_OFIS_ID
+            deadline = time.monotonic() + 10
+            while similarity._building and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert similarity.similar_ilanlar(db, ilanlar[0])[0][0] == ilanlar[1].id
+        finally:
+            db.close()
+            similarity._indexes.clear()
+            similarity.SIMILARITY_DIR, database.SessionLocal = saved
+
+
+if __name__ == "__main__":
+    available = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not available:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,94 @@
+# backend/test_stats.py
+
+"""m² fiyatı istatistiklerinin denenmesi
+
+Taslak testleri veritabanı istemez. Artımlı güncelleme testleri
+DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e
+ulaşılamazsa atlanır.
+
+    python backend/test_stats.py
+"""
+
+import os
+import random
+import statistics
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import crud, offices, schemas, stats
+from backend.testing import postgres_available, session_factory, temp_schema
+
+
+def _sketch(values):
+    sketch = {}
+    for value in values:
+        key = str(stats._bucket(value))
+        sketch[key] = sketch.get(key, 0) + 1
+    return sketch
+
+
+def _ilan(ofis_id, mahalle, oda_sayisi, fiyat, metrekare=100):
+    return schemas.IlanCreate(baslik="İlan", aciklama="a", fiyat=fiyat, mahalle=mahalle, sokak="Sokak",
+                              oda_sayisi=oda_sayisi, metrekare=metrekare, ofis_id=ofis_id)
+
+
+def test_sketch_quantile_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(10, 0.5) for _ in range(5001)]
+    median = stats.sketch_quantile(_sketch(values), 0.5)
+    assert abs(median - statistics.median(values)) / statistics.median(values) <= stats.SKETCH_RELATIVE_ACCURACY
+    assert stats.sketch_quantile({}, 0.5) is None
+    # Sayısı sıfıra inmiş kovalar yok sayılmalı
+    assert stats.sketch_quantile({"5": 0}, 0.5) is None
+
+
+def test_stat_key_skips_unpriced():
+    assert stats.stat_key({"ofis_id": 1, "mahalle": " Moda ", "oda_sayisi": "2+1", "fiyat": 1, "metrekare": 1}) == (1, "Moda", "2+1")
+    assert stats.stat_key({"ofis_id": 1, "mahalle": "Moda", "fiyat": 1000, "metrekare": 0}) is None
+    assert stats.stat_key({"ofis_id": 1, "mahalle": "Moda", "fiyat": None, "metrekare": 80}) is None
+
+
+def test_db_incremental_matches_rebuild():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis_id = offices.DEFAULT_OFIS_ID
+            diger = offices.create_ofis(db, "Şube").id
+            ilanlar = [crud.create_emlak_ilan(db, _ilan(ofis_id, "Moda", "2+1", fiyat)) for fiyat in (1e6, 2e6, 3e6)]
+            crud.bulk_create_emlak_ilanlar(db, [
+                _ilan(ofis_id, "Moda", "3+1", 4e6),
+                _ilan(diger, "Moda", "2+1", 5e6),
+                _ilan(ofis_id, "Moda", "2+1", 0),
+            ])
+            crud.bulk_delete_emlak_ilanlar(db, [ilanlar[0].id])
+
+            incremental = stats.get_stats(db)
+            assert incremental == [
+                {"mahalle": "Moda", "oda_sayisi": "2+1", "adet": 3, "ortalama_m2_fiyat": 33333.33,
+                 "std_m2_fiyat": 12472.19, "medyan_m2_fiyat": incremental[0]["medyan_m2_fiyat"]},
+                {"mahalle": "Moda", "oda_sayisi": "3+1", "adet": 1, "ortalama_m2_fiyat": 40000.0,
+                 "std_m2_fiyat": 0.0, "medyan_m2_fiyat": incremental[1]["medyan_m2_fiyat"]},
+            ], incremental
+            assert abs(incremental[0]["medyan_m2_fiyat"] - 30000) <= 30000 * stats.SKETCH_RELATIVE_ACCURACY
+
+            assert stats.rebuild_stats(db) == 3
+            assert stats.get_stats(db) == incremental
+
+            # Ofis filtresi ve daha kaba gruplama
+            assert [row["adet"] for row in stats.get_stats(db, ofis_id=diger)] == [1]
+            assert stats.get_stats(db, mahalle="Moda", group_by=("mahalle",))[0]["adet"] == 4
+            assert stats.get_stats(db, oda_sayisi="4+1") == []
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -0,0 +1,52 @@
+# backend/testing.py
+
+"""Veritabanı testleri için geçici şema
+
+Testler DATABASE_URL'deki PostgreSQL veritabanında, her çalıştırmada açılıp
+sonunda silinen ayrı bir şemada çalışır; var olan tablolara dokunulmaz.
+PostgreSQL'e ulaşılamıyorsa testler atlanır.
+"""
+
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from backend.database import SQLALCHEMY_DATABASE_URL, create_db_engine
+
+
+def postgres_available() -> bool:
+    if not SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
+        return False
+    probe = create_db_engine(SQLALCHEMY_DATABASE_URL)
+    try:
+        with probe.connect():
+            return True
+    except OperationalError:
+        return False
+    finally:
+        probe.dispose()
+
+
+@contextmanager
+def temp_schema(migrated: bool = True):
+    """Geçici şemaya bağlı engine; migrated=True ise tablolar migrate ile kurulur"""
+    schema = f"emlak_test_{uuid.uuid4().hex[:8]}"
+    admin = create_db_engine(SQLALCHEMY_DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_db_engine(SQLALCHEMY_DATABASE_URL, connect_args={"options": f"-c search_path={schema}"})
+    try:
+        if migrated:
+            import migrate
+            migrate.migrate(engine)
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -1,13 +1,19 @@
 # bot/gpt_parser.py
 
-import openai
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import json
+from backend import rate_limit
 
 load_dotenv()
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """OpenAI istemcisini ilk mesajda oluştur; kütüphane yüklemesi açılışı yavaşlatmasın"""
+    import openai
+    # Yeniden denemeler rate_limit katmanında, Retry-After'a uyularak yapılır
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 
 # Örnek prompt fonksiyonu
 def parse_message_to_json(message: str) -> dict:
@@ -21,7 +27,6 @@ Format:
   "baslik": "...",
   "aciklama": "...",
   "fiyat": 0,
-  "emlak_ofisi_id": 1,
   "konum": "...",  # Mahalle adı
   "sokak": "...",  # Sokak/Cadde adı
   "oda_sayisi": "...",  # 1+1, 2+1, 3+1 gibi
@@ -30,7 +35,6 @@ Format:
 }}
 
 Notlar:
-- "emlak_ofisi_id" alanını her zaman 1 olarak ayarla.
 - "fiyat" TL cinsindedir, sadece sayı olarak yaz.
 - "konum" alanına sadece mahalle adını yaz.
 - "sokak" alanına sadece sokak/cadde adını yaz.
@@ -40,13 +44,13 @@ Notlar:
 - Eğer mesajda birden fazla satır varsa, genellikle ilk satır mahalle bilgisidir. Başındaki emoji veya işareti temizle.
 """
 
-    response = client.chat.completions.create(
+    response = rate_limit.call("openai", lambda: get_openai_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "user", "content": prompt}
         ],
         temperature=0.2
-    )
+    ))
 
     json_str = response.choices[0].message.content
 
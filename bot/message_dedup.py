@@ -0,0 +1,148 @@
+# bot/message_dedup.py
+
+"""Twilio webhook tekrarlarının ayıklanması (MessageSid ile)
+
+Twilio yanıt vermeyen webhook'u yeniden dener. Fotoğraf yükleme dakikalar
+sürebildiği için tekrar, ilk istek hâlâ çalışırken gelir ve aynı mesaj iki
+kez işlenir. Her mesaj işlenmeden önce processed_messages tablosuna tek bir
+INSERT ... ON CONFLICT DO NOTHING ile sahiplenilir; aynı anda gelen iki
+teslimden yalnızca biri satırı ekleyebilir, bu yüzden worker'lar arası yarış
+da veritabanında çözülür. Diğer teslim:
+- ilk işlem bitmişse onun yanıtını alır,
+- hâlâ sürüyorsa boş yanıtla hemen döner; ilk işlem bitince yanıtı REST
+  API ile gönderilir (Twilio ilk bağlantıyı çoktan kapatmıştır).
+
+Biten yanıtlar bellekte sınırlı bir LRU'da da tutulur; yakın tekrarlar
+veritabanına gitmez. Satırlar MESSAGE_SID_TTL_S sonra reaper ile silinir.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from xml.etree import ElementTree
+
+from sqlalchemy import case, delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from backend.models import ProcessedMessage
+
+MESSAGE_SID_TTL_S = int(os.getenv("MESSAGE_SID_TTL_S", 48 * 3600))
+MESSAGE_SID_MEMORY = int(os.getenv("MESSAGE_SID_MEMORY", 10000))
+# Bu süredir "processing" kalan talep çöken bir süreçten kalmıştır; yeni teslim devralır
+MESSAGE_CLAIM_TIMEOUT_S = int(os.getenv("MESSAGE_CLAIM_TIMEOUT_S", 900))
+
+PROCESSING = "processing"
+DONE = "done"
+
+
+class RecentMessages:
+    """Son işlenen mesajların yanıtları; en eski girdi önce düşer"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, message_sid: str) -> Optional[str]:
+        with self._lock:
+            response = self._items.get(message_sid)
+            if response is not None:
+                self._items.move_to_end(message_sid)
+            return response
+
+    def put(self, message_sid: str, response: str):
+        with self._lock:
+            self._items[message_sid] = response
+            self._items.move_to_end(message_sid)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+_recent = RecentMessages(MESSAGE_SID_MEMORY)
+
+
+def claim_message(db: Session, message_sid: str, from_number: str = None) -> Optional[str]:
+    """Mesajı bu istek için sahiplen
+
+    None dönerse mesaj ilk kez görülüyordur ve işlenmelidir; aksi halde bu
+    bir tekrar teslimdir ve dönen yanıt ("" = boş) olduğu gibi gönderilir.
+    """
+    cached = _recent.get(message_sid)
+    if cached is not None:
+        return cached
+
+    now = datetime.utcnow()
+    claimed = db.execute(
+        insert(ProcessedMessage)
+        .values(message_sid=message_sid, from_number=from_number, status=PROCESSING,
+                tekrar=0, created_at=now, updated_at=now)
+        .on_conflict_do_nothing(index_elements=["message_sid"])
+        .returning(ProcessedMessage.message_sid)
+    ).scalar()
+    if claimed is None:
+        claimed = db.execute(
+            update(ProcessedMessage)
+            .where(
+                ProcessedMessage.message_sid == message_sid,
+                ProcessedMessage.status == PROCESSING,
+                ProcessedMessage.updated_at < now - timedelta(seconds=MESSAGE_CLAIM_TIMEOUT_S),
+            )
+            .values(updated_at=now)
+            .returning(ProcessedMessage.message_sid)
+        ).scalar()
+        if claimed is not None:
+            print(f"Yarım kalan mesaj devralındı: {message_sid}")
+    if claimed is not None:
+        db.commit()
+        return None
+
+    # İlk işlem sürüyorsa tekrarı işaretle; satır bu arada silinmiş olsa da tekrar sayılır
+    row = db.execute(
+        update(ProcessedMessage)
+        .where(ProcessedMessage.message_sid == message_sid)
+        .values(tekrar=case((ProcessedMessage.status == PROCESSING, ProcessedMessage.tekrar + 1), else_=ProcessedMessage.tekrar))
+        .returning(ProcessedMessage.status, ProcessedMessage.response)
+    ).first()
+    db.commit()
+    if row is not None and row.status == DONE:
+        _recent.put(message_sid, row.response or "")
+        return row.response or ""
+    return ""
+
+
+def finish_message(db: Session, message_sid: str, response: str) -> int:
+    """Yanıtı kaydet; işlem sürerken gelen tekrar teslim sayısını döndür"""
+    tekrar = db.execute(
+        update(ProcessedMessage)
+        .where(ProcessedMessage.message_sid == message_sid)
+        .values(status=DONE, response=response, updated_at=datetime.utcnow())
+        .returning(ProcessedMessage.tekrar)
+    ).scalar()
+    db.commit()
+    _recent.put(message_sid, response)
+    return tekrar or 0
+
+
+def release_message(db: Session, message_sid: str):
+    """İşlenemeyen mesajın talebini bırak; Twilio'nun ya da kullanıcının tekrarı yeniden işlenir"""
+    db.execute(
+        delete(ProcessedMessage)
+        .where(ProcessedMessage.message_sid == message_sid, ProcessedMessage.status == PROCESSING)
+    )
+    db.commit()
+
+
+def twiml_messages(response: str):
+    """TwiML yanıtındaki mesaj metinleri"""
+    if not response:
+        return []
+    try:
+        root = ElementTree.fromstring(response.encode())
+    except ElementTree.ParseError:
+        return []
+    return [message.text for message in root.iter("Message") if message.text]
@@ -0,0 +1,234 @@
+# bot/reaper.py
+
+"""Yarım kalmış ilan eklemelerinin bıraktığı artıkları temizleme
+
+Temsilci detayları ve fotoğrafları gönderip /tamamla demezse geride bir
+PhotoUploadSession satırı, herkese açık bir Drive klasörü, ilana
+bağlanmamış fotoğraf satırları ve bellekte bir user_states girdisi kalır.
+Twilio tekrarlarını ayıklamak için tutulan MessageSid kayıtları da
+MESSAGE_SID_TTL_S sonra silinir.
+Süreç yazma ile os.remove arasında çökerse photo_* geçici dosyaları da
+çalışma dizininde birikir. Reaper bunları süre aşımına (TTL) göre
+bulur, toplu olarak ve sınırlı eş zamanlılıkla siler ve neyi temizlediğini
+raporlar.
+
+Bot açılışında arka planda REAPER_INTERVAL_S saniyede bir çalışır; elle
+tek seferlik çalıştırmak için:
+    python -m bot.reaper
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from backend.models import Ilan, IlanPhoto, PhotoUploadSession, ProcessedMessage
+from bot.message_dedup import MESSAGE_SID_TTL_S
+
+# İki çalıştırma arasındaki süre; 0 arka plan görevini kapatır
+REAPER_INTERVAL_S = int(os.getenv("REAPER_INTERVAL_S", 600))
+# Bu süre boyunca güncellenmeyen fotoğraf oturumları terk edilmiş sayılır
+SESSION_TTL_S = int(os.getenv("SESSION_TTL_S", 24 * 3600))
+USER_STATE_TTL_S = int(os.getenv("USER_STATE_TTL_S", 24 * 3600))
+TEMP_FILE_TTL_S = int(os.getenv("TEMP_FILE_TTL_S", 3600))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", 100))
+# Aynı anda gönderilen en fazla Drive toplu isteği
+REAPER_CONCURRENCY = int(os.getenv("REAPER_CONCURRENCY", 4))
+TEMP_FILE_PATTERNS = ("photo_*.jpg", "photo_*.png")
+
+
+class UserStates(dict):
+    """Kullanıcı durumları; reaper için her girdinin son kullanım zamanı tutulur"""
+
+    def __init__(self):
+        super().__init__()
+        self.touched_at = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.touched_at[key] = time.monotonic()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touched_at.pop(key, None)
+
+    def touch(self, key):
+        if key in self:
+            self.touched_at[key] = time.monotonic()
+
+    def expire(self, ttl_s: float) -> int:
+        """ttl_s saniyedir kullanılmayan girdileri sil, silinen sayısını döndür"""
+        cutoff = time.monotonic() - ttl_s
+        expired = [key for key, touched in list(self.touched_at.items()) if touched < cutoff]
+        for key in expired:
+            self.pop(key, None)
+            self.touched_at.pop(key, None)
+        return len(expired)
+
+
+def _delete_drive_folders(folder_ids: List[str], service_factory: Callable) -> Dict[str, str]:
+    """Klasörleri REAPER_BATCH_SIZE'lık parçalar halinde, en fazla REAPER_CONCURRENCY parça aynı anda olacak şekilde sil"""
+    from drive_service.uploader import delete_folders_by_id
+
+    if not folder_ids:
+        return {}
+    chunks = [folder_ids[i:i + REAPER_BATCH_SIZE] for i in range(0, len(folder_ids), REAPER_BATCH_SIZE)]
+    failed = {}
+    # Drive istemcisi iş parçacıkları arasında paylaşılamaz; her parça kendi istemcisini alır
+    with ThreadPoolExecutor(max_workers=max(1, REAPER_CONCURRENCY)) as pool:
+        for chunk_failed in pool.map(lambda chunk: delete_folders_by_id(service_factory(), chunk), chunks):
+            failed.update(chunk_failed)
+    return failed
+
+
+def reap_sessions(db: Session, now: datetime, service_factory: Callable, report: Dict):
+    """Terk edilmiş fotoğraf oturumlarını, bağlanmamış fotoğraf satırlarını ve Drive klasörlerini sil
+
+    Oturumlar önce veritabanında silinerek sahiplenilir; klasörler ancak commit
+    sonrası silinir. Böylece bu arada /tamamla ile ilana bağlanan ya da
+    kullanıcının yeniden yazmaya başladığı bir oturumun klasörüne dokunulmaz.
+    """
+    cutoff = now - timedelta(seconds=SESSION_TTL_S)
+    last_id = 0
+    while True:
+        candidate_ids = [
+            row.id for row in
+            db.query(PhotoUploadSession.id)
+            .filter(PhotoUploadSession.updated_at < cutoff, PhotoUploadSession.id > last_id)
+            .order_by(PhotoUploadSession.id)
+            .limit(REAPER_BATCH_SIZE * max(1, REAPER_CONCURRENCY))
+        ]
+        if not candidate_ids:
+            break
+        last_id = candidate_ids[-1]
+
+        # Bu arada kullanıcı yeniden yazmaya başladıysa oturum silinmez
+        sessions = db.execute(
+            delete(PhotoUploadSession)
+            .where(PhotoUploadSession.id.in_(candidate_ids), PhotoUploadSession.updated_at < cutoff)
+            .returning(PhotoUploadSession.id, PhotoUploadSession.drive_folder_id, PhotoUploadSession.updated_at)
+        ).all()
+        if not sessions:
+            db.rollback()
+            continue
+        report["foto_satiri"] += db.execute(
+            delete(IlanPhoto).where(
+                IlanPhoto.session_id.in_([s.id for s in sessions]), IlanPhoto.ilan_id.is_(None)
+            )
+        ).rowcount
+        db.commit()
+        report["oturum"] += len(sessions)
+
+        folder_ids = list(dict.fromkeys(s.drive_folder_id for s in sessions if s.drive_folder_id))
+        # /tamamla sonrası oturum silinemediyse klasör artık bir ilana ait; dokunma
+        if folder_ids:
+            owned = {row.drive_folder_id for row in db.query(Ilan.drive_folder_id).filter(Ilan.drive_folder_id.in_(folder_ids))}
+            folder_ids = [folder_id for folder_id in folder_ids if folder_id not in owned]
+        failed = _delete_drive_folders(folder_ids, service_factory)
+        report["drive_klasoru"] += len(folder_ids) - len(failed)
+        report["hatali_klasor"] += len(failed)
+
+        # Klasörü silinemeyen oturumlar kullanıcısız geri yazılır; bir sonraki
+        # çalıştırmada yeniden denenir ama kimsenin oturumu olarak bulunmaz
+        restored = [s for s in sessions if s.drive_folder_id in failed]
+        if restored:
+            db.add_all(
+                PhotoUploadSession(id=s.id, user_id=None, drive_folder_id=s.drive_folder_id,
+                                   state="klasor_silinemedi", updated_at=s.updated_at)
+                for s in restored
+            )
+            db.commit()
+            report["oturum"] -= len(restored)
+
+
+def reap_orphan_photos(db: Session, now: datetime, report: Dict):
+    """Oturumu artık olmayan ve hiçbir ilana bağlanmamış eski fotoğraf satırlarını sil"""
+    cutoff = now - timedelta(seconds=SESSION_TTL_S)
+    while True:
+        ids = [
+            row.id for row in
+            db.query(IlanPhoto.id)
+            .outerjoin(PhotoUploadSession, PhotoUploadSession.id == IlanPhoto.session_id)
+            .filter(IlanPhoto.ilan_id.is_(None), IlanPhoto.created_at < cutoff, PhotoUploadSession.id.is_(None))
+            .limit(REAPER_BATCH_SIZE)
+        ]
+        if not ids:
+            break
+        report["foto_satiri"] += db.execute(delete(IlanPhoto).where(IlanPhoto.id.in_(ids))).rowcount
+        db.commit()
+
+
+def reap_processed_messages(db: Session, now: datetime, report: Dict):
+    """Twilio'nun artık yeniden denemeyeceği eski MessageSid kayıtlarını sil"""
+    cutoff = now - timedelta(seconds=MESSAGE_SID_TTL_S)
+    while True:
+        sids = [
+            row.message_sid for row in
+            db.query(ProcessedMessage.message_sid)
+            .filter(ProcessedMessage.created_at < cutoff)
+            .limit(REAPER_BATCH_SIZE)
+        ]
+        if not sids:
+            break
+        report["mesaj_kimligi"] += db.execute(
+            delete(ProcessedMessage).where(ProcessedMessage.message_sid.in_(sids))
+        ).rowcount
+        db.commit()
+
+
+def reap_temp_files(directory: str, report: Dict):
+    """Yarıda kalmış yüklemelerden kalan photo_* geçici dosyalarını sil"""
+    cutoff = time.time() - TEMP_FILE_TTL_S
+    for pattern in TEMP_FILE_PATTERNS:
+        for path in glob.glob(os.path.join(directory, pattern)):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    report["gecici_bayt"] += os.path.getsize(path)
+                    os.remove(path)
+                    report["gecici_dosya"] += 1
+            except FileNotFoundError:
+                pass
+
+
+def reap(db: Session, user_states: Optional[UserStates] = None, service_factory: Optional[Callable] = None,
+         temp_dir: str = ".", now: Optional[datetime] = None) -> Dict[str, int]:
+    """Tüm temizlik adımlarını çalıştır ve neyin geri kazanıldığını döndür"""
+    if service_factory is None:
+        from drive_service.uploader import get_drive_service
+        service_factory = get_drive_service
+    now = now or datetime.utcnow()
+    report = {
+        "oturum": 0, "drive_klasoru": 0, "hatali_klasor": 0, "foto_satiri": 0,
+        "kullanici_durumu": 0, "mesaj_kimligi": 0, "gecici_dosya": 0, "gecici_bayt": 0,
+    }
+    reap_sessions(db, now, service_factory, report)
+    reap_orphan_photos(db, now, report)
+    reap_processed_messages(db, now, report)
+    if user_states is not None:
+        report["kullanici_durumu"] = user_states.expire(USER_STATE_TTL_S)
+    reap_temp_files(temp_dir, report)
+    return report
+
+
+def format_report(report: Dict[str, int]) -> str:
+    return (
+        f"{report['oturum']} oturum, {report['drive_klasoru']} Drive klasörü "
+        f"({report['hatali_klasor']} hatalı), {report['foto_satiri']} fotoğraf satırı, "
+        f"{report['kullanici_durumu']} kullanıcı durumu, {report['mesaj_kimligi']} mesaj kimliği, "
+        f"{report['gecici_dosya']} geçici dosya "
+        f"({report['gecici_bayt'] // 1024} KB)"
+    )
+
+
+if __name__ == "__main__":
+    from backend.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Reaper temizledi: {format_report(reap(db))}")
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+# bot/test_message_dedup.py
+
+"""Twilio MessageSid tekrarlarının ayıklanmasının denenmesi
+
+Bellek içi LRU ve TwiML testleri veritabanı istemez. Sahiplenme testleri
+DATABASE_URL'deki PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e
+ulaşılamazsa atlanır.
+
+    python bot/test_message_dedup.py
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import ProcessedMessage
+from backend.testing import postgres_available, session_factory, temp_schema
+from bot import message_dedup
+from bot.message_dedup import RecentMessages, claim_message, finish_message, release_message, twiml_messages
+
+TWIML = "<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response><Message>bir</Message><Message>iki</Message></Response>"
+
+
+def _sid():
+    # Süreç içi LRU testler arasında paylaşılır; her test kendi kimliğini kullanır
+    return f"SM{uuid.uuid4().hex}"
+
+
+def test_recent_messages_lru():
+    recent = RecentMessages(2)
+    recent.put("a", "1")
+    recent.put("b", "2")
+    assert recent.get("a") == "1"
+    recent.put("c", "3")
+    # En uzun süredir kullanılmayan "b" düşer
+    assert recent.get("b") is None and recent.get("a") == "1" and len(recent) == 2
+
+
+def test_twiml_messages():
+    assert twiml_messages(TWIML) == ["bir", "iki"]
+    assert twiml_messages("") == [] and twiml_messages("<Response>") == []
+
+
+def test_db_claim_finish_and_replay():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            sid = _sid()
+            assert claim_message(db, sid, "whatsapp:+905550000000") is None
+            # İlk işlem sürerken gelen tekrarlar boş yanıt alır ve sayılır
+            assert claim_message(db, sid) == ""
+            assert claim_message(db, sid) == ""
+            assert finish_message(db, sid, TWIML) == 2
+            row = db.get(ProcessedMessage, sid)
+            assert row.status == message_dedup.DONE and row.response == TWIML
+
+            # Bitmiş mesajın tekrarı kayıtlı yanıtı alır; LRU boşalsa da veritabanından
+            assert claim_message(db, sid) == TWIML
+            message_dedup._recent = RecentMessages(message_dedup.MESSAGE_SID_MEMORY)
+            assert claim_message(db, sid) == TWIML
+            db.expire_all()
+            assert db.get(ProcessedMessage, sid).tekrar == 2
+        finally:
+            db.close()
+
+
+def test_db_release_and_takeover():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            sid = _sid()
+            assert claim_message(db, sid) is None
+            release_message(db, sid)
+            # Bırakılan mesaj yeniden sahiplenilebilir
+            assert claim_message(db, sid) is None
+
+            # Çöken süreçten kalan eski talep devralınır
+            stale = _sid()
+            old = datetime.utcnow() - timedelta(seconds=message_dedup.MESSAGE_CLAIM_TIMEOUT_S + 60)
+            db.add(ProcessedMessage(message_sid=stale, status=message_dedup.PROCESSING, tekrar=0,
+                                    created_at=old, updated_at=old))
+            db.commit()
+            assert claim_message(db, stale) is None
+            assert claim_message(db, stale) == ""
+
+            # Bitmiş mesajın talebi bırakılamaz
+            finish_message(db, stale, TWIML)
+            release_message(db, stale)
+            assert claim_message(db, stale) == TWIML
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
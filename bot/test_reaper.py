@@ -0,0 +1,111 @@
+# bot/test_reaper.py
+
+"""Reaper'ın terk edilmiş fotoğraf oturumlarını temizlemesinin denenmesi
+
+Drive'a bağlanmaz; klasör silme sahte bir fonksiyonla değiştirilir.
+DATABASE_URL bir PostgreSQL veritabanını göstermelidir; testler ayrı bir
+şemada çalışır.
+
+    python bot/test_reaper.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.models import Ilan, IlanPhoto, PhotoUploadSession
+from backend.offices import DEFAULT_OFIS_ID
+from backend.testing import postgres_available, session_factory, temp_schema
+from bot import reaper
+
+NOW = datetime(2026, 1, 2, 12, 0)
+OLD = NOW - timedelta(seconds=reaper.SESSION_TTL_S + 60)
+
+
+def _report():
+    return {"oturum": 0, "drive_klasoru": 0, "hatali_klasor": 0, "foto_satiri": 0}
+
+
+def _fake_delete(deleted, failing=()):
+    def delete_folders(folder_ids, service_factory):
+        deleted.extend(folder_ids)
+        return {folder_id: "hata" for folder_id in folder_ids if folder_id in failing}
+    return delete_folders
+
+
+def _session(db, user_id, folder_id, updated_at):
+    session = PhotoUploadSession(user_id=user_id, expected_photos=1, drive_folder_id=folder_id, updated_at=updated_at)
+    db.add(session)
+    db.flush()
+    db.add(IlanPhoto(session_id=session.id, drive_file_id=f"{folder_id}-foto", sira=0, created_at=updated_at))
+    return session
+
+
+def test_reap_sessions_claims_before_deleting_folders():
+    original = reaper._delete_drive_folders
+    deleted = []
+    reaper._delete_drive_folders = _fake_delete(deleted)
+    try:
+        with temp_schema() as engine:
+            db = session_factory(engine)()
+            try:
+                _session(db, "eski", "klasor-eski", OLD)
+                _session(db, "yeni", "klasor-yeni", NOW)
+                # /tamamla oturumu silemeden kalmış; klasör artık ilanın
+                _session(db, "tamam", "klasor-ilan", OLD)
+                db.add(Ilan(baslik="İlan", ofis_id=DEFAULT_OFIS_ID, drive_folder_id="klasor-ilan"))
+                db.commit()
+
+                report = _report()
+                reaper.reap_sessions(db, NOW, None, report)
+                assert deleted == ["klasor-eski"], deleted
+                assert report == {"oturum": 2, "drive_klasoru": 1, "hatali_klasor": 0, "foto_satiri": 2}, report
+                assert [s.user_id for s in db.query(PhotoUploadSession)] == ["yeni"]
+                assert db.query(IlanPhoto).count() == 1
+            finally:
+                db.close()
+    finally:
+        reaper._delete_drive_folders = original
+
+
+def test_failed_folder_is_retried_without_user():
+    original = reaper._delete_drive_folders
+    deleted = []
+    reaper._delete_drive_folders = _fake_delete(deleted, failing={"klasor"})
+    try:
+        with temp_schema() as engine:
+            db = session_factory(engine)()
+            try:
+                _session(db, "kullanici", "klasor", OLD)
+                db.commit()
+
+                report = _report()
+                reaper.reap_sessions(db, NOW, None, report)
+                assert report["hatali_klasor"] == 1 and report["oturum"] == 0, report
+                # Geri yazılan oturum kullanıcının oturumu olarak bulunmamalı
+                restored = db.query(PhotoUploadSession).one()
+                assert restored.user_id is None and restored.drive_folder_id == "klasor"
+                assert restored.updated_at == OLD
+
+                reaper._delete_drive_folders = _fake_delete(deleted)
+                report = _report()
+                reaper.reap_sessions(db, NOW, None, report)
+                assert deleted == ["klasor", "klasor"], deleted
+                assert report["drive_klasoru"] == 1 and report["oturum"] == 1, report
+                assert db.query(PhotoUploadSession).count() == 0
+            finally:
+                db.close()
+    finally:
+        reaper._delete_drive_folders = original
+
+
+if __name__ == "__main__":
+    if not postgres_available():
+        print("PostgreSQL'e ulaşılamadı (DATABASE_URL), testler atlandı")
+        sys.exit(0)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
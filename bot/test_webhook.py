@@ -0,0 +1,138 @@
+# bot/test_webhook.py
+
+"""Webhook'un yük atmasının ve tekrar teslimleri ayıklamasının denenmesi
+
+Twilio'ya, OpenAI'a ve Drive'a bağlanmaz; mesaj işleyici sahte bir
+fonksiyonla değiştirilir. Veritabanı isteyen testler DATABASE_URL'deki
+PostgreSQL'de, ayrı bir şemada çalışır; PostgreSQL'e ulaşılamazsa atlanır.
+
+    python bot/test_webhook.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+os.environ["REAPER_INTERVAL_S"] = "0"
+
+from fastapi import Response
+from fastapi.testclient import TestClient
+from backend.models import ProcessedMessage
+from backend.rate_limit import Overloaded
+from backend.testing import postgres_available, session_factory, temp_schema
+from bot import webhook
+
+
+def _twiml(text: str) -> Response:
+    resp = webhook.MessagingResponse()
+    resp.message(text)
+    return Response(content=str(resp), media_type="application/xml")
+
+
+class patched:
+    """webhook modülündeki adları test süresince değiştir"""
+
+    def __init__(self, **names):
+        self.names = names
+
+    def __enter__(self):
+        self.saved = {name: getattr(webhook, name) for name in self.names}
+        for name, value in self.names.items():
+            setattr(webhook, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(webhook, name, value)
+
+
+def test_send_whatsapp_message_reraises_overloaded():
+    def overloaded(service, fn, cost=1):
+        raise Overloaded(service)
+
+    def failing(service, fn, cost=1):
+        raise RuntimeError("bağlantı hatası")
+
+    original = webhook.rate_limit.call
+    try:
+        webhook.rate_limit.call = overloaded
+        try:
+            webhook.send_whatsapp_message("whatsapp:+905550000000", "merhaba")
+            raise AssertionError("Overloaded yutulmamalıydı")
+        except Overloaded as e:
+            assert e.service == "twilio"
+        # Diğer hatalar eskisi gibi False döner
+        webhook.rate_limit.call = failing
+        assert webhook.send_whatsapp_message("whatsapp:+905550000000", "merhaba") is False
+    finally:
+        webhook.rate_limit.call = original
+
+
+def test_handler_runs_off_the_event_loop():
+    def handle(form_data):
+        # İş parçacığı havuzunda çalışan kodda olay döngüsü yoktur
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return _twiml("tamam")
+        return _twiml("olay döngüsünde")
+
+    with patched(handle_message=handle), TestClient(webhook.app) as client:
+        response = client.post("/webhook", data={"From": "whatsapp:+905550000000", "Body": "merhaba"})
+    assert response.status_code == 200 and "<Message>tamam</Message>" in response.text, response.text
+
+
+def test_db_overloaded_releases_claim():
+    calls = []
+
+    def handle(form_data):
+        calls.append(form_data.get("Body"))
+        if len(calls) == 1:
+            raise Overloaded("openai")
+        return _twiml("ilan alındı")
+
+    form = {"From": "whatsapp:+905550000000", "Body": "merhaba", "MessageSid": "SM-yuk"}
+    with temp_schema() as engine:
+        factory = session_factory(engine)
+        with patched(handle_message=handle, SessionLocal=factory):
+            busy = webhook.process_message(form)
+            assert "yoğunuz" in busy.body.decode()
+            db = factory()
+            try:
+                assert db.get(ProcessedMessage, "SM-yuk") is None
+            finally:
+                db.close()
+            # Bırakılan mesajın tekrarı yeniden işlenir
+            assert "ilan alındı" in webhook.process_message(form).body.decode()
+    assert len(calls) == 2
+
+
+def test_db_redelivery_during_processing_gets_reply_by_rest():
+    sent, responses = [], []
+    form = {"From": "whatsapp:+905550000000", "Body": "merhaba", "MessageSid": "SM-tekrar"}
+
+    def handle(form_data):
+        # İlk işlem sürerken Twilio aynı mesajı yeniden teslim eder
+        responses.append(webhook.process_message(form).body.decode())
+        return _twiml("ilan alındı")
+
+    with temp_schema() as engine:
+        with patched(handle_message=handle, SessionLocal=session_factory(engine),
+                     send_whatsapp_message=lambda to, text: sent.append((to, text))):
+            assert "ilan alındı" in webhook.process_message(form).body.decode()
+            # Sonraki tekrar kayıtlı yanıtı alır, mesaj yeniden işlenmez
+            assert "ilan alındı" in webhook.process_message(form).body.decode()
+    assert responses == [""]
+    assert sent == [("whatsapp:+905550000000", "ilan alındı")]
+
+
+if __name__ == "__main__":
+    database = postgres_available()
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            if name.startswith("test_db_") and not database:
+                print(f"{name}: atlandı (PostgreSQL'e ulaşılamadı)")
+                continue
+            test()
+            print(f"{name}: tamam")
@@ -1,30 +1,51 @@
 import sys
 import os
-import requests
-from requests.auth import HTTPBasicAuth
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
 from twilio.twiml.messaging_response import MessagingResponse
 from datetime import datetime
 import json
-from twilio.rest import Client
 from sqlalchemy.orm import Session
-from googleapiclient.errors import HttpError
 import re
 import shutil
+import hashlib
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from bot.gpt_parser import parse_message_to_json
-from drive_service.uploader import upload_multiple_photos, upload_file_to_drive, get_or_create_folder, get_drive_service, delete_folder, get_folder_info, delete_folder_by_id
+from drive_service.uploader import upload_multiple_photos, upload_file_to_drive, upload_photo_to_drive, get_or_create_folder, get_drive_service, delete_folder, get_folder_info, delete_folder_by_id, execute
 from backend.database import SessionLocal
-from backend.crud import create_emlak_ilan, get_ilanlar, delete_emlak_ilan, create_photo_upload_session, get_photo_upload_session, update_photo_upload_session, delete_photo_upload_session
+from backend.crud import create_emlak_ilan, get_ilan, get_ilanlar, get_ilanlar_by_ids, delete_emlak_ilan, create_photo_upload_session, get_photo_upload_session, update_photo_upload_session, delete_photo_upload_session, add_session_photo, session_has_photo
+from backend.deletion import delete_ilan
+from backend.dedup import find_duplicates
+from backend.normalize import canonical_oda_sayisi, parse_number
+from backend.offices import drive_root, find_numara, get_ofis_for_numara, normalize_numara
+from backend.rate_limit import Overloaded
+from backend import rate_limit
+from backend.profiling import install_profiler
 from backend.schemas.ilan import IlanCreate, PhotoUploadSessionCreate
+from bot.message_dedup import claim_message, finish_message, release_message, twiml_messages
+from bot.reaper import UserStates, reap, format_report, REAPER_INTERVAL_S
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(reaper_loop()) if REAPER_INTERVAL_S > 0 else None
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS ayarları
 app.add_middleware(
@@ -35,48 +56,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# İsteğe bağlı istek profilleme (PROFILE_ENABLED)
+install_profiler(app, "bot")
+
 # Backend API adresi
 BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://localhost:8000/ilan")
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
-# Twilio client oluştur
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+@lru_cache(maxsize=1)
+def get_twilio_client():
+    """Twilio client'ı ilk mesaj gönderiminde oluştur (twilio.rest yüklemesi açılışı yavaşlatıyor)"""
+    from twilio.rest import Client
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+# Kullanıcı durumlarını takip etmek için sözlük (eski girdiler reaper tarafından silinir)
+user_states = UserStates()
 
-# Kullanıcı durumlarını takip etmek için sözlük
-user_states = {}
+def run_reaper():
+    db = SessionLocal()
+    try:
+        report = reap(db, user_states=user_states)
+        print(f"Reaper temizledi: {format_report(report)}")
+    finally:
+        db.close()
+
+async def reaper_loop():
+    while True:
+        try:
+            await run_in_threadpool(run_reaper)
+        except Exception as e:
+            print(f"Reaper hatası: {str(e)}")
+        await asyncio.sleep(REAPER_INTERVAL_S)
 
 def generate_ilan_baslik(mahalle, sokak, oda_sayisi):
     mahalle = ''.join(c for c in mahalle if c.isalnum() or c.isspace())
     sokak = ''.join(c for c in sokak if c.isalnum() or c.isspace())
     return f"{mahalle}-{sokak}-{oda_sayisi}"
 
-def create_ilan_folder(service, ilan_details):
-    """İlan için Drive'da klasör oluştur"""
+def create_ilan_folder(service, ilan_details, main_folder_id):
+    """İlan için ofisin Drive ana klasörü altında klasör oluştur"""
     try:
-        # Ana klasör ID'sini .env'den al
-        main_folder_id = os.getenv("GOOGLE_DRIVE_MAIN_FOLDER_ID")
-        if not main_folder_id:
-            raise ValueError("GOOGLE_DRIVE_MAIN_FOLDER_ID bulunamadı")
 
         # İlan detaylarını al
         mahalle = ilan_details.get("mahalle", "Belirsiz")
         sokak = ilan_details.get("sokak", "Belirsiz")
-        oda_sayisi = ilan_details.get("oda_sayisi", "Belirsiz")
+        # "3 + 1" ve "3+1" aynı oda klasörüne düşsün
+        oda_sayisi = canonical_oda_sayisi(str(ilan_details.get("oda_sayisi") or "")) or "Belirsiz"
         
         # İlan klasör adını oluştur
         ilan_folder_name = generate_ilan_baslik(mahalle, sokak, oda_sayisi) + " #SADEEVIM"
         
-        # 3+1 kontrolü
-        if oda_sayisi.strip().lower() == "3 + 1":
-            # Doğrudan ana klasöre ekle
-            parent_id = main_folder_id
-        else:
-            # Önce oda türü klasörünü oluştur veya bul
-            oda_folder_name = oda_sayisi.strip()
-            oda_folder = get_or_create_folder(service, oda_folder_name, main_folder_id)
-            parent_id = oda_folder.get('id')
+        # Önce oda türü klasörünü oluştur veya bul
+        oda_folder = get_or_create_folder(service, oda_sayisi, main_folder_id, root_id=main_folder_id)
+        parent_id = oda_folder.get('id')
         
         # İlan klasörünü oluştur
         folder_metadata = {
@@ -85,7 +119,7 @@ def create_ilan_folder(service, ilan_details):
             'parents': [parent_id]
         }
         
-        folder = service.files().create(body=folder_metadata, fields='id').execute()
+        folder = execute(service.files().create(body=folder_metadata, fields='id'))
         folder_id = folder.get('id')
         
         # Klasörü herkese açık yap
@@ -93,7 +127,7 @@ def create_ilan_folder(service, ilan_details):
             'type': 'anyone',
             'role': 'reader'
         }
-        service.permissions().create(fileId=folder_id, body=permission).execute()
+        execute(service.permissions().create(fileId=folder_id, body=permission))
         
         print(f"Drive klasörü oluşturuldu. ID: {folder_id}")
         return folder_id
@@ -105,18 +139,21 @@ def create_ilan_folder(service, ilan_details):
 def send_whatsapp_message(to_number: str, message: str):
     """WhatsApp mesajı gönder"""
     try:
-        message = twilio_client.messages.create(
+        message = rate_limit.call("twilio", lambda: get_twilio_client().messages.create(
             from_=f"whatsapp:{TWILIO_PHONE_NUMBER}",
             body=message,
             to=to_number
-        )
+        ))
         print(f"WhatsApp mesajı gönderildi: {message.sid}")
         return True
+    except Overloaded:
+        # Yük atma kararı çağırana kalsın (mesaj bırakılıp yeniden işlenebilir)
+        raise
     except Exception as e:
         print(f"WhatsApp mesajı gönderme hatası: {str(e)}")
         return False
 
-def process_ilan(from_number: str, ilan_details: dict, drive_folder_id: str):
+def process_ilan(from_number: str, ilan_details: dict, drive_folder_id: str, photo_session_id: int = None):
     """İlanı işle ve veritabanına kaydet"""
     try:
         # Drive klasör linkini oluştur
@@ -125,24 +162,14 @@ def process_ilan(from_number: str, ilan_details: dict, drive_folder_id: str):
         # Veritabanına kaydet
         db = SessionLocal()
         try:
-            # Metrekare değerini float'a çevir
-            metrekare = ilan_details.get("metrekare", "")
-            try:
-                metrekare = float(metrekare) if metrekare else None
-            except ValueError:
-                metrekare = None
-
-            # Fiyat değerini float'a çevir
-            fiyat = ilan_details.get("fiyat", "")
-            try:
-                fiyat = float(fiyat) if fiyat else None
-            except ValueError:
-                fiyat = None
+            # Metrekare ve fiyatı sayıya çevir ("2.500.000 TL", "120 m2" gibi yazımlar dahil)
+            metrekare = parse_number(ilan_details.get("metrekare"))
+            fiyat = parse_number(ilan_details.get("fiyat"))
 
             # IlanCreate nesnesi oluştur
             mahalle = ilan_details.get("mahalle", "")
             sokak = ilan_details.get("sokak", "")
-            oda_sayisi = ilan_details.get("oda_sayisi", "")
+            oda_sayisi = canonical_oda_sayisi(str(ilan_details.get("oda_sayisi") or ""))
             baslik = generate_ilan_baslik(mahalle, sokak, oda_sayisi)
             ilan_data = IlanCreate(
                 baslik=baslik,
@@ -152,14 +179,21 @@ def process_ilan(from_number: str, ilan_details: dict, drive_folder_id: str):
                 sokak=sokak,
                 oda_sayisi=oda_sayisi,
                 metrekare=metrekare,
-                drive_link=drive_link
+                drive_link=drive_link,
+                drive_folder_id=drive_folder_id,
+                benzer_ilan_id=ilan_details.get("benzer_ilan_id"),
+                ofis_id=ilan_details["ofis_id"]
             )
             
-            db_ilan = create_emlak_ilan(db, ilan_data)
+            db_ilan = create_emlak_ilan(db, ilan_data, photo_session_id=photo_session_id, gonderen=normalize_numara(from_number))
             
             # Kullanıcıya bildirim gönder
-            success_message = f"İlanınız başarıyla kaydedildi!\n\nDrive klasör linki: {drive_link}"
-            send_whatsapp_message(from_number, success_message)
+            success_message = f"İlanınız başarıyla kaydedildi! (İlan no: {db_ilan.id})\n\nDrive klasör linki: {drive_link}\nSilmek için: /sil {db_ilan.id}"
+            try:
+                send_whatsapp_message(from_number, success_message)
+            except Overloaded as e:
+                # İlan kaydedildi; TwiML yanıtı da başarıyı bildiriyor
+                print(f"Kayıt bildirimi gönderilemedi: {str(e)}")
             
             return True
         finally:
@@ -170,10 +204,128 @@ def process_ilan(from_number: str, ilan_details: dict, drive_folder_id: str):
         send_whatsapp_message(from_number, error_message)
         return False
 
+def sender_ofis_id(from_number: str) -> int:
+    """Gönderenin ofisi; eşlenmemiş numaralar varsayılan ofise yazılır"""
+    db = SessionLocal()
+    try:
+        return get_ofis_for_numara(db, from_number).id
+    finally:
+        db.close()
+
+def delete_ilan_by_no(ilan_no: str, from_number: str) -> str:
+    """İlanı numarasıyla, fotoğrafları ve Drive klasörüyle sil; kullanıcıya gidecek mesajı döndür
+
+    Ofise eşli numaralar ofislerinin ilanlarını, diğerleri yalnızca kendi
+    gönderdikleri ilanları silebilir.
+    """
+    ilan_no = ilan_no.strip().lstrip("#")
+    if not ilan_no.isdigit():
+        return "Geçersiz ilan numarası. Örnek: /sil 42"
+    db = SessionLocal()
+    try:
+        kayit = find_numara(db, from_number)
+        if kayit is not None:
+            success, message = delete_ilan(db, int(ilan_no), ofis_id=kayit.ofis_id)
+        else:
+            success, message = delete_ilan(db, int(ilan_no), gonderen=normalize_numara(from_number))
+            if message == "İlan bulunamadı":
+                message = "İlan bulunamadı ya da bu ilanı silme yetkiniz yok"
+        print(f"İlan silme ({ilan_no}, {from_number}): {message}")
+        return message
+    finally:
+        db.close()
+
+def similar_ilanlar_message(ilan_no: str, ofis_id: int, k: int = 5) -> str:
+    """Ofisin ilanına en benzer ilanları kullanıcıya gidecek mesaj olarak döndür"""
+    from backend import similarity
+
+    ilan_no = ilan_no.strip().lstrip("#")
+    if not ilan_no.isdigit():
+        return "Geçersiz ilan numarası. Örnek: /benzer 42"
+    db = SessionLocal()
+    try:
+        ilan = get_ilan(db, int(ilan_no), ofis_id=ofis_id)
+        if ilan is None:
+            return "İlan bulunamadı"
+        try:
+            scores = dict(similarity.similar_ilanlar(db, ilan, k=k))
+        except similarity.IndexNotReady:
+            return "Benzer ilan araması hazırlanıyor, lütfen birkaç dakika sonra tekrar deneyin."
+        benzerler = get_ilanlar_by_ids(db, list(scores), ofis_id=ofis_id)
+        if not benzerler:
+            return f"{ilan_no} numaralı ilana benzer ilan bulunamadı."
+        lines = [f"{ilan_no} numaralı ilana en benzer ilanlar:"]
+        for benzer in benzerler:
+            fiyat = f"{benzer.fiyat:,.0f} TL".replace(",", ".") if benzer.fiyat else "fiyat yok"
+            metrekare = f"{benzer.metrekare:.0f} m²" if benzer.metrekare else "m² yok"
+            lines.append(
+                f"\n#{benzer.id} {benzer.baslik} ({benzer.oda_sayisi}, {metrekare}, {fiyat}) "
+                f"- benzerlik %{round(scores[benzer.id] * 100)}"
+                + (f"\n{benzer.drive_link}" if benzer.drive_link else "")
+            )
+        return "\n".join(lines)
+    finally:
+        db.close()
+
 @app.post("/webhook")
 async def receive_message(request: Request):
+    form_data = await request.form()
+    # Veritabanı, OpenAI, Drive ve Twilio çağrıları (ve hız sınırı beklemeleri)
+    # bloklayıcı; olay döngüsünü tutmasınlar diye iş parçacığında çalışır
+    return await run_in_threadpool(process_message, form_data)
+
+def process_message(form_data) -> Response:
+    message_sid = form_data.get("MessageSid")
+    if message_sid:
+        db = SessionLocal()
+        try:
+            previous = claim_message(db, message_sid, form_data.get("From"))
+        except Exception as e:
+            # Tekrar kontrolü yapılamasa da mesaj kaybolmasın
+            print(f"Mesaj tekrar kontrolü hatası: {str(e)}")
+            previous, message_sid = None, None
+        finally:
+            db.close()
+        if previous is not None:
+            print(f"Tekrar teslim edilen mesaj atlandı: {message_sid}")
+            return Response(content=previous, media_type="application/xml")
+
+    try:
+        response = handle_message(form_data)
+    except Overloaded as e:
+        # Dış servisler yoğun: talebi bırak ki tekrar gönderilen mesaj yeniden işlenebilsin
+        print(f"Yük atıldı: {str(e)}")
+        if message_sid:
+            db = SessionLocal()
+            try:
+                release_message(db, message_sid)
+            finally:
+                db.close()
+        resp = MessagingResponse()
+        resp.message("Şu anda çok yoğunuz, mesajınız işlenemedi. Lütfen birkaç dakika sonra tekrar gönderin.")
+        return Response(content=str(resp), media_type="application/xml")
+
+    if message_sid:
+        body = response.body.decode()
+        db = SessionLocal()
+        try:
+            tekrar = finish_message(db, message_sid, body)
+        except Exception as e:
+            print(f"Mesaj yanıtı kaydedilemedi: {str(e)}")
+            tekrar = 0
+        finally:
+            db.close()
+        # İşlem sürerken Twilio tekrar denediyse bu yanıt ona ulaşmayacak; mesajı ayrıca gönder
+        if tekrar:
+            try:
+                for text in twiml_messages(body):
+                    send_whatsapp_message(form_data.get("From"), text)
+            except Overloaded as e:
+                print(f"Tekrar yanıtı gönderilemedi: {str(e)}")
+    return response
+
+def handle_message(form_data) -> Response:
     try:
-        form_data = await request.form()
         from_number = form_data.get("From")
         message_body = form_data.get("Body")
         num_media = int(form_data.get("NumMedia", 0))
@@ -187,6 +339,7 @@ async def receive_message(request: Request):
 
         # Kullanıcının mevcut durumunu kontrol et
         current_state = user_states.get(from_number, {})
+        user_states.touch(from_number)
 
         if message_body and message_body.strip().lower() == "/tamamla":
             if current_state.get("state") == "waiting_for_photos":
@@ -204,7 +357,7 @@ async def receive_message(request: Request):
                         response = Response(content=str(resp), media_type="application/xml")
                         return response
 
-                    if process_ilan(from_number, current_state["details"], session.drive_folder_id):
+                    if process_ilan(from_number, current_state["details"], session.drive_folder_id, session.id):
                         # Drive klasör linkini oluştur
                         drive_link = f"https://drive.google.com/drive/folders/{session.drive_folder_id}"
                         delete_photo_upload_session(db, from_number)
@@ -219,13 +372,29 @@ async def receive_message(request: Request):
             response = Response(content=str(resp), media_type="application/xml")
             return response
 
-        elif message_body and message_body.strip().lower() == "/sil":
-            # Silme işlemi için kullanıcıdan anahtar kelime iste
-            user_states[from_number] = {
-                "state": "waiting_for_search_keyword",
-                "action": "delete"
-            }
-            resp.message("Lütfen silmek istediğiniz klasör için bir anahtar kelime (ör: mahalle, oda tipi, vs.) giriniz.")
+        elif message_body and message_body.strip().lower().startswith("/sil"):
+            ilan_no = message_body.strip()[len("/sil"):].strip()
+            if ilan_no:
+                resp.message(delete_ilan_by_no(ilan_no, from_number))
+            else:
+                # Silinecek ilanın numarasını iste
+                user_states[from_number] = {
+                    "state": "waiting_for_delete_id",
+                    "action": "delete"
+                }
+                resp.message("Lütfen silmek istediğiniz ilanın numarasını giriniz (ör: 42).")
+            response = Response(content=str(resp), media_type="application/xml")
+            return response
+
+        elif message_body and message_body.strip().lower().startswith("/benzer"):
+            ilan_no = message_body.strip()[len("/benzer"):].strip()
+            resp.message(similar_ilanlar_message(ilan_no, sender_ofis_id(from_number)) if ilan_no else "Lütfen ilan numarasını yazın. Örnek: /benzer 42")
+            response = Response(content=str(resp), media_type="application/xml")
+            return response
+
+        elif current_state.get("state") == "waiting_for_delete_id":
+            user_states[from_number] = {}
+            resp.message(delete_ilan_by_no(message_body or "", from_number))
             response = Response(content=str(resp), media_type="application/xml")
             return response
 
@@ -243,6 +412,25 @@ async def receive_message(request: Request):
                     print(f"Gönderilen yanıt: {str(resp)}")
                     return response
                 
+                # Ofis ilan detaylarıyla saklanır; fotoğraf ve kayıt adımları yeniden sorgulamaz
+                ofis_id = parsed_details["ofis_id"] = sender_ofis_id(from_number)
+
+                # Ofiste daha önce kaydedilmiş neredeyse aynı bir ilan var mı?
+                duplicate_warning = ""
+                db = SessionLocal()
+                try:
+                    duplicates = find_duplicates(db, parsed_details, ofis_id)
+                finally:
+                    db.close()
+                if duplicates:
+                    benzer_ilan_id, score = duplicates[0]
+                    parsed_details["benzer_ilan_id"] = benzer_ilan_id
+                    print(f"Benzer ilan bulundu: {duplicates}")
+                    duplicate_warning = (
+                        f"⚠️ Bu ilan daha önce kaydedilen {benzer_ilan_id} numaralı ilana çok benziyor "
+                        f"(benzerlik %{round(score * 100)}). Devam ederseniz yeni ilan o ilanla ilişkilendirilecek.\n\n"
+                    )
+
                 # İlan detaylarını kaydet ve fotoğraf bekleme durumuna geç
                 user_states[from_number] = {
                     "state": "waiting_for_photos",
@@ -251,10 +439,12 @@ async def receive_message(request: Request):
                     "temp_photos": []
                 }
                 print(f"İlan detayları kaydedildi: {json.dumps(parsed_details, indent=2)}")
-                resp.message("İlan detayları kaydedildi. Şimdi fotoğrafları gönderebilirsiniz. İşlem bittiğinde /tamamla komutunu kullanın.")
+                resp.message(duplicate_warning + "İlan detayları kaydedildi. Şimdi fotoğrafları gönderebilirsiniz. İşlem bittiğinde /tamamla komutunu kullanın.")
                 response = Response(content=str(resp), media_type="application/xml")
                 print(f"Gönderilen yanıt: {str(resp)}")
                 return response
+            except Overloaded:
+                raise
             except Exception as e:
                 print(f"İlan detayları analiz hatası: {str(e)}")
                 print(f"Hata detayı: {type(e).__name__}")
@@ -273,7 +463,6 @@ async def receive_message(request: Request):
                     expected_photos=999,  # Maksimum fotoğraf sayısı
                     received_photos=0,
                     drive_folder_id=None,
-                    photo_links=[],
                     state="waiting_for_photos"
                 )
                 session = create_photo_upload_session(db, session_data)
@@ -281,9 +470,12 @@ async def receive_message(request: Request):
             if num_media > 0:
                 print(f"\nYeni görseller alındı: {num_media} adet")
                 import time
+                import requests
+                from requests.auth import HTTPBasicAuth
                 if not session.drive_folder_id:
                     service = get_drive_service()
-                    drive_folder_id = create_ilan_folder(service, current_state["details"])
+                    details = current_state["details"]
+                    drive_folder_id = create_ilan_folder(service, details, drive_root(db, details["ofis_id"]))
                     update_photo_upload_session(db, from_number, drive_folder_id=drive_folder_id)
                 else:
                     drive_folder_id = session.drive_folder_id
@@ -293,41 +485,48 @@ async def receive_message(request: Request):
                     media_type = form_data.get(f"MediaContentType{i}")
                     ext = ".jpg" if "jpeg" in media_type else ".png"
                     try:
-                        response = requests.get(media_url, auth=HTTPBasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+                        with rate_limit.slot("twilio"):
+                            response = requests.get(media_url, auth=HTTPBasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
                         if response.status_code == 200:
+                            photo_hash = hashlib.sha256(response.content).hexdigest()
+                            if session_has_photo(db, session.id, photo_hash):
+                                print(f"Aynı fotoğraf zaten yüklenmiş, atlanıyor: {photo_hash[:12]}")
+                                continue
                             temp_filename = f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}{ext}"
                             with open(temp_filename, "wb") as f:
                                 f.write(response.content)
                             # Drive'a yükle
-                            service = get_drive_service()
-                            file_link = upload_file_to_drive(temp_filename, temp_filename, drive_folder_id)
-                            # Veritabanında linki güncelle
-                            photo_links = session.photo_links or []
-                            photo_links.append(file_link)
-                            update_photo_upload_session(db, from_number, received_photos=session.received_photos+1, photo_links=photo_links)
-                            print(f"Fotoğraf yüklendi: {file_link}")
+                            uploaded = upload_photo_to_drive(temp_filename, temp_filename, drive_folder_id)
+                            # Fotoğraf satırını ekle (oturum satırı yeniden yazılmaz)
+                            add_session_photo(db, session.id, uploaded["id"], boyut=len(response.content), sha256=photo_hash)
+                            print(f"Fotoğraf yüklendi: {uploaded['link']}")
                             os.remove(temp_filename)
                         else:
                             print(f"Fotoğraf indirme hatası: {response.status_code}")
                             print(f"Hata detayı: {response.text}")
+                    except Overloaded:
+                        db.close()
+                        raise
                     except Exception as e:
                         print(f"Fotoğraf indirme hatası: {str(e)}")
                         print(f"Hata detayı: {type(e).__name__}")
 
                 session = get_photo_upload_session(db, from_number)
-                send_whatsapp_message(from_number, f"Fotoğraf başarıyla yüklendi. Toplam {session.received_photos} fotoğraf yüklendi. İşlem bittiğinde /tamamla komutunu kullanın.")
                 db.close()
+                send_whatsapp_message(from_number, f"Fotoğraf başarıyla yüklendi. Toplam {session.received_photos} fotoğraf yüklendi. İşlem bittiğinde /tamamla komutunu kullanın.")
                 return Response(content="", media_type="application/xml")
             else:
                 print("Görsel beklenirken medya yok")
-                send_whatsapp_message(from_number, "Lütfen fotoğraf gönderin veya işlemi tamamlamak için /tamamla komutunu kullanın.")
                 db.close()
+                send_whatsapp_message(from_number, "Lütfen fotoğraf gönderin veya işlemi tamamlamak için /tamamla komutunu kullanın.")
                 return Response(content="", media_type="application/xml")
 
         # Varsayılan yanıt
         resp.message("İlan eklemek için ilan detaylarını giriniz. İşlem bittiğinde /tamamla komutunu kullanın.")
         return Response(content=str(resp), media_type="application/xml")
 
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Genel hata: {str(e)}")
         print(f"Hata detayı: {type(e).__name__}")
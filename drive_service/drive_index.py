@@ -0,0 +1,354 @@
+# drive_service/drive_index.py
+
+"""Drive klasör ağacının yerel meta veri kopyası
+
+Ana klasör (GOOGLE_DRIVE_MAIN_FOLDER_ID) altındaki dosya ve klasörlerin ID,
+ad, üst klasör ve boyut bilgileri bir kez taranıp bellekte tutulur; sonrasında
+yalnızca Changes API (changes.list) ile gelen değişiklikler uygulanır. Ad ile
+arama ve alt klasör bulma Drive'a istek atmadan bellekteki dizinden yapılır.
+
+Dizin ve son sayfa belirteci (page token) DRIVE_INDEX_PATH dosyasına yazılır;
+süreç yeniden başladığında tarama tekrarlanmaz, kalınan yerden devam edilir.
+Kendi Drive klasörü olan ofislerin (bkz. backend/offices.py) her ana klasörü
+için ayrı bir dizin ve dosya tutulur.
+"""
+
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from backend.normalize import fold_tr
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+FILE_FIELDS = "id, name, parents, mimeType, size, trashed"
+DRIVE_INDEX_PATH = os.getenv(
+    "DRIVE_INDEX_PATH", os.path.join(tempfile.gettempdir(), "emlak_drive_index.json")
+)
+# Bu süreden eski dizin okunmadan önce Changes API ile güncellenir (saniye)
+DRIVE_INDEX_SYNC_S = float(os.getenv("DRIVE_INDEX_SYNC_S", 30))
+# Taramada tek bir files.list sorgusuna konan en fazla üst klasör sayısı
+BOOTSTRAP_PARENTS_PER_QUERY = 40
+PAGE_SIZE = 1000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(name: str) -> List[str]:
+    return _TOKEN_RE.findall(fold_tr(name))
+
+
+class DriveIndex:
+    def __init__(self, root_id: str, path: Optional[str] = DRIVE_INDEX_PATH):
+        self.root_id = root_id
+        self.path = path
+        self.page_token = None
+        self.synced_at = 0.0
+        self._lock = threading.RLock()
+        self._files: Dict[str, dict] = {}
+        self._children = defaultdict(set)
+        # (üst klasör, ad) -> ID'ler; aynı adlı birden fazla öğe olabilir
+        self._by_name = defaultdict(set)
+        self._by_token = defaultdict(set)
+        self._sorted_tokens: Optional[List[str]] = None
+
+    # --- Dizin bakımı ---
+
+    def _add(self, item: dict):
+        file_id = item["id"]
+        if file_id in self._files:
+            self._discard(file_id, recursive=False)
+        entry = {
+            "id": file_id,
+            "name": item.get("name", ""),
+            "parents": list(item.get("parents") or []),
+            "mimeType": item.get("mimeType"),
+        }
+        if item.get("size") is not None:
+            entry["size"] = int(item["size"])
+        self._files[file_id] = entry
+        for parent in entry["parents"]:
+            self._children[parent].add(file_id)
+            self._by_name[(parent, entry["name"])].add(file_id)
+        for token in _tokens(entry["name"]):
+            if token not in self._by_token:
+                self._sorted_tokens = None
+            self._by_token[token].add(file_id)
+
+    def _discard(self, file_id: str, recursive: bool = True):
+        entry = self._files.pop(file_id, None)
+        if entry is None:
+            return
+        for parent in entry["parents"]:
+            self._children[parent].discard(file_id)
+            ids = self._by_name.get((parent, entry["name"]))
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del self._by_name[(parent, entry["name"])]
+        for token in _tokens(entry["name"]):
+            ids = self._by_token.get(token)
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del self._by_token[token]
+                    self._sorted_tokens = None
+        if recursive:
+            for child_id in list(self._children.pop(file_id, ())):
+                self._discard(child_id)
+
+    def _in_tree(self, parents) -> bool:
+        return any(parent == self.root_id or parent in self._files for parent in parents or ())
+
+    def add(self, item: dict, service=None):
+        """Bizim oluşturduğumuz dosyayı Changes beklemeden dizine ekle
+
+        service verilirse klasörün alt ağacı da taranır (çöpten geri alınan
+        klasörün içeriği ayrıca bildirilmez).
+        """
+        with self._lock:
+            if self._in_tree(item.get("parents")):
+                self._add(item)
+                if service is not None and item.get("mimeType") == FOLDER_MIME:
+                    self._scan(service, [item["id"]])
+
+    def discard(self, file_ids):
+        """Silinen ya da çöpe taşınan dosyaları alt öğeleriyle birlikte dizinden çıkar"""
+        with self._lock:
+            for file_id in file_ids:
+                self._discard(file_id)
+
+    # --- Drive ile eşitleme ---
+
+    def _scan(self, service, folder_ids: List[str]):
+        """Verilen klasörlerin altındaki tüm ağacı files.list ile tara"""
+        pending = list(folder_ids)
+        while pending:
+            parents, pending = pending[:BOOTSTRAP_PARENTS_PER_QUERY], pending[BOOTSTRAP_PARENTS_PER_QUERY:]
+            query = " or ".join(f"'{parent}' in parents" for parent in parents)
+            page_token = None
+            while True:
+                result = service.files().list(
+                    q=f"({query}) and trashed=false",
+                    fields=f"nextPageToken, files({FILE_FIELDS})",
+                    pageSize=PAGE_SIZE,
+                    pageToken=page_token,
+                ).execute()
+                for item in result.get("files", []):
+                    self._add(item)
+                    if item.get("mimeType") == FOLDER_MIME:
+                        pending.append(item["id"])
+                page_token = result.get("nextPageToken")
+                if not page_token:
+                    break
+
+    def bootstrap(self, service):
+        """Ağacı baştan tara; belirteç taramadan önce alınır ki arada olan değişiklikler kaçmasın"""
+        start_token = service.changes().getStartPageToken().execute()["startPageToken"]
+        with self._lock:
+            self._files.clear()
+            self._children.clear()
+            self._by_name.clear()
+            self._by_token.clear()
+            self._sorted_tokens = None
+            self._scan(service, [self.root_id])
+            self.page_token = start_token
+            self.synced_at = time.monotonic()
+            self.save()
+
+    def _apply(self, change: dict, new_folders: List[str]) -> bool:
+        """Tek bir değişikliği uygula; üst klasörü henüz bilinmiyorsa False döndür"""
+        file_id = change.get("fileId")
+        item = change.get("file")
+        if change.get("removed") or item is None or item.get("trashed"):
+            self._discard(file_id)
+            return True
+        if self._in_tree(item.get("parents")):
+            # Çöpten geri alınan ya da ağaca taşınan klasörün alt öğeleri ayrıca bildirilmez
+            if file_id not in self._files and item.get("mimeType") == FOLDER_MIME:
+                new_folders.append(file_id)
+            self._add(item)
+            return True
+        # Ağaç dışına taşındı
+        self._discard(file_id)
+        return not item.get("parents")
+
+    def sync(self, service, force: bool = False) -> int:
+        """Son belirteçten bu yana gelen değişiklikleri uygula, uygulanan değişiklik sayısını döndür"""
+        with self._lock:
+            if self.page_token is None:
+                self.bootstrap(service)
+                return 0
+            if not force and time.monotonic() - self.synced_at < DRIVE_INDEX_SYNC_S:
+                return 0
+            applied = 0
+            page_token = self.page_token
+            while page_token:
+                try:
+                    result = service.changes().list(
+                        pageToken=page_token,
+                        spaces="drive",
+                        includeRemoved=True,
+                        pageSize=PAGE_SIZE,
+                        fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))",
+                    ).execute()
+                except Exception as e:
+                    status = getattr(getattr(e, "resp", None), "status", None)
+                    if status in (400, 404, 410):
+                        # Belirteç geçersiz ya da süresi dolmuş; baştan tara
+                        print(f"Drive dizini belirteci geçersiz, yeniden taranıyor: {str(e)}")
+                        self.bootstrap(service)
+                        return applied
+                    raise
+                # Aynı sayfada alt öğe üst klasöründen önce gelebilir; ilerleme kalmayana kadar tekrar dene
+                waiting = result.get("changes", [])
+                new_folders = []
+                while waiting:
+                    retry = [change for change in waiting if not self._apply(change, new_folders)]
+                    if len(retry) == len(waiting):
+                        break
+                    waiting = retry
+                if new_folders:
+                    self._scan(service, new_folders)
+                applied += len(result.get("changes", []))
+                if result.get("newStartPageToken"):
+                    self.page_token = result["newStartPageToken"]
+                    break
+                page_token = result.get("nextPageToken")
+            self.synced_at = time.monotonic()
+            if applied:
+                self.save()
+            return applied
+
+    # --- Sorgular ---
+
+    def get(self, file_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._files.get(file_id)
+            return dict(entry) if entry else None
+
+    def children(self, parent_id: str, folders_only: bool = False) -> List[dict]:
+        with self._lock:
+            items = [self._files[child_id] for child_id in self._children.get(parent_id, ())]
+            return [dict(item) for item in items if not folders_only or item["mimeType"] == FOLDER_MIME]
+
+    def find_child(self, parent_id: str, name: str, folders_only: bool = True) -> Optional[dict]:
+        """Üst klasörde tam adıyla eşleşen ilk öğe"""
+        with self._lock:
+            for file_id in sorted(self._by_name.get((parent_id, name), ())):
+                item = self._files[file_id]
+                if not folders_only or item["mimeType"] == FOLDER_MIME:
+                    return dict(item)
+            return None
+
+    def search(self, keyword: str, folders_only: bool = True, parent_id: Optional[str] = None) -> List[dict]:
+        """Adında anahtar kelimenin tüm sözcükleri (önek olarak) geçen öğeler
+
+        Drive'ın "name contains" aramasına benzer şekilde sözcük öneki eşleştirilir;
+        Türkçe karakterler ve büyük/küçük harf fark etmez.
+        """
+        query_tokens = _tokens(keyword)
+        if not query_tokens:
+            return []
+        with self._lock:
+            if self._sorted_tokens is None:
+                self._sorted_tokens = sorted(self._by_token)
+            result = None
+            for query in query_tokens:
+                ids = set()
+                start = bisect.bisect_left(self._sorted_tokens, query)
+                for token in self._sorted_tokens[start:]:
+                    if not token.startswith(query):
+                        break
+                    ids |= self._by_token[token]
+                result = ids if result is None else result & ids
+                if not result:
+                    return []
+            items = [self._files[file_id] for file_id in result]
+            items = [
+                dict(item) for item in items
+                if (not folders_only or item["mimeType"] == FOLDER_MIME)
+                and (parent_id is None or parent_id in item["parents"])
+            ]
+            return sorted(items, key=lambda item: item["name"])
+
+    def path_of(self, file_id: str) -> Optional[str]:
+        """Ana klasöre göre "Oda/İlan" biçiminde yol"""
+        with self._lock:
+            names = []
+            while file_id in self._files:
+                entry = self._files[file_id]
+                names.append(entry["name"])
+                file_id = entry["parents"][0] if entry["parents"] else None
+            return "/".join(reversed(names)) if names else None
+
+    def __len__(self):
+        return len(self._files)
+
+    # --- Kalıcılık ---
+
+    def save(self):
+        if not self.path:
+            return
+        data = {"root_id": self.root_id, "page_token": self.page_token, "files": list(self._files.values())}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".drive_index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, root_id: str, path: Optional[str] = DRIVE_INDEX_PATH) -> "DriveIndex":
+        """Dosyadan yükle; dosya yoksa ya da başka bir ana klasöre aitse boş dizin döndür"""
+        index = cls(root_id, path)
+        if not path or not os.path.exists(path):
+            return index
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Drive dizini okunamadı, yeniden taranacak: {str(e)}")
+            return index
+        if data.get("root_id") != root_id:
+            return index
+        for item in data.get("files", []):
+            index._add(item)
+        index.page_token = data.get("page_token")
+        return index
+
+
+# ana klasör ID'si -> dizin
+_indexes: Dict[str, DriveIndex] = {}
+_index_lock = threading.Lock()
+
+
+def index_path(root_id: str) -> str:
+    """GOOGLE_DRIVE_MAIN_FOLDER_ID DRIVE_INDEX_PATH'i kullanır, diğer ana klasörler yanındaki dosyayı"""
+    if root_id == os.getenv("GOOGLE_DRIVE_MAIN_FOLDER_ID"):
+        return DRIVE_INDEX_PATH
+    base, ext = os.path.splitext(DRIVE_INDEX_PATH)
+    return f"{base}-{re.sub(r'[^A-Za-z0-9_-]', '', root_id)}{ext}"
+
+
+def get_drive_index(service, root_id: Optional[str] = None, force_sync: bool = False) -> DriveIndex:
+    """Ana klasörün dizinini döndür; gerekirse dosyadan yükle ve Drive ile eşitle"""
+    root_id = root_id or os.getenv("GOOGLE_DRIVE_MAIN_FOLDER_ID")
+    if not root_id:
+        raise ValueError("GOOGLE_DRIVE_MAIN_FOLDER_ID bulunamadı")
+    with _index_lock:
+        index = _indexes.get(root_id)
+        if index is None:
+            index = _indexes[root_id] = DriveIndex.load(root_id, index_path(root_id))
+    index.sync(service, force=force_sync)
+    return index
+
+
+def loaded_indexes() -> List[DriveIndex]:
+    """Yüklenmiş dizinler; Drive'a istek atmaz"""
+    with _index_lock:
+        return list(_indexes.values())
@@ -0,0 +1,336 @@
+# drive_service/test_drive_index.py
+
+"""Yerel Drive dizininin sahte bir Drive servisiyle denenmesi
+
+Gerçek Drive'a bağlanmaz; files.list, files.create/update/delete ve
+changes.getStartPageToken/changes.list çağrılarını bellekte taklit eden bir
+servis kullanır.
+
+    python drive_service/test_drive_index.py
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sahte servis için veritabanı gerekmesin
+os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+
+from drive_service import drive_index
+from drive_service.drive_index import FOLDER_MIME, DriveIndex
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Resp", (), {"status": status})()
+
+
+class _Request:
+    def __init__(self, run):
+        self._run = run
+
+    def execute(self, num_retries=0):
+        return self._run()
+
+
+class _Batch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except FakeHttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeDrive:
+    """Dosyaları ve değişiklik günlüğünü bellekte tutan Drive taklidi"""
+
+    # Sayfalamayı da denemek için küçük tutulur
+    MAX_PAGE = 3
+
+    def __init__(self):
+        self.store = {}
+        self.log = []  # (fileId, removed)
+        self.calls = []
+        self.expired_before = 0
+        self._next_id = 0
+
+    # --- yardımcılar ---
+
+    def _record(self, file_id, removed=False):
+        self.log.append((file_id, removed))
+
+    def put(self, name, parent=None, folder=False, size=None):
+        self._next_id += 1
+        file_id = f"id{self._next_id:05d}"
+        self.store[file_id] = {
+            "id": file_id, "name": name, "parents": [parent] if parent else [],
+            "mimeType": FOLDER_MIME if folder else "image/jpeg", "trashed": False,
+        }
+        if size is not None:
+            self.store[file_id]["size"] = str(size)
+        self._record(file_id)
+        return file_id
+
+    def _visible(self, file_id):
+        """Kendisi ya da bir üst klasörü çöpte değilse görünür"""
+        while file_id in self.store:
+            item = self.store[file_id]
+            if item["trashed"]:
+                return False
+            file_id = item["parents"][0] if item["parents"] else None
+        return True
+
+    # --- Drive API ---
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return _Changes(self)
+
+    def new_batch_http_request(self, callback):
+        return _Batch(callback)
+
+    def list(self, q, fields=None, pageSize=100, pageToken=None):
+        self.calls.append(("files.list", q))
+        parents = set(re.findall(r"'([^']+)' in parents", q))
+        name = re.search(r"name='([^']*)'", q)
+
+        def run():
+            items = [
+                dict(item) for item in self.store.values()
+                if set(item["parents"]) & parents and self._visible(item["id"])
+                and (name is None or item["name"] == name.group(1))
+            ]
+            items.sort(key=lambda item: item["id"])
+            start = int(pageToken or 0)
+            page = items[start:start + min(pageSize, self.MAX_PAGE)]
+            result = {"files": page}
+            if start + len(page) < len(items):
+                result["nextPageToken"] = str(start + len(page))
+            return result
+        return _Request(run)
+
+    def create(self, body, fields=None, media_body=None):
+        self.calls.append(("files.create", body["name"]))
+        parent = (body.get("parents") or [None])[0]
+        folder = body.get("mimeType") == FOLDER_MIME
+        return _Request(lambda: {"id": self.put(body["name"], parent, folder), "name": body["name"]})
+
+    def update(self, fileId, body=None, fields=None, addParents=None, removeParents=None):
+        def run():
+            if fileId not in self.store:
+                raise FakeHttpError(404)
+            item = self.store[fileId]
+            item.update(body or {})
+            if addParents:
+                item["parents"] = [addParents]
+            self._record(fileId)
+            return {key: item[key] for key in ("id", "name", "parents", "mimeType")}
+        return _Request(run)
+
+    def delete(self, fileId):
+        def run():
+            if fileId not in self.store:
+                raise FakeHttpError(404)
+            for child_id in [i for i, item in self.store.items() if fileId in item["parents"]]:
+                self.delete(child_id).execute()
+            del self.store[fileId]
+            self._record(fileId, removed=True)
+            return ""
+        return _Request(run)
+
+
+class _Changes:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self):
+        return _Request(lambda: {"startPageToken": str(len(self.drive.log))})
+
+    def list(self, pageToken, pageSize=100, fields=None, spaces=None, includeRemoved=True):
+        drive = self.drive
+        drive.calls.append(("changes.list", pageToken))
+
+        def run():
+            start = int(pageToken)
+            if start < drive.expired_before:
+                raise FakeHttpError(410)
+            entries = drive.log[start:start + min(pageSize, drive.MAX_PAGE)]
+            changes = []
+            for file_id, removed in entries:
+                item = drive.store.get(file_id)
+                if removed or item is None:
+                    changes.append({"fileId": file_id, "removed": True})
+                else:
+                    changes.append({"fileId": file_id, "removed": False, "file": dict(item)})
+            end = start + len(entries)
+            if end < len(drive.log):
+                return {"changes": changes, "nextPageToken": str(end)}
+            return {"changes": changes, "newStartPageToken": str(end)}
+        return _Request(run)
+
+
+def _tree():
+    drive = FakeDrive()
+    root = drive.put("Emlak", folder=True)
+    oda = drive.put("3+1", root, folder=True)
+    ilan = drive.put("Moda-Bahariye Caddesi-3+1 #SADEEVIM", oda, folder=True)
+    drive.put("photo_1.jpg", ilan, size=1200)
+    drive.put("photo_2.jpg", ilan, size=3400)
+    drive.put("Caferağa-Moda Caddesi-2+1 #SADEEVIM", drive.put("2+1", root, folder=True), folder=True)
+    drive.put("Başka klasör", folder=True)
+    return drive, root, oda, ilan
+
+
+def _index(drive, root, path=None):
+    index = DriveIndex(root, path)
+    index.sync(drive)
+    return index
+
+
+def test_bootstrap_and_queries():
+    drive, root, oda, ilan = _tree()
+    index = _index(drive, root)
+    assert len(index) == 6
+    assert index.find_child(root, "3+1")["id"] == oda
+    assert index.get(ilan)["parents"] == [oda]
+    assert sorted(item["size"] for item in index.children(ilan)) == [1200, 3400]
+    assert [item["name"] for item in index.search("moda")] == [
+        "Caferağa-Moda Caddesi-2+1 #SADEEVIM", "Moda-Bahariye Caddesi-3+1 #SADEEVIM",
+    ]
+    # Türkçe karakter ve sözcük öneki
+    assert [item["id"] for item in index.search("CAFERAGA mod")] != []
+    assert index.search("bahariye", parent_id=oda)[0]["id"] == ilan
+    assert index.search("başka") == []  # ağaç dışında
+    assert index.search("photo", folders_only=False) and not index.search("photo")
+    assert index.path_of(ilan) == "3+1/Moda-Bahariye Caddesi-3+1 #SADEEVIM"
+
+
+def test_incremental_sync():
+    drive, root, oda, ilan = _tree()
+    index = _index(drive, root)
+    list_calls = len([c for c in drive.calls if c[0] == "files.list"])
+
+    # Alt öğe üst klasöründen önce bildirilse de eklenmeli
+    new_folder = drive.put("Kadıköy-Yeni Sokak-3+1 #SADEEVIM", oda, folder=True)
+    new_photo = drive.put("photo_9.jpg", new_folder, size=10)
+    drive.log[-2], drive.log[-1] = drive.log[-1], drive.log[-2]
+    drive.update(ilan, {"name": "Moda-Bahariye Caddesi-3+1 SATILDI"}).execute()
+    assert index.sync(drive, force=True) == 3
+    assert index.get(new_photo)["parents"] == [new_folder]
+    assert index.search("satildi")[0]["id"] == ilan
+    assert all(item["id"] != ilan for item in index.search("sadeevim"))
+
+    # Çöpe taşınan klasör alt öğeleriyle birlikte düşer, geri alınınca yeniden taranır
+    drive.update(ilan, {"trashed": True}).execute()
+    index.sync(drive, force=True)
+    assert index.get(ilan) is None and index.children(ilan) == []
+    drive.update(ilan, {"trashed": False}).execute()
+    index.sync(drive, force=True)
+    assert len(index.children(ilan)) == 2
+
+    # Ağaç dışına taşınan klasör düşer; silinen dosya düşer
+    outside = [i for i, item in drive.store.items() if item["name"] == "Başka klasör"][0]
+    drive.update(new_folder, addParents=outside).execute()
+    drive.delete(index.children(ilan)[0]["id"]).execute()
+    index.sync(drive, force=True)
+    assert index.get(new_folder) is None and index.get(new_photo) is None
+    assert len(index.children(ilan)) == 1
+
+    # Eşitleme yalnızca değişiklikleri okur, ağacı yeniden taramaz (geri alma taraması hariç)
+    extra_lists = len([c for c in drive.calls if c[0] == "files.list"]) - list_calls
+    assert extra_lists <= 2, extra_lists
+
+
+def test_persistence_and_expired_token():
+    drive, root, oda, ilan = _tree()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.json")
+        index = _index(drive, root, path)
+        drive.put("1+1", root, folder=True)
+        index.sync(drive, force=True)
+
+        drive.calls.clear()
+        reloaded = DriveIndex.load(root, path)
+        assert len(reloaded) == len(index) and reloaded.page_token == index.page_token
+        reloaded.sync(drive)
+        assert not [c for c in drive.calls if c[0] == "files.list"]
+        assert reloaded.find_child(root, "1+1") is not None
+
+        # Başka bir ana klasörün dosyası kullanılmaz
+        assert len(DriveIndex.load("baska-kok", path)) == 0
+
+        # Süresi dolan belirteç baştan taramaya yol açar
+        drive.put("4+1", root, folder=True)
+        drive.expired_before = len(drive.log)
+        reloaded.sync(drive, force=True)
+        assert reloaded.find_child(root, "4+1") is not None
+
+
+def test_uploader_uses_index():
+    from drive_service import uploader
+
+    drive, root, oda, ilan = _tree()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["GOOGLE_DRIVE_MAIN_FOLDER_ID"] = root
+        drive_index._indexes[root] = DriveIndex.load(root, os.path.join(tmp, "index.json"))
+        drive.calls.clear()
+
+        assert uploader.get_or_create_folder(drive, "3+1", root)["id"] == oda
+        assert not [c for c in drive.calls if c[0] == "files.list" and "name=" in c[1]]
+        created = uploader.get_or_create_folder(drive, "5+1", root)
+        assert uploader.get_or_create_folder(drive, "5+1", root)["id"] == created["id"]
+        assert len([c for c in drive.calls if c[0] == "files.create"]) == 1
+
+        ok, items = uploader.get_folder_info(drive, "bahariye")
+        assert ok and items[0]["id"] == ilan and items[0]["parents"] == [oda]
+        assert uploader.delete_folder(drive, "5+1") == (True, "Klasör başarıyla silindi")
+        assert uploader.delete_folder(drive, "5+1")[0] is False
+
+        assert uploader.trash_folders(drive, [ilan]) == {}
+        assert uploader.get_folder_info(drive, "bahariye")[0] is False
+        # Geri alınan klasör eşitleme beklemeden fotoğraflarıyla dizine döner
+        assert uploader.restore_folders(drive, [ilan]) == {}
+        index = drive_index._indexes[root]
+        assert index.get(ilan)["parents"] == [oda] and len(index.children(ilan)) == 2
+        assert uploader.delete_folders_by_id(drive, [ilan, "yok"]) == {}
+        assert index.get(ilan) is None and ilan not in drive.store
+        drive_index._indexes.clear()
+
+
+def test_lookup_speed():
+    drive = FakeDrive()
+    root = drive.put("Emlak", folder=True)
+    index = DriveIndex(root, None)
+    for i in range(20000):
+        index.add({"id": f"f{i}", "name": f"Mahalle{i % 500}-Sokak{i}-3+1 #SADEEVIM",
+                   "parents": [root], "mimeType": FOLDER_MIME})
+    index.search("mahalle1")  # sıralı sözcük listesi ilk aramada kurulur
+    started = time.perf_counter()
+    for _ in range(1000):
+        index.find_child(root, "3+1")
+        index.get("f12345")
+        index.search("sokak12345")
+    per_lookup_us = (time.perf_counter() - started) / 3000 * 1e6
+    print(f"Ortalama dizin sorgusu: {per_lookup_us:.1f} µs")
+    assert index.search("sokak12345")[0]["id"] == "f12345"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")
@@ -1,28 +1,74 @@
 import os
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+import threading
 from dotenv import load_dotenv
 import mimetypes
+import time
+from backend import rate_limit
+from drive_service.drive_index import FOLDER_MIME, get_drive_index, loaded_indexes
 
 load_dotenv()
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
+# Geçici hatalarda (429/5xx) bir isteğin en fazla kaç kez yeniden deneneceği
+DRIVE_NUM_RETRIES = int(os.getenv("DRIVE_NUM_RETRIES", 3))
+# Drive tek bir toplu istekte en fazla 100 alt isteğe izin veriyor
+DRIVE_BATCH_SIZE = 100
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Drive istemcisi (httplib2) iş parçacıkları arasında paylaşılamadığı için her iş parçacığına ayrı tutulur
+_local = threading.local()
+
+def execute(request):
+    """Drive isteğini ortak hız sınırı içinde çalıştır (429'da Retry-After'a uyarak yeniden dener)"""
+    return rate_limit.call("drive", request.execute)
 
 def get_drive_service():
-    creds_path = os.getenv("GOOGLE_DRIVE_CREDENTIALS_FILE")
-    creds = service_account.Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    """Drive istemcisini ilk kullanımda oluştur ve aynı iş parçacığında yeniden kullan"""
+    service = getattr(_local, "service", None)
+    if service is None:
+        # Google kütüphaneleri ağır; yalnızca Drive gerçekten kullanıldığında yüklenir
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build
 
-def get_or_create_folder(service, folder_name, parent_id=None):
-    # Klasör var mı kontrol et
-    query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-    if parent_id:
-        query += f" and '{parent_id}' in parents"
-    results = service.files().list(q=query, fields="files(id, name)").execute()
-    items = results.get('files', [])
-    if items:
-        return items[0]  # Tüm folder nesnesini döndür
+        creds_path = os.getenv("GOOGLE_DRIVE_CREDENTIALS_FILE")
+        creds = service_account.Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+        service = build('drive', 'v3', credentials=creds)
+        _local.service = service
+    return service
+
+def _tree_index(service, parent_id, root_id=None):
+    """parent_id, root_id (verilmezse ana klasör) ağacındaysa yerel Drive dizinini döndür, değilse None"""
+    if not parent_id:
+        return None
+    try:
+        index = get_drive_index(service, root_id)
+    except Exception as e:
+        print(f"Drive dizini kullanılamıyor, canlı aramaya dönülüyor: {str(e)}")
+        return None
+    if parent_id != index.root_id and index.get(parent_id) is None:
+        return None
+    return index
+
+def get_or_create_folder(service, folder_name, parent_id=None, root_id=None):
+    index = _tree_index(service, parent_id, root_id)
+    if index is not None:
+        # Klasör var mı kontrol et (yerel dizinde)
+        folder = index.find_child(parent_id, folder_name)
+        if folder is None:
+            # Başka bir süreç az önce oluşturmuş olabilir; değişiklikleri çekip tekrar bak
+            index.sync(service, force=True)
+            folder = index.find_child(parent_id, folder_name)
+        if folder is not None:
+            return {'id': folder['id'], 'name': folder['name']}
+    else:
+        # Klasör var mı kontrol et
+        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        results = execute(service.files().list(q=query, fields="files(id, name)"))
+        items = results.get('files', [])
+        if items:
+            return items[0]  # Tüm folder nesnesini döndür
     
     # Yoksa oluştur
     folder_metadata = {
@@ -31,10 +77,16 @@ def get_or_create_folder(service, folder_name, parent_id=None):
     }
     if parent_id:
         folder_metadata['parents'] = [parent_id]
-    folder = service.files().create(body=folder_metadata, fields='id, name').execute()
+    folder = execute(service.files().create(body=folder_metadata, fields='id, name'))
+    if index is not None:
+        index.add({**folder, 'parents': [parent_id], 'mimeType': FOLDER_MIME})
     return folder  # Tüm folder nesnesini döndür
 
 def upload_file_to_drive(filepath, filename, parent_folder_id=None):
+    return upload_photo_to_drive(filepath, filename, parent_folder_id)["link"]
+
+def upload_photo_to_drive(filepath, filename, parent_folder_id=None):
+    """Dosyayı yükle, herkese açık yap ve Drive dosya ID'si ile linkini döndür"""
     service = get_drive_service()
 
     file_metadata = {'name': filename}
@@ -44,14 +96,15 @@ def upload_file_to_drive(filepath, filename, parent_folder_id=None):
     if mimetype is None:
         mimetype = 'application/octet-stream'  # fallback
 
+    from googleapiclient.http import MediaFileUpload
     media = MediaFileUpload(filepath, mimetype=mimetype)
 
     # Dosyayı Drive'a yükle
-    file = service.files().create(
+    file = execute(service.files().create(
         body=file_metadata,
         media_body=media,
         fields='id'
-    ).execute()
+    ))
 
     file_id = file.get('id')
 
@@ -60,13 +113,17 @@ def upload_file_to_drive(filepath, filename, parent_folder_id=None):
         'type': 'anyone',
         'role': 'reader'
     }
-    service.permissions().create(fileId=file_id, body=permission).execute()
+    execute(service.permissions().create(fileId=file_id, body=permission))
 
     # Doğrudan erişilebilir link üret
-    return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+    return {
+        "id": file_id,
+        "link": f"https://drive.google.com/file/d/{file_id}/view?usp=sharing",
+    }
 
 def upload_multiple_photos(folder_path: str, parent_folder_id: str = None) -> list:
     """Klasördeki tüm fotoğrafları Drive'a yükle"""
+    from googleapiclient.http import MediaFileUpload
     service = get_drive_service()
     photo_links = []
     
@@ -103,11 +160,11 @@ def upload_multiple_photos(folder_path: str, parent_folder_id: str = None) -> li
             print(f"Dosya yükleniyor: {f}")
 
             # Dosyayı Drive'a yükle
-            file = service.files().create(
+            file = execute(service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id'
-            ).execute()
+            ))
 
             file_id = file.get('id')
             print(f"Dosya yüklendi, ID: {file_id}")
@@ -117,7 +174,7 @@ def upload_multiple_photos(folder_path: str, parent_folder_id: str = None) -> li
                 'type': 'anyone',
                 'role': 'reader'
             }
-            service.permissions().create(fileId=file_id, body=permission).execute()
+            execute(service.permissions().create(fileId=file_id, body=permission))
             print(f"Dosya paylaşımı ayarlandı: {file_id}")
 
             # Doğrudan erişilebilir link üret
@@ -132,36 +189,16 @@ def upload_multiple_photos(folder_path: str, parent_folder_id: str = None) -> li
     return photo_links
 
 def delete_folder(service, folder_name):
-    """Drive'dan klasör sil"""
+    """Ana klasörün altındaki klasörü adıyla bul ve sil (arama yerel Drive dizininde yapılır)"""
     try:
-        # Ana klasör ID'sini .env'den al
-        main_folder_id = os.getenv("GOOGLE_DRIVE_MAIN_FOLDER_ID")
-        if not main_folder_id:
-            raise ValueError("GOOGLE_DRIVE_MAIN_FOLDER_ID bulunamadı")
-
-        # Klasörü ara - tam eşleşme yerine içerisinde geçen şekilde ara
-        results = service.files().list(
-            q=f"name contains '{folder_name}' and mimeType='application/vnd.google-apps.folder' and '{main_folder_id}' in parents and trashed=false",
-            fields="files(id, name)"
-        ).execute()
-        
-        items = results.get('files', [])
-        
-        if not items:
+        index = get_drive_index(service)
+        folder = index.find_child(index.root_id, folder_name)
+        if not folder:
             return False, "Klasör bulunamadı"
-            
-        # Eğer birden fazla sonuç varsa, tam eşleşen klasörü bul
-        folder_id = None
-        for item in items:
-            if item['name'] == folder_name:
-                folder_id = item['id']
-                break
-        
-        if not folder_id:
-            return False, "Klasör bulunamadı"
-        
+
         # Klasörü sil
-        service.files().delete(fileId=folder_id).execute()
+        execute(service.files().delete(fileId=folder['id']))
+        index.discard([folder['id']])
         return True, "Klasör başarıyla silindi"
         
     except Exception as e:
@@ -169,27 +206,122 @@ def delete_folder(service, folder_name):
         return False, f"Klasör silinirken hata oluştu: {str(e)}"
 
 def get_folder_info(service, folder_name):
-    """Drive'da tüm alt klasörlerde arama yapar ve tam yolunu döndürür"""
+    """Ana klasör ağacındaki tüm alt klasörlerde adıyla arama yapar (yerel Drive dizininde)"""
     try:
-        # Sadece ana klasör altında değil, tüm drive'da arama yap
-        results = service.files().list(
-            q=f"name contains '{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false",
-            fields="files(id, name, parents)"
-        ).execute()
-        items = results.get('files', [])
+        items = get_drive_index(service).search(folder_name)
         if not items:
             return False, "Klasör bulunamadı"
         # Klasörlerin parent bilgisini de döndür
-        return True, items
+        return True, [{'id': item['id'], 'name': item['name'], 'parents': item['parents']} for item in items]
     except Exception as e:
         print(f"Drive klasörü bilgisi alma hatası: {str(e)}")
         return False, f"Klasör bilgisi alınırken hata oluştu: {str(e)}"
 
+def _forget(file_ids, failed):
+    """Silinen ya da çöpe taşınan klasörleri, yüklü dizinlerden hemen düşür"""
+    for index in loaded_indexes():
+        index.discard([file_id for file_id in file_ids if file_id not in failed])
+
 def delete_folder_by_id(service, folder_id):
     """Klasörü id ile sil"""
     try:
-        service.files().delete(fileId=folder_id).execute()
+        execute(service.files().delete(fileId=folder_id))
+        _forget([folder_id], {})
         return True, "Klasör başarıyla silindi"
     except Exception as e:
         print(f"Drive klasörü silme hatası: {str(e)}")
         return False, f"Klasör silinirken hata oluştu: {str(e)}"
+
+def _remember(service, items):
+    """Çöpten geri alınan klasörleri yüklü dizinlere alt öğeleriyle geri ekle (_forget'in tersi)"""
+    for index in loaded_indexes():
+        for item in items:
+            index.add(item, service=service)
+
+def _run_batched(service, file_ids, make_request, on_success=None):
+    """Aynı tür Drive isteklerini 100'lük toplu isteklerle gönder
+
+    Geçici hatalar artan beklemeyle yeniden denenir, 404 (zaten yok) başarı
+    sayılır. Başarılı yanıtlar on_success'e verilir. Başarısız olan dosya
+    ID'lerini hata mesajlarıyla döndürür.
+    """
+    pending = list(dict.fromkeys(file_ids))
+    failed = {}
+    for attempt in range(DRIVE_NUM_RETRIES + 1):
+        retry = []
+        pauses = []
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            chunk = pending[start:start + DRIVE_BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    failed.pop(request_id, None)
+                    if on_success is not None and response:
+                        on_success(response)
+                    return
+                status = getattr(getattr(exception, 'resp', None), 'status', None)
+                limited, retry_after = rate_limit.rate_limit_info(exception)
+                if limited:
+                    pauses.append(retry_after or 2 ** attempt)
+                if status == 404:
+                    failed.pop(request_id, None)
+                elif status in RETRYABLE_STATUSES or limited:
+                    retry.append(request_id)
+                    failed[request_id] = str(exception)
+                else:
+                    failed[request_id] = str(exception)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for file_id in chunk:
+                batch.add(make_request(file_id), request_id=file_id)
+            try:
+                # Toplu istekteki her alt istek kotadan ayrı düşer
+                with rate_limit.slot("drive", cost=len(chunk)):
+                    batch.execute()
+            except rate_limit.Overloaded:
+                raise
+            except Exception as e:
+                # Toplu isteğin kendisi başarısız olduysa tüm parçayı tekrar dene
+                print(f"Drive toplu istek hatası: {str(e)}")
+                retry.extend(chunk)
+                for file_id in chunk:
+                    failed[file_id] = str(e)
+        if not retry or attempt == DRIVE_NUM_RETRIES:
+            break
+        if pauses:
+            # Hız sınırı: bekleme ortak kovaya yazılır, sonraki slot() çağrısı bekler
+            rate_limit.penalize("drive", max(pauses))
+        else:
+            time.sleep(2 ** attempt)
+        pending = retry
+    return failed
+
+def trash_folders(service, folder_ids):
+    """Klasörleri çöp kutusuna taşı (geri alınabilir)"""
+    failed = _run_batched(
+        service, folder_ids,
+        lambda file_id: service.files().update(fileId=file_id, body={'trashed': True}, fields='id'),
+    )
+    _forget(folder_ids, failed)
+    return failed
+
+def restore_folders(service, folder_ids):
+    """Çöp kutusuna taşınmış klasörleri geri al ve yüklü dizinlere yeniden ekle"""
+    restored = []
+    failed = _run_batched(
+        service, folder_ids,
+        lambda file_id: service.files().update(
+            fileId=file_id, body={'trashed': False}, fields='id, name, parents, mimeType'),
+        on_success=restored.append,
+    )
+    _remember(service, restored)
+    return failed
+
+def delete_folders_by_id(service, folder_ids):
+    """Klasörleri kalıcı olarak toplu sil"""
+    failed = _run_batched(
+        service, folder_ids,
+        lambda file_id: service.files().delete(fileId=file_id),
+    )
+    _forget(folder_ids, failed)
+    return failed
@@ -10,6 +10,23 @@ import {
   XMarkIcon
 } from '@heroicons/react/24/outline';
 
+const API_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
+// Değişiklik beslemesinde sunucunun bekleyeceği en uzun süre (saniye)
+const CHANGES_WAIT_S = 25;
+
+// /ilan/changes farklarını mevcut listeye uygula
+const applyChanges = (ilanlar, changes) => {
+  const byId = new Map(ilanlar.map(ilan => [ilan.id, ilan]));
+  changes.forEach(change => {
+    if (change.islem === 'delete') {
+      byId.delete(change.ilan_id);
+    } else {
+      byId.set(change.ilan_id, change.ilan);
+    }
+  });
+  return [...byId.values()].sort((a, b) => a.id - b.id);
+};
+
 function App() {
   const [ilanlar, setIlanlar] = useState([]);
   const [filteredIlanlar, setFilteredIlanlar] = useState([]);
@@ -26,7 +43,32 @@ function App() {
   });
 
   useEffect(() => {
-    fetchIlanlar();
+    let cancelled = false;
+    const sync = async () => {
+      let cursor = null;
+      try {
+        // Önce imleci al, sonra listeyi çek; aradaki değişiklikler kaçmaz
+        cursor = (await axios.get(`${API_URL}/ilan/changes`)).data.cursor;
+      } catch (err) {
+        // Besleme yoksa yalnızca listeyi yükle
+      }
+      await fetchIlanlar();
+      while (!cancelled && cursor !== null) {
+        try {
+          const { data } = await axios.get(`${API_URL}/ilan/changes`, {
+            params: { since: cursor, wait: CHANGES_WAIT_S }
+          });
+          cursor = data.cursor;
+          if (!cancelled && data.changes.length) {
+            setIlanlar(prev => applyChanges(prev, data.changes));
+          }
+        } catch (err) {
+          await new Promise(resolve => setTimeout(resolve, 5000));
+        }
+      }
+    };
+    sync();
+    return () => { cancelled = true; };
   }, []);
 
   useEffect(() => {
@@ -35,8 +77,7 @@ function App() {
 
   const fetchIlanlar = async () => {
     try {
-      const apiUrl = process.env.REACT_APP_API_URL || "http://localhost:8000";
-      const response = await axios.get(`${apiUrl}/ilan`);
+      const response = await axios.get(`${API_URL}/ilan`);
       setIlanlar(response.data);
       setFilteredIlanlar(response.data);
       setLoading(false);
@@ -215,6 +256,15 @@ function App() {
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
           {filteredIlanlar.map((ilan) => (
             <div key={ilan.id} className="bg-white rounded-lg shadow-md overflow-hidden hover:shadow-lg transition-shadow duration-300">
+              {/* Kapak Fotoğrafı */}
+              {ilan.fotolar?.length > 0 && (
+                <img
+                  src={`${API_URL}${ilan.fotolar[0].thumb_url}`}
+                  alt={ilan.baslik}
+                  loading="lazy"
+                  className="w-full h-48 object-cover"
+                />
+              )}
               {/* İlan Detayları */}
               <div className="p-6">
                 <h2 className="text-xl font-semibold text-gray-900 mb-3">{ilan.baslik}</h2>
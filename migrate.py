@@ -1,5 +1,242 @@
 # migrate.py
+"""Veritabanı şemasını güncelle
+
+Yeni bir veritabanında tablolar doğrudan modellerden oluşturulur ve tüm
+migrasyonlar uygulanmış sayılır. Var olan veritabanında ise yalnızca henüz
+uygulanmamış migrasyonlar sırayla çalıştırılır.
+
+Kullanım: python migrate.py
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from backend import dedup, geo, normalize, offices, stats
 from backend.database import engine
-from backend.models import Base
+from backend.models import Base, Ilan
+
+
+def _0001_ilan_drive_folder_id(conn):
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS drive_folder_id VARCHAR(128)"))
+    # Eski kayıtlarda klasör ID'si yalnızca drive_link içinde duruyor
+    conn.execute(text(
+        "UPDATE emlak_ilanlar SET drive_folder_id = substring(drive_link from 'folders/([^/?#]+)') "
+        "WHERE drive_folder_id IS NULL AND drive_link IS NOT NULL"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_emlak_ilanlar_drive_folder_id ON emlak_ilanlar (drive_folder_id)"
+    ))
+
+
+def _rebuild_stats(conn):
+    # İstatistikler ofis_id'ye göre tutulur; 0008'den önce ilanlarda ofis_id
+    # olmadığından o migrasyon istatistikleri zaten yeniden kurar
+    if "ofis_id" in {column["name"] for column in inspect(conn).get_columns("emlak_ilanlar")}:
+        stats.rebuild_stats(Session(bind=conn, join_transaction_mode="create_savepoint"))
+
+
+def _0002_ilan_gonderen(conn):
+    # Eski ilanların göndereni bilinmez; onları yalnızca ofis numaraları silebilir
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS gonderen VARCHAR(32)"))
+
+
+def _0003_ilan_istatistikleri(conn):
+    # Tablo create_all ile oluşturuldu; var olan ilanlardan doldur
+    _rebuild_stats(conn)
+
+
+def _0004_ilan_oda_salon(conn, batch_size=1000):
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS oda INTEGER"))
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS salon INTEGER"))
+    for column in ("oda", "fiyat", "metrekare"):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_emlak_ilanlar_{column} ON emlak_ilanlar ({column})"))
+
+    # Var olan kayıtları id sırasıyla parça parça doldur
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, oda_sayisi FROM emlak_ilanlar WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            oda, salon = normalize.parse_oda(row.oda_sayisi)
+            updates.append({
+                "id": row.id,
+                "oda": oda,
+                "salon": salon,
+                "oda_sayisi": normalize.canonical_oda_sayisi(row.oda_sayisi),
+            })
+        conn.execute(
+            text("UPDATE emlak_ilanlar SET oda = :oda, salon = :salon, oda_sayisi = :oda_sayisi WHERE id = :id"),
+            updates,
+        )
+        last_id = rows[-1].id
+
+    # İstatistik anahtarları standart oda_sayisi'na göre yeniden kurulmalı
+    _rebuild_stats(conn)
+
+
+def _0005_ilan_konum(conn, batch_size=1000):
+    collate = ' COLLATE "C"' if conn.dialect.name == "postgresql" else ""
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION"))
+    conn.execute(text("ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS lon DOUBLE PRECISION"))
+    conn.execute(text(f"ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS geohash VARCHAR(12){collate}"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_emlak_ilanlar_geohash ON emlak_ilanlar (geohash)"))
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, mahalle FROM emlak_ilanlar WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        updates = [dict(geo.locate(row.mahalle), id=row.id) for row in rows]
+        conn.execute(
+            text("UPDATE emlak_ilanlar SET lat = :lat, lon = :lon, geohash = :geohash WHERE id = :id"),
+            updates,
+        )
+        last_id = rows[-1].id
+
+
+def _0006_ilan_dedup(conn, batch_size=1000):
+    conn.execute(text(
+        "ALTER TABLE emlak_ilanlar ADD COLUMN IF NOT EXISTS benzer_ilan_id INTEGER "
+        "REFERENCES emlak_ilanlar (id) ON DELETE SET NULL"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_emlak_ilanlar_benzer_ilan_id ON emlak_ilanlar (benzer_ilan_id)"))
+
+    # Var olan ilanların imzalarını ve LSH bantlarını oluştur
+    session = Session(bind=conn, join_transaction_mode="create_savepoint")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, aciklama, mahalle, sokak FROM emlak_ilanlar WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size},
+        ).mappings().all()
+        if not rows:
+            break
+        dedup.index_ilanlar(session, [(row["id"], row) for row in rows])
+        session.flush()
+        last_id = rows[-1]["id"]
+
+
+def _0007_ilan_photos_drive_file_id(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ilan_photos_drive_file_id ON ilan_photos (drive_file_id)"
+    ))
+
+
+def _0008_ofis_bolumleri(conn):
+    """emlak_ilanlar'ı ofis_id'ye göre bölümlü tabloya taşı; var olan ilanlar varsayılan ofise yazılır"""
+    ofis_id = offices.DEFAULT_OFIS_ID
+
+    # Bölümlü tabloda id tek başına benzersiz olamaz; ona başvuran yabancı anahtarlar kalkar
+    foreign_keys = conn.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = 'emlak_ilanlar'::regclass"
+    )).all()
+    for table, name in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+    # Eski tabloyu adları yenisiyle çakışmayacak şekilde kenara al
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('emlak_ilanlar', 'id')")).scalar()
+    conn.execute(text("ALTER TABLE emlak_ilanlar RENAME TO emlak_ilanlar_eski"))
+    conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO emlak_ilanlar_eski_id_seq"))
+    for name in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'emlak_ilanlar_eski'"
+    )).scalars():
+        # Birincil anahtar indeksinin adı değişince kısıtın adı da değişir
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_eski"'))
+
+    # Yeni tablo, varsayılan bölüm ve varsayılan ofisin bölümü
+    Ilan.__table__.create(conn)
+    offices.create_partition(Session(bind=conn, join_transaction_mode="create_savepoint"), ofis_id)
+
+    # Yalnızca eski tabloda olan sütunlar taşınır; sonraki migrasyonların eklediği sütunlar boş kalır
+    old_columns = set(conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'emlak_ilanlar_eski'"
+    )).scalars())
+    columns = ", ".join(
+        column.name for column in Ilan.__table__.columns if column.name != "ofis_id" and column.name in old_columns
+    )
+    conn.execute(text(
+        f"INSERT INTO emlak_ilanlar ({columns}, ofis_id) SELECT {columns}, :ofis_id FROM emlak_ilanlar_eski"
+    ), {"ofis_id": ofis_id})
+    # Silinmiş ilanların numaraları da yeniden verilmesin
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('emlak_ilanlar', 'id'), last_value, is_called) "
+        "FROM emlak_ilanlar_eski_id_seq"
+    ))
+    conn.execute(text("DROP TABLE emlak_ilanlar_eski"))
+    conn.execute(text("ANALYZE emlak_ilanlar"))
+
+    # Ofise göre tutulan tablolar; var olan satırlar varsayılan ofise aittir
+    for table in ("ilan_istatistikleri", "ilan_lsh_bantlari", "ilan_degisiklikleri"):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS ofis_id INTEGER NOT NULL DEFAULT {ofis_id}"))
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN ofis_id DROP DEFAULT"))
+    conn.execute(text(
+        "ALTER TABLE ilan_istatistikleri DROP CONSTRAINT IF EXISTS uq_ilan_istatistikleri_mahalle_oda, "
+        "DROP CONSTRAINT IF EXISTS uq_ilan_istatistikleri_ofis_mahalle_oda, "
+        "ADD CONSTRAINT uq_ilan_istatistikleri_ofis_mahalle_oda UNIQUE (ofis_id, mahalle, oda_sayisi)"
+    ))
+    conn.execute(text(
+        "ALTER TABLE ilan_lsh_bantlari DROP CONSTRAINT ilan_lsh_bantlari_pkey, "
+        "ADD CONSTRAINT ilan_lsh_bantlari_pkey PRIMARY KEY (ofis_id, bant, hash, ilan_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ilan_degisiklikleri_ofis_id_seq ON ilan_degisiklikleri (ofis_id, seq)"
+    ))
+    _rebuild_stats(conn)
+
+
+# Sıra önemli: yeni migrasyonlar listenin sonuna eklenir
+MIGRATIONS = [
+    ("0001_ilan_drive_folder_id", _0001_ilan_drive_folder_id),
+    ("0002_ilan_gonderen", _0002_ilan_gonderen),
+    ("0003_ilan_istatistikleri", _0003_ilan_istatistikleri),
+    ("0004_ilan_oda_salon", _0004_ilan_oda_salon),
+    ("0005_ilan_konum", _0005_ilan_konum),
+    ("0006_ilan_dedup", _0006_ilan_dedup),
+    ("0007_ilan_photos_drive_file_id", _0007_ilan_photos_drive_file_id),
+    ("0008_ofis_bolumleri", _0008_ofis_bolumleri),
+]
+
+
+def migrate(bind=engine):
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Aynı anda başlayan birden fazla süreç migrasyonu iki kez çalıştırmasın
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('emlak_migrate'))"))
+
+        fresh = not inspect(conn).has_table("emlak_ilanlar")
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+
+        # Yeni tabloları oluştur; var olan tablolara dokunmaz, onları migrasyonlar günceller
+        Base.metadata.create_all(bind=conn)
+        offices.ensure_default_ofis(conn)
+
+        if not fresh:
+            for name, migration in MIGRATIONS:
+                if name in applied:
+                    continue
+                print(f"Migrasyon uygulanıyor: {name}")
+                migration(conn)
+                conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+        else:
+            offices.create_partition(Session(bind=conn, join_transaction_mode="create_savepoint"), offices.DEFAULT_OFIS_ID)
+            conn.execute(
+                text("INSERT INTO schema_migrations (name) VALUES (:name)"),
+                [{"name": name} for name, _ in MIGRATIONS],
+            )
+            print("Yeni veritabanı oluşturuldu, migrasyonlar uygulanmış olarak işaretlendi.")
+
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,201 @@
+# test_migrate.py
+
+"""Ofis bölümlerine geçişin (0008) ve offices.create_partition'ın denenmesi
+
+0007 dönemi şemasını verisiyle birlikte geçici bir şemada kurar, migrate'i
+çalıştırır; satır sayılarını, id sequence'inin konumunu, istatistiklerin
+yeniden kurulmasını ve bölüm budamasını kontrol eder. DATABASE_URL bir
+PostgreSQL veritabanını göstermelidir; testler ayrı bir şemada çalışır.
+
+    python test_migrate.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+import migrate
+from backend import crud, offices, schemas
+from backend.testing import postgres_available, session_factory, temp_schema
+
+# 0007_ilan_photos_drive_file_id uygulanmış bir veritabanının ilgili tabloları
+SCHEMA_0007 = """
+CREATE TABLE emlak_ilanlar (
+    id SERIAL PRIMARY KEY,
+    baslik VARCHAR(255), aciklama TEXT, fiyat FLOAT, mahalle VARCHAR(255), sokak VARCHAR(255),
+    oda_sayisi VARCHAR(50), metrekare FLOAT, oda INTEGER, salon INTEGER, lat FLOAT, lon FLOAT,
+    geohash VARCHAR(12) COLLATE "C", drive_link VARCHAR(255), drive_folder_id VARCHAR(128),
+    benzer_ilan_id INTEGER REFERENCES emlak_ilanlar (id) ON DELETE SET NULL, gonderen VARCHAR(32)
+);
+CREATE INDEX ix_emlak_ilanlar_id ON emlak_ilanlar (id);
+CREATE INDEX ix_emlak_ilanlar_baslik ON emlak_ilanlar (baslik);
+CREATE INDEX ix_emlak_ilanlar_fiyat ON emlak_ilanlar (fiyat);
+CREATE INDEX ix_emlak_ilanlar_metrekare ON emlak_ilanlar (metrekare);
+CREATE INDEX ix_emlak_ilanlar_oda ON emlak_ilanlar (oda);
+CREATE INDEX ix_emlak_ilanlar_geohash ON emlak_ilanlar (geohash);
+CREATE INDEX ix_emlak_ilanlar_drive_folder_id ON emlak_ilanlar (drive_folder_id);
+CREATE INDEX ix_emlak_ilanlar_benzer_ilan_id ON emlak_ilanlar (benzer_ilan_id);
+CREATE TABLE ilan_photos (
+    id SERIAL PRIMARY KEY,
+    ilan_id INTEGER REFERENCES emlak_ilanlar (id) ON DELETE CASCADE,
+    session_id INTEGER, drive_file_id VARCHAR(128) NOT NULL, sira INTEGER NOT NULL,
+    boyut BIGINT, sha256 VARCHAR(64), thumbnail_id VARCHAR(128), created_at TIMESTAMP
+);
+CREATE INDEX ix_ilan_photos_drive_file_id ON ilan_photos (drive_file_id);
+CREATE TABLE ilan_istatistikleri (
+    id SERIAL PRIMARY KEY,
+    mahalle VARCHAR(255) NOT NULL, oda_sayisi VARCHAR(50) NOT NULL,
+    adet INTEGER NOT NULL, toplam FLOAT NOT NULL, kare_toplam FLOAT NOT NULL,
+    sketch JSON NOT NULL, updated_at TIMESTAMP,
+    CONSTRAINT uq_ilan_istatistikleri_mahalle_oda UNIQUE (mahalle, oda_sayisi)
+);
+CREATE TABLE ilan_minhash (
+    ilan_id INTEGER PRIMARY KEY REFERENCES emlak_ilanlar (id) ON DELETE CASCADE,
+    imza BYTEA NOT NULL
+);
+CREATE TABLE ilan_lsh_bantlari (
+    bant SMALLINT, hash BIGINT,
+    ilan_id INTEGER REFERENCES emlak_ilanlar (id) ON DELETE CASCADE,
+    PRIMARY KEY (bant, hash, ilan_id)
+);
+CREATE INDEX ix_ilan_lsh_bantlari_ilan_id ON ilan_lsh_bantlari (ilan_id);
+CREATE TABLE ilan_degisiklikleri (
+    seq BIGSERIAL PRIMARY KEY, ilan_id INTEGER NOT NULL, islem VARCHAR(8) NOT NULL, created_at TIMESTAMP
+);
+CREATE TABLE schema_migrations (name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+"""
+
+N_ILAN = 40
+# Son iki ilan silinmiş; numaraları yeniden verilmemeli
+N_SILINEN = 2
+
+
+def _seed_0007(conn):
+    for statement in SCHEMA_0007.split(";"):
+        if statement.strip():
+            conn.execute(text(statement))
+    conn.execute(
+        text("INSERT INTO schema_migrations (name) VALUES (:name)"),
+        [{"name": name} for name, _ in migrate.MIGRATIONS[:7]],
+    )
+    conn.execute(text(
+        "INSERT INTO emlak_ilanlar (baslik, aciklama, fiyat, mahalle, sokak, oda_sayisi, metrekare, oda, salon) "
+        "SELECT 'İlan ' || i, 'açıklama ' || i, 1000000 + i * 10000, "
+        "CASE WHEN i % 2 = 0 THEN 'Moda' ELSE 'Caferağa' END, 'Sokak', "
+        "CASE WHEN i % 4 < 2 THEN '2+1' ELSE '3+1' END, 80 + i, CASE WHEN i % 4 < 2 THEN 2 ELSE 3 END, 1 "
+        "FROM generate_series(1, :n) AS i"
+    ), {"n": N_ILAN})
+    conn.execute(text("DELETE FROM emlak_ilanlar WHERE id > :n"), {"n": N_ILAN - N_SILINEN})
+    conn.execute(text("UPDATE emlak_ilanlar SET benzer_ilan_id = 3, gonderen = '+905550000000' WHERE id = 5"))
+    conn.execute(text(
+        "INSERT INTO ilan_photos (ilan_id, drive_file_id, sira) SELECT i, 'foto' || i, 0 FROM generate_series(1, 5) AS i"
+    ))
+    conn.execute(text("INSERT INTO ilan_minhash (ilan_id, imza) VALUES (1, '\\x00')"))
+    conn.execute(text("INSERT INTO ilan_lsh_bantlari (bant, hash, ilan_id) VALUES (0, 42, 1)"))
+    conn.execute(text("INSERT INTO ilan_degisiklikleri (ilan_id, islem) VALUES (1, 'insert')"))
+    # Bayat istatistik satırı; geçişte yeniden hesaplanmalı
+    conn.execute(text(
+        "INSERT INTO ilan_istatistikleri (mahalle, oda_sayisi, adet, toplam, kare_toplam, sketch) "
+        "VALUES ('Moda', '2+1', 999, 0, 0, '{}')"
+    ))
+
+
+def _plan(db, sql: str, params: dict) -> str:
+    return "\n".join(db.execute(text(f"EXPLAIN {sql}"), params).scalars())
+
+
+def _ilan(ofis_id: int, baslik: str = "Yeni ilan") -> schemas.IlanCreate:
+    return schemas.IlanCreate(baslik=baslik, aciklama="a", fiyat=2000000, mahalle="Moda", sokak="Sokak",
+                              oda_sayisi="2+1", metrekare=100, ofis_id=ofis_id)
+
+
+def test_upgrade_from_0007():
+    ofis_id = offices.DEFAULT_OFIS_ID
+    kalan = N_ILAN - N_SILINEN
+    with temp_schema(migrated=False) as engine:
+        with engine.begin() as conn:
+            _seed_0007(conn)
+        migrate.migrate(engine)
+
+        db = session_factory(engine)()
+        try:
+            assert db.execute(text("SELECT relkind FROM pg_class WHERE oid = 'emlak_ilanlar'::regclass")).scalar() == "p"
+            assert db.execute(text("SELECT count(*) FROM emlak_ilanlar")).scalar() == kalan
+            assert db.execute(text(f"SELECT count(*) FROM {offices.partition_name(ofis_id)}")).scalar() == kalan
+            assert db.execute(text("SELECT count(*) FROM emlak_ilanlar_varsayilan")).scalar() == 0
+            assert db.execute(text("SELECT count(DISTINCT ofis_id) FROM emlak_ilanlar")).scalar() == 1
+            assert tuple(db.execute(text("SELECT benzer_ilan_id, gonderen FROM emlak_ilanlar WHERE id = 5")).one()) == \
+                (3, "+905550000000")
+            assert db.execute(text("SELECT count(*) FROM ilan_photos")).scalar() == 5
+            assert db.execute(text("SELECT ofis_id FROM ilan_lsh_bantlari")).scalar() == ofis_id
+            assert db.execute(text("SELECT ofis_id FROM ilan_degisiklikleri")).scalar() == ofis_id
+            # Bölümlü tabloya yabancı anahtar kalmamalı, eski tablo silinmiş olmalı
+            assert db.execute(text(
+                "SELECT count(*) FROM pg_constraint WHERE contype = 'f' AND confrelid = 'emlak_ilanlar'::regclass"
+            )).scalar() == 0
+            assert db.execute(text("SELECT to_regclass('emlak_ilanlar_eski')")).scalar() is None
+
+            # İstatistikler ofise göre baştan hesaplanmış olmalı
+            rows = db.execute(text(
+                "SELECT ofis_id, mahalle, oda_sayisi, adet FROM ilan_istatistikleri ORDER BY mahalle, oda_sayisi"
+            )).all()
+            assert sum(row.adet for row in rows) == kalan
+            assert {row.ofis_id for row in rows} == {ofis_id}
+            assert all(row.adet != 999 for row in rows)
+            assert len(rows) == 4
+
+            # Sequence silinen ilanların numaralarını yeniden vermemeli
+            assert crud.create_emlak_ilan(db, _ilan(ofis_id)).id == N_ILAN + 1
+
+            plan = _plan(db, "SELECT id FROM emlak_ilanlar WHERE ofis_id = :ofis_id AND fiyat > 0", {"ofis_id": ofis_id})
+            assert offices.partition_name(ofis_id) in plan and "emlak_ilanlar_varsayilan" not in plan, plan
+        finally:
+            db.close()
+
+        # İkinci çalıştırma bir şey yapmamalı
+        migrate.migrate(engine)
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM emlak_ilanlar")).scalar() == kalan + 1
+            applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+            assert applied == {name for name, _ in migrate.MIGRATIONS}
+
+
+def test_create_partition_moves_rows():
+    with temp_schema() as engine:
+        db = session_factory(engine)()
+        try:
+            ofis = offices.create_ofis(db, "Şube", bolum=False)
+            ilan = crud.create_emlak_ilan(db, _ilan(ofis.id))
+            assert db.execute(text("SELECT count(*) FROM emlak_ilanlar_varsayilan")).scalar() == 1
+
+            assert offices.create_partition(db, ofis.id) is True
+            db.commit()
+            assert offices.create_partition(db, ofis.id) is False
+            name = offices.partition_name(ofis.id)
+            assert db.execute(text("SELECT count(*) FROM emlak_ilanlar_varsayilan")).scalar() == 0
+            assert db.execute(text(f"SELECT id FROM {name}")).scalar() == ilan.id
+            assert crud.get_ilan(db, ilan.id, ofis_id=ofis.id).baslik == "Yeni ilan"
+            assert crud.get_ilan(db, ilan.id, ofis_id=offices.DEFAULT_OFIS_ID) is None
+
+            # Bölüm üst tablonun tüm indekslerini almış olmalı
+            index_count = "SELECT count(*) FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :name"
+            assert (db.execute(text(index_count), {"name": name}).scalar()
+                    == db.execute(text(index_count), {"name": offices.partition_name(offices.DEFAULT_OFIS_ID)}).scalar())
+
+            plan = _plan(db, "SELECT id FROM emlak_ilanlar WHERE ofis_id = :ofis_id AND id = :id",
+                         {"ofis_id": ofis.id, "id": ilan.id})
+            assert name in plan and "emlak_ilanlar_varsayilan" not in plan, plan
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    if not postgres_available():
+        print("PostgreSQL'e ulaşılamadı (DATABASE_URL), testler atlandı")
+        sys.exit(0)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: tamam")